@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+import os, sys, io, json, sqlite3, time, math, shutil, platform, tempfile, optparse, importlib, contextlib, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+try:
+    from common_methods import *
+except ImportError:
+    sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
+try:
+    import resource
+except ImportError:
+    resource = None
+from scan_all import ARTIFACTS
+from synthetic_evidence import make_evidence
+
+
+def peak_rss():
+    '''The peak resident memory of this process in bytes, None where the resource module isn't available (windows)'''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def dir_size(path):
+    total = 0
+    for dir_path, dir_names, file_names in os.walk(path):
+        for file_name in file_names:
+            total += os.path.getsize(os.path.join(dir_path, file_name))
+    return total
+
+def run_round(module, function, db, out_dir, fmt="html", compression=None):
+    '''Run one read function once in a fresh worker process, so the peak memory is its own.
+Returns (rows, seconds, peak rss, report bytes)'''
+    set_output_dir(out_dir)
+    set_output_format(fmt)
+    set_output_compression(compression)
+    set_result_cache(False)
+    reader = getattr(importlib.import_module(module), function)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        rows = reader(db) or 0
+        seconds = time.perf_counter() - start
+    close_connections()
+    return rows, seconds, peak_rss(), dir_size(out_dir)
+
+def benchmark(evidence_dir, rounds=3, fmt="html", only=None, compression=None):
+    '''Run every read function on the matching database in evidence_dir rounds times, saving the reports in the given
+format and compression. Pass a list of artifact names to only run those. Returns a dict of artifact: {rows, min, mean, stddev, rows_per_sec, peak_rss, report_bytes}'''
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for db_name, table, readers in ARTIFACTS:
+        db = os.path.join(evidence_dir, db_name)
+        if not os.path.isfile(db):
+            continue
+        for artifact, module, function in readers:
+            if only and artifact not in only:
+                continue
+            times, peaks = [], []
+            for i in range(rounds):
+                out_dir = tempfile.mkdtemp(prefix="benchmark_")
+                try:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                        rows, seconds, peak, report_bytes = pool.submit(run_round, module, function, db, out_dir, fmt,
+                                                                           compression).result()
+                finally:
+                    shutil.rmtree(out_dir, ignore_errors=True)
+                times.append(seconds)
+                peaks.append(peak)
+            mean = sum(times) / len(times)
+            results[artifact] = {"function": "%s.%s" % (module, function), "rows": rows, "min": min(times), "mean": mean,
+                                 "stddev": math.sqrt(sum((t - mean) ** 2 for t in times) / len(times)),
+                                 "rows_per_sec": rows / min(times) if min(times) else 0,
+                                 "peak_rss": max(peaks) if None not in peaks else None, "report_bytes": report_bytes}
+            print_result(artifact, results[artifact])
+    return results
+
+def megabytes(value):
+    return "n/a" if value is None else "%.1f" % (value / 1048576.0)
+
+def print_result(artifact, res, previous=None):
+    line = "%-24s %10d %9.3f %9.3f %8.3f %12.0f %10s %12s" % (artifact, res["rows"], res["min"], res["mean"], res["stddev"],
+                                                             res["rows_per_sec"], megabytes(res["peak_rss"]),
+                                                             megabytes(res["report_bytes"]))
+    if previous:
+        line += "   %s rows/sec, %s rss, %s bytes" % (change(res["rows_per_sec"], previous["rows_per_sec"]),
+                                                      change(res["peak_rss"], previous["peak_rss"]),
+                                                      change(res["report_bytes"], previous["report_bytes"]))
+    print(line)
+
+def change(new, old):
+    if not new or not old:
+        return "n/a"
+    return "%+.1f%%" % (100.0 * (new - old) / old)
+
+def print_header(compare=False):
+    print("%-24s %10s %9s %9s %8s %12s %10s %12s%s" % ("artifact", "rows", "min s", "mean s", "stddev", "rows/sec",
+                                                       "peak MB", "report MB", "   change from previous run" if compare else ""))
+
+def compare_results(results, previous):
+    '''Print the results next to their change from a previous run saved with -s'''
+    print("\nCompared to %s (scale %s, %s format):\n" % (previous["label"], previous["scale"], previous["format"]))
+    print_header(True)
+    for artifact, res in sorted(results.items()):
+        print_result(artifact, res, previous["results"].get(artifact))
+
+if __name__ == "__main__":
+    print('\n\n    ##############A Python script to benchmark the scanners ####################')
+    print('    #  times every read function on synthetic or real evidence databases and  #')
+    print('    #        records rows/sec, peak memory and report size per function       #')
+    print('    ###########################################################################\n\n')
+
+    parser = optparse.OptionParser("Usage: python %prog -d <(optional) evidence directory> -n <(optional) rows>" \
+                                   + " -r <(optional) rounds> -f <(optional) report format> -s <(optional) results file>" \
+                                   + " -c <(optional) previous results file> or python %prog -h for help")
+    evidence_help = "a directory with the databases to read, named like on the device (History, main.db...). By default" \
+                    + " synthetic databases are made in a temporary directory"
+    parser.add_option("-d", dest="evidence", type="string", help=evidence_help)
+    rows_help = "the number of rows of the synthetic databases, from 1000 to 10000000, ignored with -d. default 100000"
+    parser.add_option("-n", dest="rows", type="int", default=100000, help=rows_help)
+    parser.add_option("-r", dest="rounds", type="int", default=3, help="how many times to run each read function, default 3")
+    add_output_options(parser, format_flag="-f", compress_flag="-z",
+                       compress_help="compress the reports with gzip or zstd (requires zstandard), default no compression")
+    parser.add_option("-a", dest="artifacts", type="string", help="comma separated artifact names to run, default all")
+    parser.add_option("-l", dest="label", type="string", help="a name for this run in the results file, like a release number")
+    parser.add_option("-s", dest="save", type="string", help="save the results to the given json file")
+    parser.add_option("-c", dest="compare", type="string", help="a results file saved by a previous run to compare to")
+    (options, args) = parser.parse_args()
+    set_output_compression(options.compress)
+
+    if options.evidence and not os.path.isdir(options.evidence):
+        sys.exit("please enter a valid evidence directory:\n\n%s" % parser.usage)
+    if options.rounds < 1:
+        sys.exit("the number of rounds must be at least 1")
+    previous = None
+    if options.compare:
+        try:
+            with open(options.compare) as f:
+                previous = json.load(f)
+        except (IOError, ValueError) as e:
+            sys.exit("Couldn't read the previous results: %s" % e)
+
+    evidence = options.evidence
+    if not evidence:
+        evidence = tempfile.mkdtemp(prefix="evidence_")
+        print("Making synthetic databases with %d row(s)...\n" % options.rows)
+        make_evidence(evidence, options.rows)
+
+    only = [name.strip() for name in options.artifacts.split(",")] if options.artifacts else None
+    print("Working...\n")
+    print_header()
+    try:
+        results = benchmark(evidence, options.rounds, options.format, only, options.compress)
+    finally:
+        if not options.evidence:
+            shutil.rmtree(evidence, ignore_errors=True)
+    if not results:
+        sys.exit("No supported databases found in %s" % evidence)
+
+    run = {"label": options.label or time.strftime("%Y-%m-%d %H:%M:%S"), "scale": options.evidence or options.rows,
+           "format": options.format, "compression": options.compress, "rounds": options.rounds, "python": platform.python_version(),
+           "sqlite": sqlite3.sqlite_version, "platform": platform.platform(), "results": results}
+    if previous:
+        compare_results(results, previous)
+    if options.save:
+        with open(options.save, "w") as f:
+            json.dump(run, f, indent=2, sort_keys=True)
+        print("\nResults saved to %s" % options.save)
+    print("")
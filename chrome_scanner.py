@@ -7,98 +7,100 @@ except ImportError:
     sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
 
 
-def read_chrome_history(history_db, tm_min=0, tm_max=10000000000000, google=False):
-    command = "SELECT urls.url, title, visit_time, last_visit_time, visit_count FROM urls, visits WHERE (urls.id = visits.id)" \
-              + " AND ((visit_time/10000000) > %s AND (visit_time/10000000) < %s);" % (tm_min, tm_max)
-
+# chrome keeps its times in microseconds since 1601-01-01
+WEBKIT_SCALE, WEBKIT_EPOCH = TIMESTAMP_UNITS["webkit"]
+
+def chrome_history_query(tm_min=0, tm_max=10000000000000, google=False):
+    '''Build the chrome history query, the bounds are unix times and chrome keeps microseconds since 1601-01-01'''
+    query = Query("SELECT urls.url, title, visit_time, last_visit_time, visit_count FROM urls, visits") \
+            .where("urls.id = visits.id").time_range("visit_time", tm_min, tm_max, WEBKIT_SCALE, WEBKIT_EPOCH) \
+            .index("visits", "visit_time", "id")
     if google:
-        command = "SELECT urls.url, title, visit_time, last_visit_time, visit_count FROM urls, visits WHERE (urls.id = visits.id)" \
-              + " AND ((visit_time/10000000) > %s AND (visit_time/10000000) < %s) " % (tm_min, tm_max) \
-              + "AND (title like '%Google%');"
-
-    res = pull_from_db(history_db, command)
-    data = init_data("chrome_scanner History", len(res)) + init_table_header("./templates/init_chrome_history_html.html")
-
-    for row in res:
-        visit_time = dt.fromtimestamp(row[2]/10000000)
-        last_visit_time = dt.fromtimestamp(row[3]/10000000)
-
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>" % (visit_time, last_visit_time, row[1], row[0], row[4])
-        data += line
-
-    data += close_table_html()
-    saveResult("chrome_history.html", data)
+        query.like("title", "Google")
+    return query
+
+def chrome_downloads_query(tm_min=0, tm_max=10000000000000):
+    return Query("SELECT url, current_path, start_time, end_time, received_bytes, total_bytes, opened, referrer, " \
+                 + "last_modified, mime_type FROM downloads, downloads_url_chains") \
+           .where("downloads_url_chains.id = downloads.id").time_range("start_time", tm_min, tm_max, WEBKIT_SCALE, WEBKIT_EPOCH) \
+           .index("downloads", "start_time")
+
+def chrome_cookies_query(tm_min=0, tm_max=10000000000000, host=None):
+    query = Query("SELECT name, host_key, value, creation_utc, expires_utc, last_access_utc, has_expires from cookies") \
+            .time_range("creation_utc", tm_min, tm_max, WEBKIT_SCALE, WEBKIT_EPOCH).index("cookies", "creation_utc", "host_key")
+    if host:
+        query.like("host_key", host, contains=False)
+    return query
 
+def chrome_logins_query(tm_min=0, tm_max=10000000000000, domain=None):
+    query = Query("SELECT action_url, username_value, password_value, signon_realm, date_created, times_used, form_data FROM logins") \
+            .time_range("date_created", tm_min, tm_max, WEBKIT_SCALE, WEBKIT_EPOCH).index("logins", "date_created", "signon_realm")
+    if domain:
+        query.like("signon_realm", domain, contains=False)
+    return query
+
+def download_progress(row):
+    try:
+        return str(round((100 * row[4]) / row[5], 4)) + " %"
+    except ZeroDivisionError:
+        return "Download size is zero"
+
+def decode_blob(value):
+    return value.decode("ISO-8859-1") if value is not None else ""
+
+YES_NO = {0 : "No", 1 : "Yes"}
+
+# report columns built from the rows of the queries above
+CHROME_HISTORY = RowSpec([(2, "webkit"), (3, "webkit"), (1, None), (0, None), (4, None)])
+CHROME_DOWNLOADS = RowSpec([(2, "webkit"), (3, "webkit", "download interrupted"), (0, None), (9, None), (7, None),
+                            (1, None), (5, None), (None, download_progress), (6, YES_NO), (8, None)])
+CHROME_COOKIES = RowSpec([(1, None), (0, None), (2, None), (3, "webkit"), (4, "webkit"), (5, "webkit"), (6, YES_NO)])
+CHROME_LOGINS = RowSpec([(4, "webkit"), (3, None), (0, None), (1, None), (2, decode_blob), (5, None), (6, decode_blob)])
+
+@cached_result()
+def read_chrome_history(history_db, tm_min=0, tm_max=10000000000000, google=False, incremental=False, device=None):
+    '''Read chrome history. Takes 6 arguments:
+history_db: the full path of the History sqlite database file
+tm_min: the minimum visit timestamp, default value is 0
+tm_max: the maximum visit timestamp, default value is 10000000000000
+google: Look for google searches only? default value is False
+incremental: pass True to only read visits added after the ones exported by the previous incremental run
+device: the name of the device the database was pulled from, default value None for the database path'''
+    query = chrome_history_query(tm_min, tm_max, google)
+
+    tgt = "chrome_history.html"
+    state = None
+    if incremental:
+        state = ScanState(history_db, "chrome_google_searches" if google else "chrome_history", "visits", device)
+        state.apply(query)
+        tgt = state.report_name(tgt)
+
+    with open_report(tgt, "chrome_scanner History", "./templates/init_chrome_history_html.html") as report:
+        for rows in query.run_batches(history_db):
+            if state:
+                state.seen_batch(rows)
+            report.write_batch(CHROME_HISTORY.cells(rows))
+    if state:
+        state.save()
+    return report.rows
+
+@cached_result()
 def read_chrome_downloads(history_db, tm_min=0, tm_max=10000000000000):
-    command = "SELECT url, current_path, start_time, end_time, received_bytes, total_bytes, opened, referrer, " \
-              + "last_modified, mime_type FROM downloads, downloads_url_chains " \
-              + "WHERE (downloads_url_chains.id = downloads.id) AND (start_time/10000000 > %s AND start_time/10000000 < %s);" % (tm_min, tm_max)
-
-    res = pull_from_db(history_db, command)
-    data = init_data("chrome_scanner Downloads", len(res)) + init_table_header("./templates/init_chrome_downloads_html.html")
-    open_dict = {"0" : "No", "1" : "Yes"}
-
-    for row in res:
-        start_time = dt.fromtimestamp(row[2]/10000000)
-        if row[3] > 0:
-            end_time = dt.fromtimestamp(row[3]/10000000)
-        else:
-            end_time = "download interrupted"
-        try:
-            pct = str(round((100 * row[4]) / row[5], 4)) + " %"
-        except ZeroDivisionError:
-            pct = "Download size is zero"
-        opened = open_dict[str(row[6])]
-
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td>" % (start_time, end_time, row[0], row[9], row[7]) \
-               + "<td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>" % (row[1], row[5], pct, opened, row[8])
-        data += line
-
-    data += close_table_html()
-    saveResult("chrome_downloads.html", data)
+    with open_report("chrome_downloads.html", "chrome_scanner Downloads", "./templates/init_chrome_downloads_html.html") as report:
+        CHROME_DOWNLOADS.write(report, chrome_downloads_query(tm_min, tm_max).run_batches(history_db))
+    return report.rows
 
+@cached_result()
 def read_chrome_cookies(cookies_db, tm_min=0, tm_max=10000000000000, host=None):
-    command = "SELECT name, host_key, value, creation_utc, expires_utc, last_access_utc, has_expires from cookies " \
-              + "WHERE (creation_utc/10000000 > %s AND creation_utc/10000000 < %s);" % (tm_min, tm_max)
-    if host:
-        command = command[:-1] + " AND (host_key LIKE '%s');" % host
-
-    res = pull_from_db(cookies_db, command)
-    data = init_data("chrome_scanner Cookies", len(res)) + init_table_header("./templates/init_chrome_cookies_html.html")
-    exp_dict = {"0" : "No", "1" : "Yes"}
-
-    for row in res:
-        creation_date = dt.fromtimestamp(row[3]/10000000)
-        exp_date = dt.fromtimestamp(row[4]/10000000)
-        last_access_date = dt.fromtimestamp(row[5]/10000000)
-        exp_stat = exp_dict[str(row[6])]
-
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td>" % (row[1], row[0], row[2], creation_date) \
-               + "<td>%s</td><td>%s</td><td>%s</td></tr>" % (exp_date, last_access_date, exp_stat)
-        data += line
-
-    data += close_table_html()
-    saveResult("chrome_cookies.html", data)
+    with open_report("chrome_cookies.html", "chrome_scanner Cookies", "./templates/init_chrome_cookies_html.html") as report:
+        CHROME_COOKIES.write(report, chrome_cookies_query(tm_min, tm_max, host).run_batches(cookies_db))
+    return report.rows
 
+@cached_result()
 def read_chrome_logins(logins_db, tm_min=0, tm_max=10000000000000, domain=None):
-    command = "SELECT action_url, username_value, password_value, signon_realm, date_created, times_used, form_data FROM logins " \
-              + "WHERE (date_created/10000000 > %s AND date_created/10000000 < %s);" % (tm_min, tm_max)
-    if domain:
-        command = command[:-1] + " AND (signon_realm LIKE '%s');" % domain
-
-    res = pull_from_db(logins_db, command)
-    data = init_data("chrome_scanner Logins", len(res)) + init_table_header("./templates/init_chrome_logins_html.html")
-
-    for row in res:
-        creation_date = dt.fromtimestamp(row[4]/10000000)
-        form_data = row[6].decode("ISO-8859-1")
-
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td>" % (creation_date, row[3], row[0], row[1]) \
-               + "<td>%s</td><td>%s</td><td>%s</td></tr>" % (row[2].decode("ISO-8859-1"), row[5], form_data)
-        data += line
-
-    data += close_table_html()
-    saveResult("chrome_logins.html", data)
+    with open_report("chrome_logins.html", "chrome_scanner Logins", "./templates/init_chrome_logins_html.html") as report:
+        CHROME_LOGINS.write(report, chrome_logins_query(tm_min, tm_max, domain).run_batches(logins_db))
+    return report.rows
     
 if __name__ == "__main__":
     print('\n\n    ##############A Python script to read chrome  browser data ############')
@@ -111,8 +113,8 @@ if __name__ == "__main__":
     target_help = "can take one of 4 values: history, google_searches, cookies, logins, or downloads"
     parser.add_option("-t", dest="target", type="string", help=target_help)
     db_help = "The full path of the chrome database file to parse. By default, it's data/data/com.android.chrome/app_chrome/Default/" \
-              + "On android. On win vista or later C:\Users\USERNAME\AppData\Local\Google\Chrome\User Data\Default\databases" \
-              + ". On win xp: C:\Documents and Settings\USERNAME\Application Support\Google\Chrome\Default\databases" \
+              + r"On android. On win vista or later C:\Users\USERNAME\AppData\Local\Google\Chrome\User Data\Default\databases" \
+              + r". On win xp: C:\Documents and Settings\USERNAME\Application Support\Google\Chrome\Default\databases" \
               + ". On Linux: ~/.config/google-chrome/Default/databases. On Mac: ~/Library/Application Support/Google/Chrome/Default/databases"
     parser.add_option("-b", dest="db", type="string", help=db_help)
     min_help = "enter if target isn't 'cookies' to read items after a given date and time, must be a string separated by _ YYYY_MM_DD_HH_MM_SS"
@@ -122,7 +124,26 @@ if __name__ == "__main__":
     dom_help = "enter if target function is cookies or logins to look for results corresponding to a specific host/domain." \
                + " Default None"
     parser.add_option("--domain", dest="host_domain", type="string", help=dom_help)
+    inc_help = "enter only if target is history or google_searches to only read visits added after the ones saved by the" \
+               + " previous incremental run on the same profile, the results are saved to a new numbered report"
+    parser.add_option("--incremental", dest="incremental", action="store_true", default=False, help=inc_help)
+    device_help = "enter with --incremental to name the device the database was pulled from, to continue its incremental" \
+                  + " scans when a fresh pull is saved to another path. Default the database path"
+    parser.add_option("--device", dest="device", type="string", help=device_help)
+    add_output_options(parser, "opening the database, queries, fetching rows, timestamp conversion, formatting, rendering" \
+                       + " and writing the reports")
+    index_help = "speed up time window searches on large databases by indexing a temporary working copy of the database," \
+                 + " the original file is never modified"
+    parser.add_option("--index", dest="index", action="store_true", default=False, help=index_help)
+    cache_help = "save the results in the result cache and reuse them when the same database is read again with the same" \
+                 + " options, instead of reading it again. The cache is kept in " + RESULT_CACHE_DIR
+    parser.add_option("--cache", dest="cache", action="store_true", default=False, help=cache_help)
     (options, args) = parser.parse_args()
+    set_output_format(options.format)
+    set_output_compression(options.compress)
+    set_working_indexes(options.index)
+    set_result_cache(options.cache)
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
 
     if not options.target:
         sys.exit("please enter a target:\n\n%s" % parser.usage)
@@ -131,4 +152,25 @@ if __name__ == "__main__":
         sys.exit("Unrecognized target function!")
 
     db = options.db
-    d
+    if not db:
+        sys.exit("please enter the database path using the -b option:\n\n%s" % parser.usage)
+
+    if options.min:
+        min_time = time_to_epoch(options.min)
+    else:
+        min_time = 0
+    if options.max:
+        max_time = time_to_epoch(options.max)
+    else:
+        max_time = 10000000000000
+
+    if options.target.lower() == "history":
+        read_chrome_history(db, min_time, max_time, incremental=options.incremental, device=options.device)
+    elif options.target.lower() == "google_searches":
+        read_chrome_history(db, min_time, max_time, google=True, incremental=options.incremental, device=options.device)
+    elif options.target.lower() == "downloads":
+        read_chrome_downloads(db, min_time, max_time)
+    elif options.target.lower() == "cookies":
+        read_chrome_cookies(db, min_time, max_time, options.host_domain)
+    elif options.target.lower() == "logins":
+        read_chrome_logins(db, min_time, max_time, options.host_domain)
@@ -1,6 +1,19 @@
 #!/usr/bin/env python
-import sqlite3, os, sys, platform
+import sqlite3, os, sys, io, re, csv, shutil, platform, atexit, hashlib, json, tempfile, time, mmap, struct, zlib, marshal, inspect
+import queue, threading
 from datetime import datetime as dt
+from html import escape as html_escape
+from functools import lru_cache, wraps
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+try:
+    from urllib.request import pathname2url
+except ImportError:
+    from urllib import pathname2url
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 def time_to_epoch(time_string):
@@ -8,6 +21,17 @@ def time_to_epoch(time_string):
     tm = [int(item) for item in time_string.split("_")]
     return dt(tm[0], tm[1], tm[2], tm[3], tm[4], tm[5]).timestamp()
 
+def normalize_coordinates(latitude, longitude):
+    '''Get a (latitude, longitude) tuple in decimal degrees from the raw values of a database or EXIF record, numbers or
+numeric text. Returns None if either one is missing or out of range, or for 0, 0 which apps store for "no position"'''
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or latitude == longitude == 0:
+        return None
+    return latitude, longitude
+
 def get_firefox_db(db_file):
     '''Return the full path of firefox sqlite databases, platform independent'''
     success = False
@@ -47,38 +71,1488 @@ def parse_value(value, integer=False, div=1):
     except:
         return "Not Applicable"
 
+OUTPUT_DIR = ""
+
+def set_output_dir(path):
+    '''Save the results of every following saveResult call and report writer in the given directory'''
+    global OUTPUT_DIR
+    OUTPUT_DIR = path
+
+def output_path(file_name):
+    '''Return where a result file should be written, relative names are placed in OUTPUT_DIR'''
+    return os.path.join(OUTPUT_DIR, file_name)
+
+# the stages of a run, in the order they're printed. transform is whatever time isn't spent in any other stage: the
+# read functions' own row loops
+PROFILE_STAGES = ("open", "query", "fetch", "timestamps", "lookup", "transform", "render", "write")
+PROFILE_TOP_FUNCTIONS = 25
+
+_profiler = None
+
+class _NoStage(object):
+    '''What profile_stage returns while profiling is off, entering it costs next to nothing'''
+    rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+_NO_STAGE = _NoStage()
+
+class _Stage(object):
+    __slots__ = ("profiler", "name", "rows", "start")
+
+    def __init__(self, profiler, name, rows):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.profiler.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        stats = self.profiler.stages[self.name]
+        stats[0] += time.perf_counter() - self.start
+        stats[1] += 1
+        stats[2] += self.rows
+        self.profiler.depth -= 1
+
+class StageProfiler(object):
+    '''Adds up the time, calls and rows of each stage of a run. Stages started inside another one are counted as part
+of the outer stage, so a lookup's queries count as lookup time. Takes one argument: pstats_file, a file to save
+cProfile statistics of the whole run to, default value None'''
+    def __init__(self, pstats_file=None):
+        self.stages = dict((stage, [0.0, 0, 0]) for stage in PROFILE_STAGES)
+        self.depth = 0
+        self.report_rows = 0
+        self.pstats_file = pstats_file
+        self.profile = None
+        if pstats_file:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start = time.perf_counter()
+
+    def stage(self, name, rows=0):
+        if self.depth:
+            return _NO_STAGE
+        return _Stage(self, name, rows)
+
+    def results(self):
+        '''Return {stage: [seconds, calls, rows]} plus the wall time under "total", transform gets the time left over
+and the number of report rows'''
+        results = dict((stage, list(stats)) for stage, stats in self.stages.items())
+        wall = time.perf_counter() - self.start
+        results["transform"] = [max(wall - sum(stats[0] for stats in results.values()), 0.0), 0, self.report_rows]
+        results["total"] = [wall, 0, self.report_rows]
+        return results
+
+    def stop(self):
+        '''Stop cProfile and save its statistics. Returns the pstats.Stats, or None if cProfile wasn't running'''
+        if self.profile is None:
+            return None
+        import pstats
+        self.profile.disable()
+        self.profile.dump_stats(self.pstats_file)
+        stats = pstats.Stats(self.pstats_file, stream=sys.stdout)
+        self.profile = None
+        return stats
+
+def set_profiling(enabled, pstats_file=None, report=True):
+    '''Time every stage of the following reads: opening databases, running queries, fetching rows, converting
+timestamps, per row lookups, the read functions' own row loops, rendering and writing reports. Pass a pstats_file to
+also save cProfile statistics to it. With report, the breakdown is printed when the script exits'''
+    global _profiler
+    if not enabled:
+        _profiler = None
+        return
+    _profiler = StageProfiler(pstats_file)
+    atexit.unregister(print_profile)
+    if report:
+        atexit.register(print_profile)
+
+def profile_stage(name, rows=0):
+    '''Return a context manager adding the time spent in it to the given stage while profiling is on, set its rows
+attribute to count the rows it handled. eg: with profile_stage("fetch") as stage: ...'''
+    if _profiler is None:
+        return _NO_STAGE
+    return _profiler.stage(name, rows)
+
+def profiled(stage):
+    '''Decorate a function so its calls are timed as the given stage while profiling is on'''
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with profile_stage(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def profile_results():
+    '''Return the stage results of the current run, see StageProfiler.results, or None while profiling is off'''
+    return _profiler.results() if _profiler is not None else None
+
+def merge_profile_results(results):
+    '''Add up the stage results of several runs, eg: one per worker process'''
+    merged = {}
+    for res in results:
+        for stage, stats in res.items():
+            total = merged.setdefault(stage, [0.0, 0, 0])
+            for i, value in enumerate(stats):
+                total[i] += value
+    return merged
+
+def print_profile(results=None):
+    '''Print the per stage breakdown of the current run, or of the given stage results. Also prints the slowest
+functions and where the cProfile statistics were saved, if they were collected'''
+    if results is None:
+        if _profiler is None:
+            return
+        results = _profiler.results()
+        stats = _profiler.stop()
+    else:
+        stats = None
+    wall = results["total"][0] or 1e-9
+
+    print("\n%-12s %10s %7s %10s %12s %12s" % ("stage", "seconds", "%", "calls", "rows", "rows/sec"))
+    for stage in PROFILE_STAGES + ("total",):
+        seconds, calls, rows = results.get(stage, (0.0, 0, 0))
+        print("%-12s %10.3f %6.1f%% %10s %12s %12s" % (stage, seconds, 100.0 * seconds / wall, calls or "",
+                                                     rows or "", "%.0f" % (rows / seconds) if rows and seconds else ""))
+    if stats is not None:
+        print("\nslowest functions, including the time spent in the functions they call:\n")
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        print("cProfile statistics saved to %s, view them with: python -m pstats %s\n" % (_profiler.pstats_file,
+                                                                                       _profiler.pstats_file))
+
+# (offset, signature, file type), checked in order
+FILE_SIGNATURES = [(0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "ole"),
+                   (0, b"PK\x03\x04", "zip"),
+                   (0, b"%PDF", "pdf"),
+                   (0, b"\xff\xd8\xff", "jpeg"),
+                   (0, b"II*\x00", "tiff"),
+                   (0, b"MM\x00*", "tiff"),
+                   (0, b"SQLite format 3\x00", "sqlite"),
+                   (0, b"regf", "regf")]
+SIGNATURE_BYTES = max(offset + len(sig) for offset, sig, file_type in FILE_SIGNATURES)
+
+def sniff_file_type(file_path):
+    '''Detect a file's type from its first few bytes regardless of its name. Returns one of the FILE_SIGNATURES types
+("ole", "zip", "pdf", "jpeg", "tiff", "sqlite", "regf") or None if the type isn't recognized or the file can't be read'''
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(SIGNATURE_BYTES)
+    except (IOError, OSError):
+        return None
+    for offset, sig, file_type in FILE_SIGNATURES:
+        if head[offset:offset + len(sig)] == sig:
+            return file_type
+    return None
+
+OUTPUT_COMPRESSION = None
+COMPRESSION_EXTENSIONS = {"gzip" : ".gz", "zstd" : ".zst"}
+COMPRESSION_LEVELS = {"gzip" : 3, "zstd" : 3}
+OUTPUT_QUEUE_CHUNKS = 16
+ZSTD_MAGIC = 0xfd2fb528
+ZSTD_MAX_BLOCK = 131072
+
+def set_output_compression(method):
+    '''Compress every following report and saveResult file with gzip or zstd (requires zstandard), None to stop'''
+    global OUTPUT_COMPRESSION
+    if method is not None and method not in COMPRESSION_EXTENSIONS:
+        sys.exit("Unrecognized compression %s! Choose one of: %s" % (method, ", ".join(sorted(COMPRESSION_EXTENSIONS))))
+    if method == "zstd":
+        _zstandard()
+    OUTPUT_COMPRESSION = method
+
+def compression_of(file_name):
+    '''The compression of a file according to its extension: gzip, zstd or None'''
+    for method, extension in COMPRESSION_EXTENSIONS.items():
+        if file_name.lower().endswith(extension):
+            return method
+    return None
+
+def compressed_name(file_name):
+    '''Add the extension of the current output compression to file_name, unless it already has one'''
+    if OUTPUT_COMPRESSION and not compression_of(file_name):
+        return file_name + COMPRESSION_EXTENSIONS[OUTPUT_COMPRESSION]
+    return file_name
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        sys.exit("zstandard module not found... to install it use the command: pip install zstandard")
+    return zstandard
+
+def stored_frame(data, method):
+    '''data as a gzip member or zstd frame of its own, stored without compression so that its size only depends on the
+size of data. Decompressing a file gives the data of all its members or frames one after the other'''
+    if method == "gzip":
+        compressor = zlib.compressobj(0, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    # single segment frame with a 4 byte content size, followed by raw blocks
+    blocks = [data[i:i + ZSTD_MAX_BLOCK] for i in range(0, len(data), ZSTD_MAX_BLOCK)] or [b""]
+    frame = [struct.pack("<IBI", ZSTD_MAGIC, 0xa0, len(data))]
+    for i, block in enumerate(blocks):
+        frame.append(struct.pack("<I", len(block) << 3 | (i == len(blocks) - 1))[:3] + block)
+    return b"".join(frame)
+
+class OutputFile(object):
+    '''A binary file written by a background thread, compressed with gzip or zstd if its name ends with .gz or .zst,
+so that compressing and writing to slow disks, like network shares, overlap reading and rendering the next rows.
+write only waits once OUTPUT_QUEUE_CHUNKS chunks are queued. The header given when opening the file is kept apart
+from the rest, close can replace it with another of the same length, eg: to fill in the number of results'''
+    def __init__(self, file_name, header=b""):
+        self.compression = compression_of(file_name)
+        if self.compression == "gzip":
+            self._compressor = zlib.compressobj(COMPRESSION_LEVELS["gzip"], zlib.DEFLATED, 31)
+        elif self.compression == "zstd":
+            self._compressor = _zstandard().ZstdCompressor(level=COMPRESSION_LEVELS["zstd"]).compressobj()
+        else:
+            self._compressor = None
+        self.header_size = len(header)
+        self._file = open(file_name, "wb")
+        self._file.write(self._stored(header))
+        self._queue = queue.Queue(OUTPUT_QUEUE_CHUNKS)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _stored(self, data):
+        if self._compressor is None or not data:
+            return data
+        return stored_frame(data, self.compression)
+
+    def _run(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                return
+            if self._error is not None:
+                # keep taking chunks so that write doesn't wait forever, write raises the error
+                continue
+            try:
+                if self._compressor is not None:
+                    data = self._compressor.compress(data)
+                if data:
+                    self._file.write(data)
+            except Exception as e:
+                self._error = e
+
+    def write(self, data):
+        if self._error is not None:
+            raise IOError(self._error)
+        self._queue.put(data)
+
+    def close(self, header=None):
+        '''Write the queued chunks and close the file, header replaces the one given when opening it'''
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            if self._error is not None:
+                raise IOError(self._error)
+            if self._compressor is not None:
+                self._file.write(self._compressor.flush())
+            if header is not None:
+                if len(header) != self.header_size:
+                    raise ValueError("the new header must be as long as the old one")
+                self._file.seek(0)
+                self._file.write(self._stored(header))
+        finally:
+            self._file.close()
+
 def saveResult(file_name, data):
     '''Save whatever data the scripts produce to a file...'''
+    file_name = output_path(compressed_name(file_name))
     if os.path.isfile(file_name):
             sys.exit("%s already exists! Rename or move that file to avoid losing your data!" % file_name)
 
     print("saving results to %s\n" % file_name)
     try:
-        with open(file_name, "w", encoding='utf-8') as rf:
-            rf.write(data)
+        with profile_stage("write"):
+            rf = OutputFile(file_name)
+            rf.write(data.encode("utf-8"))
+            rf.close()
     except IOError as ie:
         print("Could not save the result... An IOError occured: %s" % ie)
     print("done! Results saved to %s...\n" % file_name)
 
-def pull_from_db(db, command, facebook_name=False):
-    '''Send queries to a database and return the results'''
+class ReportWriter(object):
+    '''Base class of the streaming report writers, they write rows to disk as they come instead of building the whole
+report in memory. Takes 5 arguments:
+file_name: the report file to create, it must not exist already
+title: the report title
+header_template: the html table header template, the column names are read from its <th> tags
+buffer_rows: how many rows to keep in memory before writing them to disk, default value is the class's buffer_rows
+columns: the column names, to use instead of reading them from header_template. file_name can end with .gz or .zst
+to compress the report, see OutputFile
+markup_columns: the indexes of the columns holding html, like links, that html reports write as it is. Every other
+cell is escaped, see RowSpec.markup_columns
+
+Subclasses implement open and finish, and render_rows and write_text for text formats or write_rows for the others.'''
+    extension = ""
+    buffer_rows = 1000
+    renders_text = True
+    compressible = True
+
+    def __init__(self, file_name, title, header_template, buffer_rows=None, columns=None, markup_columns=()):
+        self.report_name = file_name
+        file_name = output_path(file_name)
+        if os.path.isfile(file_name):
+            sys.exit("%s already exists! Rename or move that file to avoid losing your data!" % file_name)
+        if compression_of(file_name) and not self.compressible:
+            sys.exit("%s can't be saved, this report format can't be compressed!" % file_name)
+
+        self.file_name = file_name
+        self.title = title
+        self.header_template = header_template
+        self.columns = list(columns) if columns is not None else template_columns(header_template)
+        if buffer_rows:
+            self.buffer_rows = buffer_rows
+        self.markup_columns = tuple(markup_columns)
+        self.rows = 0
+        self.closed = False
+        self._buffer = []
+
+        print("saving results to %s\n" % file_name)
+        try:
+            self.open()
+        except IOError as ie:
+            sys.exit("Could not save the result... An IOError occured: %s" % ie)
+        self._recorder = _result_recorder
+        if self._recorder:
+            self._recorder.add_report(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_row(self, cells):
+        '''Add one row, cells is a sequence of values, one per column'''
+        self._buffer.append(cells)
+        self.rows += 1
+        if len(self._buffer) >= self.buffer_rows:
+            self.flush()
+
+    def write_batch(self, rows):
+        '''Add a list of rows at once'''
+        self._buffer.extend(rows)
+        self.rows += len(rows)
+        if len(self._buffer) >= self.buffer_rows:
+            self.flush()
+
+    def write_rendered(self, text, rows):
+        '''Add rows already rendered by render_rows'''
+        self.flush()
+        with profile_stage("write", rows):
+            self.write_text(text)
+        self.rows += rows
+
+    def flush(self):
+        '''Write the buffered rows to disk'''
+        if self._buffer:
+            rows = len(self._buffer)
+            if self.renders_text:
+                with profile_stage("render", rows):
+                    text = self.render_rows(self._buffer)
+                if self._recorder:
+                    self._recorder.add_text(self, text, rows)
+                with profile_stage("write", rows):
+                    self.write_text(text)
+            else:
+                if self._recorder:
+                    self._recorder.add_rows(self, self._buffer)
+                with profile_stage("write", rows):
+                    self.write_rows(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        '''Write the remaining rows and finish the report'''
+        if self.closed:
+            return
+        self.closed = True
+        self.flush()
+        with profile_stage("write"):
+            self.finish()
+        if _profiler is not None:
+            _profiler.report_rows += self.rows
+        print("done! Results saved to %s...\n" % self.file_name)
+
+    def open(self):
+        raise NotImplementedError
+
+    def render_rows(self, rows):
+        raise NotImplementedError
+
+    def write_text(self, text):
+        raise NotImplementedError
+
+    def write_rows(self, rows):
+        self.write_text(self.render_rows(rows))
+
+    def finish(self):
+        raise NotImplementedError
+
+# the control characters HTMLRowRenderer joins cells with before escaping, several of them so that even binary values
+# decoded as text practically never contain them
+HTML_CELL_SEPARATOR = "\x1f\x1e\x1d\x1c"
+
+class HTMLRowRenderer(object):
+    '''Render batches of rows as html table rows, escaping the cells that aren't in markup_columns'''
+    def __init__(self, markup_columns=()):
+        self.markup_columns = tuple(markup_columns)
+        self._escaping = False
+        self._template_rows = None
+
+    def render(self, rows):
+        '''Render a batch of rows. Most batches don't contain any character that needs escaping, which counting the <, > and & of the rendered
+text shows at once: then it's only made of the table tags and the markup cells and is returned as it is. Once a batch
+needed escaping the next ones are escaped right away, until one of them turns out not to need it'''
+        if not rows:
+            return ""
+        if not self._escaping:
+            text = "".join(["<tr><td>" + "</td><td>".join(map(str, cells)) + "</td></tr>" for cells in rows])
+            tags = 2 * (len(rows) + sum(map(len, rows)))
+            markup = "".join([str(cells[i]) for cells in rows for i in self.markup_columns if i < len(cells)])
+            if text.count("<") == tags + markup.count("<") and text.count(">") == tags + markup.count(">") \
+               and text.count("&") == markup.count("&"):
+                return text
+        return self._render_escaped(rows)
+
+    def _render_escaped(self, rows):
+        '''Render and escape a batch in one pass: every cell is joined with a separator, the whole text is escaped
+and split again at once and the cells are put into a row template repeated once per row. The cells of the markup
+columns are then put back as they were. Batches with rows of different widths or cells containing the separator are
+rendered one cell at a time instead'''
+        width = len(rows[0])
+        if any(len(row) != width for row in rows):
+            self._escaping = True
+            return self._render_cells(rows)
+        text = HTML_CELL_SEPARATOR.join(map(str, chain.from_iterable(rows)))
+        escaped = html_escape(text, False)
+        self._escaping = len(escaped) != len(text)
+        cells = escaped.split(HTML_CELL_SEPARATOR)
+        if len(cells) != width * len(rows):
+            return self._render_cells(rows)
+        for i in self.markup_columns:
+            if i < width:
+                cells[i::width] = [str(row[i]) for row in rows]
+        if self._template_rows != (width, len(rows)):
+            self._template_rows = (width, len(rows))
+            self._template = ("<tr>" + "<td>%s</td>" * width + "</tr>") * len(rows)
+        return self._template % tuple(cells)
+
+    def _render_cells(self, rows):
+        '''The slow path of _render_escaped, escaping one cell at a time'''
+        return "".join(["<tr><td>" + "</td><td>".join([str(cell) if i in self.markup_columns else html_escape(str(cell), False)
+                                                       for i, cell in enumerate(cells)]) + "</td></tr>" for cells in rows])
+
+class HTMLReportWriter(ReportWriter):
+    '''Stream a html report: the header from init_data and init_table_header, the rows as <tr> elements and
+close_table_html. The number of results shown in the report caption is filled in when the writer is closed'''
+    extension = ".html"
+    count_placeholder = 999999999999
+
+    def open(self):
+        header = (init_data(self.title, self.count_placeholder) + init_table_header(self.header_template)).encode("utf-8")
+        placeholder = ("%d" % self.count_placeholder).encode("utf-8")
+        self._header = header
+        self._count_offset = header.rfind(placeholder)
+        self._count_width = len(placeholder)
+        self._file = OutputFile(self.file_name, header)
+        self._renderer = HTMLRowRenderer(self.markup_columns)
+
+    def render_rows(self, rows):
+        return self._renderer.render(rows)
+
+    def write_text(self, text):
+        self._file.write(text.encode("utf-8"))
+
+    def footer(self):
+        return close_table_html()
+
+    def finish(self):
+        self._file.write(self.footer().encode("utf-8"))
+        header = self._header
+        if self._count_offset >= 0:
+            header = header[:self._count_offset] + ("%*d" % (self._count_width, self.rows)).encode("utf-8") \
+                     + header[self._count_offset + self._count_width:]
+        self._file.close(header)
+
+HTML_PAGE_ROWS = 10000
+HTML_PAGE_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+# the index page script of paged html reports, it adds the pages to the table as it's scrolled down and filters their
+# rows when searching. The pages are scripts calling addPage, browsers don't let pages opened from disk read files
+PAGED_HTML_SCRIPT = """
+<script>
+(function () {
+    var pages = %d, folder = %s, table = document.currentScript.previousElementSibling, body = table.tBodies[0];
+    var next = 1, loading = false, query = "";
+    var search = document.createElement("input"), status = document.createElement("p");
+    search.type = "search";
+    search.placeholder = "search all the pages";
+    table.parentNode.insertBefore(search, table);
+    table.parentNode.insertBefore(status, table);
+
+    function more() {
+        if (loading || next > pages || window.pageYOffset + 2 * window.innerHeight < document.body.offsetHeight) {
+            status.textContent = body.rows.length + " row(s) shown, " + (next - 1) + " of " + pages + " page(s) read";
+            return;
+        }
+        loading = true;
+        var script = document.createElement("script");
+        script.src = folder + "/page_" + next + ".js";
+        script.onload = script.onerror = function () { script.remove(); };
+        document.head.appendChild(script);
+    }
+
+    window.addPage = function (page, text) {
+        loading = false;
+        if (page === next) {
+            next++;
+            var rows = document.createElement("template");
+            rows.innerHTML = text;
+            if (query) {
+                Array.prototype.forEach.call(rows.content.querySelectorAll("tr"), function (row) {
+                    if (row.textContent.toLowerCase().indexOf(query) < 0) {
+                        row.remove();
+                    }
+                });
+            }
+            body.appendChild(rows.content);
+        }
+        more();
+    };
+
+    search.addEventListener("change", function () {
+        query = search.value.toLowerCase();
+        body.innerHTML = "";
+        next = 1;
+        more();
+    });
+    window.addEventListener("scroll", more);
+    window.addEventListener("resize", more);
+    more();
+})();
+</script>
+"""
+
+def _write_html_page(file_name, page, rows, markup_columns):
+    '''Render one page of a paged html report and save it as a script adding its rows to the report, runs in the
+worker processes of PagedHTMLReportWriter. The rows are rendered a buffer at a time and put in a javascript template
+string. Returns the number of rows'''
+    renderer = HTMLRowRenderer(markup_columns)
+    step = ReportWriter.buffer_rows
+    text = "".join([renderer.render(rows[i:i + step]) for i in range(0, len(rows), step)])
+    text = text.replace("\\", "\\\\").replace("`", "\\`").replace("${", "\\${").replace("\r", "\\r")
+    with open(file_name, "w", encoding="utf-8") as f:
+        f.write("addPage(%d, `%s`);\n" % (page, text))
+    return len(rows)
+
+class PagedHTMLReportWriter(HTMLReportWriter):
+    '''Stream a html report split into pages, for reports too large for a browser to open in one piece. The report
+file is an index page with the header and the number of results, the rows are saved HTML_PAGE_ROWS at a time to
+scripts in a <report name>_pages directory next to it, which the index page reads as the table is scrolled down or
+searched. Pages are rendered and saved by HTML_PAGE_WORKERS processes while the next ones are read'''
+    renders_text = False
+    compressible = False
+
+    def open(self):
+        self.pages_dir = os.path.splitext(self.file_name)[0] + "_pages"
+        if os.path.exists(self.pages_dir):
+            sys.exit("%s already exists! Rename or move that directory to avoid losing your data!" % self.pages_dir)
+        os.makedirs(self.pages_dir)
+        HTMLReportWriter.open(self)
+        self.pages = 0
+        self._page = []
+        self._pool = None
+        self._pending = []
+
+    def write_rows(self, rows):
+        self._page.extend(rows)
+        while len(self._page) >= HTML_PAGE_ROWS:
+            self._write_page(self._page[:HTML_PAGE_ROWS])
+            del self._page[:HTML_PAGE_ROWS]
+
+    def _write_page(self, rows):
+        self.pages += 1
+        file_name = os.path.join(self.pages_dir, "page_%d.js" % self.pages)
+        if self.pages == 1 or HTML_PAGE_WORKERS < 2:
+            # the worker processes are only started once there's a second page, small reports don't need them
+            _write_html_page(file_name, self.pages, rows, self.markup_columns)
+            return
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=HTML_PAGE_WORKERS)
+        if len(self._pending) >= 2 * HTML_PAGE_WORKERS:
+            # don't keep more pages in memory than the workers can take on
+            self._pending.pop(0).result()
+        self._pending.append(self._pool.submit(_write_html_page, file_name, self.pages, rows, self.markup_columns))
+
+    def footer(self):
+        folder = json.dumps(os.path.basename(self.pages_dir)).replace("</", "<\\/")
+        return "</tbody></table>" + PAGED_HTML_SCRIPT % (self.pages, folder) + "</center></body></html>"
+
+    def finish(self):
+        try:
+            if self._page:
+                self._write_page(self._page)
+                self._page = []
+            for future in self._pending:
+                future.result()
+        except IOError as ie:
+            sys.exit("Could not save the result... An IOError occured: %s" % ie)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+        HTMLReportWriter.finish(self)
+
+class CSVReportWriter(ReportWriter):
+    '''Stream a csv file with a header row of column names'''
+    extension = ".csv"
+
+    def open(self):
+        self._file = OutputFile(self.file_name)
+        self.write_text(self.render_rows([self.columns]))
+
+    def render_rows(self, rows):
+        text = io.StringIO()
+        csv.writer(text).writerows([["" if cell is None else cell for cell in cells] for cells in rows])
+        return text.getvalue()
+
+    def write_text(self, text):
+        self._file.write(text.encode("utf-8"))
+
+    def finish(self):
+        self._file.close()
+
+class JSONLReportWriter(ReportWriter):
+    '''Stream a json lines file, one object per row mapping column names to values'''
+    extension = ".jsonl"
+
+    def open(self):
+        self._file = OutputFile(self.file_name)
+
+    def render_rows(self, rows):
+        columns = self.columns
+        return "".join([json.dumps(dict(zip(columns, cells)), default=str, ensure_ascii=False) + "\n" for cells in rows])
+
+    def write_text(self, text):
+        self._file.write(text.encode("utf-8"))
+
+    def finish(self):
+        self._file.close()
+
+class ParquetReportWriter(ReportWriter):
+    '''Stream a parquet file, every buffered batch of rows is turned into columns and written as one record batch.
+All the columns are stored as strings. Requires pyarrow'''
+    extension = ".parquet"
+    buffer_rows = 65536
+    renders_text = False
+    compressible = False
+
+    def open(self):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            sys.exit("pyarrow module not found... to install it use the command: pip install pyarrow")
+        self._pa = pyarrow
+        self._schema = pyarrow.schema([(column, pyarrow.string()) for column in self.columns])
+        self._writer = pyarrow.parquet.ParquetWriter(self.file_name, self._schema)
+
+    def write_rows(self, rows):
+        pa = self._pa
+        arrays = [pa.array([None if cell is None else str(cell) for cell in column], type=pa.string())
+                  for column in zip(*rows)]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self._schema))
+
+    def finish(self):
+        self._writer.close()
+
+REPORT_WRITERS = {"html" : HTMLReportWriter, "pages" : PagedHTMLReportWriter, "csv" : CSVReportWriter,
+                  "jsonl" : JSONLReportWriter, "parquet" : ParquetReportWriter}
+OUTPUT_FORMAT = "html"
+
+def set_output_format(fmt):
+    '''Choose the format of every following report: html, pages (html split in pages), csv, jsonl or parquet'''
+    global OUTPUT_FORMAT
+    if fmt not in REPORT_WRITERS:
+        sys.exit("Unrecognized output format %s! Choose one of: %s" % (fmt, ", ".join(sorted(REPORT_WRITERS))))
+    OUTPUT_FORMAT = fmt
+
+def add_output_options(parser, stages=None, reports="the reports", format_flag="--format", compress_flag="--compress",
+                       format_help=None, compress_help=None, pstats=True):
+    '''Add the output options shared by the command line tools to an optparse parser, stored as options.format,
+compress, profile and pstats. stages is what --profile times in this tool, eg: "reading the hives, rendering and writing
+the report", None leaves out the profiling options. reports names what --format and --compress apply to, None leaves
+out --format for the tools that don't write reports, their --compress is only added if compress_help is given.
+format_help and compress_help replace the default help, pass pstats False to leave out --pstats'''
+    if reports:
+        format_help = format_help or "the report format: html, pages (html split in pages, for reports too large to open" \
+                      + " in one piece), csv, jsonl or parquet (requires pyarrow). default html"
+        parser.add_option(format_flag, dest="format", type="choice", choices=sorted(REPORT_WRITERS), default="html",
+                          help=format_help)
+        compress_help = compress_help or "compress %s with gzip or zstd (requires zstandard) and add .gz or .zst to the" \
+                        " file name. Paged html and parquet reports aren't compressed" % reports
+    if compress_help:
+        parser.add_option(compress_flag, dest="compress", type="choice", choices=sorted(COMPRESSION_EXTENSIONS),
+                          help=compress_help)
+    if stages:
+        profile_help = "print how long each stage of the run took when done, with the rows per second of each: %s" % stages
+        parser.add_option("--profile", dest="profile", action="store_true", default=False, help=profile_help)
+        if pstats:
+            pstats_help = "profile the run and also save cProfile statistics to the given file for deeper analysis," \
+                          + " eg: python -m pstats <file>"
+            parser.add_option("--pstats", dest="pstats", type="string", help=pstats_help)
+
+def report_file_name(file_name):
+    '''Swap a report's .html extension for the one of the current output format, and add the one of the current
+output compression unless the format can't be compressed'''
+    writer = REPORT_WRITERS[OUTPUT_FORMAT]
+    base, ext = os.path.splitext(file_name)
+    if ext.lower() == ".html":
+        file_name = base + writer.extension
+    return compressed_name(file_name) if writer.compressible else file_name
+
+def open_report(file_name, title, header_template, **kwargs):
+    '''Open a streaming report writer for the current output format, file_name is given with its .html extension'''
+    return REPORT_WRITERS[OUTPUT_FORMAT](report_file_name(file_name), title, header_template, **kwargs)
+
+def open_output_file(file_name, title, columns):
+    '''Open a csv, jsonl or parquet writer chosen by the extension of file_name, for the batch modes saving all their
+results to one file. csv and jsonl files are compressed when their name ends with .gz or .zst, or with the current
+output compression'''
+    writers = dict((writer.extension, writer) for writer in (CSVReportWriter, JSONLReportWriter, ParquetReportWriter))
+    base = os.path.splitext(file_name)[0] if compression_of(file_name) else file_name
+    writer = writers.get(os.path.splitext(base)[1].lower())
+    if writer is None:
+        sys.exit("Unsupported output file type %s! Use a .csv, .jsonl or .parquet file" % file_name)
+    if writer.compressible:
+        file_name = compressed_name(file_name)
+    return writer(file_name, title, None, columns=columns)
+
+def walkFiles(root):
+    '''Yield the path of every file under a directory tree'''
+    for dir_path, dir_names, file_names in os.walk(root):
+        for file_name in file_names:
+            yield os.path.join(dir_path, file_name)
+
+def template_columns(header_template):
+    '''Get the column names of a report from the <th> tags of its html table header template'''
+    return [name.strip() for name in re.findall(r"<th\b[^>]*>(.*?)</th>", init_table_header(header_template), re.S)]
+
+WAL_MAGIC = (0x377f0682, 0x377f0683)
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+# frames checked at a time when scanning a write ahead log
+WAL_CHUNK_FRAMES = 256
+
+_wal_snapshots = {}
+
+def _wal_checksum(data, s0, s1, big_endian):
+    '''sqlite's write ahead log checksum of data, continuing from the checksum (s0, s1)'''
+    words = struct.unpack((">%dI" if big_endian else "<%dI") % (len(data) // 4), data)
+    for i in range(0, len(words), 2):
+        s0 = (s0 + words[i] + s1) & 0xffffffff
+        s1 = (s1 + words[i + 1] + s0) & 0xffffffff
+    return s0, s1
+
+@lru_cache(maxsize=None)
+def _wal_checksum_weights(pairs):
+    '''Each checksum step is linear: (s0, s1) becomes M (s0, s1) + (x0, x0 + x1) with M = [[1, 1], [1, 2]], so the
+checksum of n word pairs is M^n times the starting checksum plus the checksum starting from 0, and the pair i adds
+M^(n - 1 - i) (x0, x0 + x1) to it. Returns M^n and the weights of the n pairs, all modulo 2^32'''
+    power = (1, 0, 0, 1)
+    weights = []
+    for i in range(pairs):
+        weights.append(power)
+        a, b, c, d = power
+        power = ((a + c) & 0xffffffff, (b + d) & 0xffffffff, (a + 2 * c) & 0xffffffff, (b + 2 * d) & 0xffffffff)
+    weights.reverse()
+    if numpy is not None:
+        weights = numpy.array(weights, dtype=numpy.uint32)
+    return power, weights
+
+def _wal_frame_sums(chunk, frames, page_size, big_endian):
+    '''The checksum of each frame in a chunk of consecutive frames starting from (0, 0). The frame checksum covers
+the first 8 bytes of the frame header and the page, with numpy every frame of the chunk is summed at once'''
+    frame_size = WAL_FRAME_HEADER_SIZE + page_size
+    if numpy is None:
+        sums = []
+        for pos in range(0, frames * frame_size, frame_size):
+            s0, s1 = _wal_checksum(chunk[pos:pos + 8], 0, 0, big_endian)
+            sums.append(_wal_checksum(chunk[pos + WAL_FRAME_HEADER_SIZE:pos + frame_size], s0, s1, big_endian))
+        return sums
+    words = numpy.frombuffer(chunk, dtype=">u4" if big_endian else "<u4", count=frames * frame_size // 4)
+    words = words.reshape(frames, frame_size // 4)
+    pairs = numpy.concatenate((words[:, :2], words[:, WAL_FRAME_HEADER_SIZE // 4:]), axis=1).astype(numpy.uint32)
+    x0 = pairs[:, 0::2]
+    x01 = x0 + pairs[:, 1::2]
+    weights = _wal_checksum_weights(pairs.shape[1] // 2)[1]
+    # uint32 arithmetic wraps around, which is exactly the checksum's modulo 2^32
+    s0 = (x0 * weights[:, 0] + x01 * weights[:, 1]).sum(axis=1, dtype=numpy.uint32)
+    s1 = (x0 * weights[:, 2] + x01 * weights[:, 3]).sum(axis=1, dtype=numpy.uint32)
+    return list(zip(s0.tolist(), s1.tolist()))
+
+def read_wal(wal):
+    '''Scan a write ahead log the way sqlite recovers it: frames are read in order until one has salts that don't match
+the header (a left over from before the log was restarted) or a bad checksum (a torn write). The log is memory mapped
+and checked a chunk of frames at a time, it's never copied. Returns (page size, frames, commits) or None if the file
+isn't a valid log: frames is a list of (page number, offset of the page in the log) up to the last commit and commits
+a list of (number of frames, database size in pages) for each committed transaction'''
+    with open(wal, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < WAL_HEADER_SIZE:
+            return None
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, page_size, sequence, salt1, salt2, sum0, sum1 = struct.unpack_from(">8I", buf, 0)
+            if magic not in WAL_MAGIC or page_size & (page_size - 1) or not 512 <= page_size <= 65536:
+                return None
+            big_endian = magic & 1
+            if _wal_checksum(buf[:24], 0, 0, big_endian) != (sum0, sum1):
+                return None
+            frame_size = WAL_FRAME_HEADER_SIZE + page_size
+            step = _wal_checksum_weights((8 + page_size) // 8)[0]
+            total = (size - WAL_HEADER_SIZE) // frame_size
+            frames = []
+            commits = []
+            for first in range(0, total, WAL_CHUNK_FRAMES):
+                count = min(WAL_CHUNK_FRAMES, total - first)
+                start = WAL_HEADER_SIZE + first * frame_size
+                chunk = buf[start:start + count * frame_size]
+                for i, (c0, c1) in enumerate(_wal_frame_sums(chunk, count, page_size, big_endian)):
+                    page, db_pages, frame_salt1, frame_salt2, frame_sum0, frame_sum1 = struct.unpack_from(">6I", chunk, i * frame_size)
+                    sum0, sum1 = ((step[0] * sum0 + step[1] * sum1 + c0) & 0xffffffff,
+                                  (step[2] * sum0 + step[3] * sum1 + c1) & 0xffffffff)
+                    if page == 0 or (frame_salt1, frame_salt2) != (salt1, salt2) or (frame_sum0, frame_sum1) != (sum0, sum1):
+                        return page_size, frames[:commits[-1][0] if commits else 0], commits
+                    frames.append((page, start + i * frame_size + WAL_FRAME_HEADER_SIZE))
+                    if db_pages:
+                        commits.append((len(frames), db_pages))
+            return page_size, frames[:commits[-1][0] if commits else 0], commits
+        finally:
+            buf.close()
+
+def build_wal_snapshot(db, target, commit=None):
+    '''Save a database as it was after one of the transactions in its write ahead log, the last one by default
+(commits are counted from 1). The database is copied by the operating system and only the latest version of each
+page changed up to that commit is read from the log and written over the copy. The evidence files are only read.
+Returns the number of pages taken from the log, None if the log has no committed transaction'''
+    path = os.path.abspath(db)
+    wal = read_wal(path + "-wal")
+    if not wal or not wal[2]:
+        return None
+    page_size, frames, commits = wal
+    if commit is None:
+        commit = len(commits)
+    if not 0 < commit <= len(commits):
+        sys.exit("The write ahead log of %s has %d commit(s), can't read commit %d" % (db, len(commits), commit))
+    frame_count, db_pages = commits[commit - 1]
+    # later frames of a page replace the earlier ones
+    latest = dict(frames[:frame_count])
+    shutil.copyfile(path, target)
+    with open(path + "-wal", "rb") as src, open(target, "r+b") as dst:
+        dst.truncate(db_pages * page_size)
+        for page in sorted(latest):
+            if page <= db_pages:
+                src.seek(latest[page])
+                dst.seek((page - 1) * page_size)
+                dst.write(src.read(page_size))
+        # mark the copy as a rollback journal database so sqlite doesn't look for a log next to it
+        dst.seek(18)
+        dst.write(b"\x01\x01")
+    return len(latest)
+
+def wal_snapshot(db, commit=None):
+    '''Return the path of a temporary snapshot of a database with its write ahead log applied up to a commit, built
+once per process. Returns None if the log has no committed transaction, the database file alone is then complete'''
+    path = os.path.abspath(db)
+    key = (path, commit)
+    if key not in _wal_snapshots:
+        snapshot = os.path.join(tempfile.mkdtemp(prefix="forensic_tools_"), os.path.basename(path))
+        if build_wal_snapshot(path, snapshot, commit) is None:
+            shutil.rmtree(os.path.dirname(snapshot), ignore_errors=True)
+            snapshot = None
+        _wal_snapshots[key] = snapshot
+    return _wal_snapshots[key]
+
+@atexit.register
+def remove_wal_snapshots():
+    '''Delete the temporary write ahead log snapshots'''
+    close_connections()
+    for snapshot in _wal_snapshots.values():
+        if snapshot:
+            shutil.rmtree(os.path.dirname(snapshot), ignore_errors=True)
+    _wal_snapshots.clear()
+
+FETCH_BATCH_SIZE = 1000
+
+CACHE_SIZE_KB = 262144
+MMAP_SIZE = 1073741824
+
+_connections = {}
+_connections_pid = os.getpid()
+
+def get_connection(db):
+    '''Return a read only connection to a database, connections are opened once per process and cached by path.
+Evidence databases are opened as file:...?mode=ro&immutable=1 uris so sqlite never writes to them or locks them.
+immutable makes sqlite ignore the write ahead log, so databases with a non empty -wal file are read from a snapshot
+with the log applied instead, see wal_snapshot'''
+    global _connections_pid
+    if _connections_pid != os.getpid():
+        # connections can't be shared with a forked parent process, start a fresh cache
+        _connections.clear()
+        _connections_pid = os.getpid()
+
+    path = os.path.abspath(db)
+    conn = _connections.get(path)
+    if conn is None:
+        source = path
+        wal = path + "-wal"
+        if os.path.isfile(wal) and os.path.getsize(wal) > 0:
+            source = wal_snapshot(path) or path
+        conn = sqlite3.connect("file:%s?mode=ro&immutable=1" % pathname2url(source), uri=True)
+        conn.execute("PRAGMA cache_size = -%d;" % CACHE_SIZE_KB)
+        conn.execute("PRAGMA mmap_size = %d;" % MMAP_SIZE)
+        _connections[path] = conn
+    return conn
+
+@atexit.register
+def close_connections():
+    '''Close every cached database connection'''
+    if _connections_pid == os.getpid():
+        for conn in _connections.values():
+            conn.close()
+    _connections.clear()
+
+def _fetch_batches(cursor, batch_size):
+    '''Yield fetchmany batches from an executed cursor and close it once exhausted'''
     try:
-        conn = sqlite3.connect(db)
-        c = conn.cursor()
-        c.execute(command)
-        return c.fetchall()
+        while True:
+            with profile_stage("fetch") as stage:
+                rows = cursor.fetchmany(batch_size)
+                stage.rows = len(rows)
+            if not rows:
+                break
+            yield rows
+    except sqlite3.Error as e:
+        sys.exit("Error reading the database: %s" % e)
+    finally:
+        cursor.close()
+
+def iter_batches_from_db(db, command, params=(), batch_size=FETCH_BATCH_SIZE, facebook_name=False):
+    '''Send a query to a database and return an iterator over the results as lists of at most batch_size rows.
+The query runs straight away so errors are reported before any output is written, the rows are then fetched
+lazily with fetchmany from the cached connection, only one batch is held in memory at a time'''
+    try:
+        with profile_stage("open"):
+            c = get_connection(db).cursor()
+        with profile_stage("query"):
+            c.execute(command, params)
     except Exception as e:
         if facebook_name:
-            return [("Name Unavailable %s" % e,)]
+            return iter([[("Name Unavailable %s" % e,)]])
         else:
             sys.exit("Error reading the database: %s" % e)
+    return _fetch_batches(c, batch_size)
+
+def iter_from_db(db, command, params=(), batch_size=FETCH_BATCH_SIZE, facebook_name=False):
+    '''Send a query to a database and yield the resulting rows one at a time, fetching them batch_size rows at a time'''
+    for rows in iter_batches_from_db(db, command, params, batch_size, facebook_name):
+        for row in rows:
+            yield row
+
+def pull_from_db(db, command, facebook_name=False, params=()):
+    '''Send queries to a database and return the results'''
+    return list(iter_from_db(db, command, params, facebook_name=facebook_name))
+
+@lru_cache(maxsize=None)
+def read_template(template_file):
+    '''Read a template file once, relative paths that aren't found from the working directory are looked up
+next to this script'''
+    if not os.path.isfile(template_file) and not os.path.isabs(template_file):
+        template_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), template_file)
+    with open(template_file) as tf:
+        return tf.read()
+
+STATE_FILE = ".scan_state.json"
+
+def table_schema(db, table):
+    '''Hash the CREATE statement of a table. Unlike its rows, it stays the same as rows are added and old ones are
+pruned, so it only changes when an app update changes the table'''
+    schema = hashlib.sha1()
+    for row in iter_from_db(db, "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;", (table,)):
+        schema.update(repr(row).encode("utf-8"))
+    return schema.hexdigest()
+
+class ScanState(object):
+    '''Checkpoint of an incremental scan, stored per (device, artifact, table schema) in STATE_FILE in the output
+directory. device is any name given to the device the database was pulled from, it defaults to the database path;
+pass the same device to continue the scans of fresh pulls saved to other paths. Rows are checkpointed by the rowid of
+table, which sqlite hands out in increasing order, so rows added with an older or equal timestamp are still read by
+the next run. last is the highest rowid exported so far, or None on the first run. Each run is saved to a new report
+segment: the first run uses the normal report name, later runs add _2, _3... before the extension'''
+    def __init__(self, db, artifact, table, device=None):
+        self.state_file = output_path(STATE_FILE)
+        self.db = os.path.abspath(db)
+        self.device = device or self.db
+        self.artifact = artifact
+        self.table = table
+        self.schema = table_schema(db, table)
+        self.key = "%s:%s:%s" % (self.device, artifact, self.schema)
+        self.states = {}
+        if os.path.isfile(self.state_file):
+            try:
+                with open(self.state_file, encoding="utf-8") as sf:
+                    self.states = json.load(sf)
+            except ValueError:
+                sys.exit("%s is corrupted! Move it away to start a new incremental scan" % self.state_file)
+        state = self.states.get(self.key)
+        if state is None:
+            self._check_known()
+            state = {}
+        self.last = state.get("last")
+        self.segment = state.get("segment", 0)
+        self._max = self.last
+
+    def _check_known(self):
+        '''Tell the user when the device or database was scanned before under another key, its table was changed by
+an app update or the checkpoint was saved by an older version, instead of silently reading everything again'''
+        for key, state in self.states.items():
+            if state.get("artifact", key.rpartition(":")[2]) != self.artifact:
+                continue
+            if state.get("device", state.get("db")) == self.device:
+                print("%s was scanned incrementally before (%s) but the %s table has changed or the checkpoint was saved"
+                      " by an older version, starting a new checkpoint: all its rows are read again" \
+                      % (self.device, state.get("updated", "unknown date"), self.table))
+                return
+
+    def apply(self, query):
+        '''Add the rowid of the table as the last column of query and, after the first run, only select the rows
+added since the previous one'''
+        query.add_columns("%s.rowid" % self.table)
+        if self.last is not None:
+            query.where("%s.rowid > ?" % self.table, self.last)
+        return query
+
+    def report_name(self, file_name):
+        '''Return the name of the next report segment that doesn't exist yet'''
+        base, ext = os.path.splitext(file_name)
+        while True:
+            self.segment += 1
+            name = file_name if self.segment == 1 else "%s_%d%s" % (base, self.segment, ext)
+            if not os.path.isfile(output_path(report_file_name(name))):
+                return name
+
+    def seen(self, rowid):
+        '''Record the rowid of an exported row'''
+        if rowid is not None and (self._max is None or rowid > self._max):
+            self._max = rowid
+
+    def seen_batch(self, rows):
+        '''Record the rowids of a batch of rows from a query passed to apply, the rowid is their last column'''
+        if rows:
+            self.seen(max(row[-1] for row in rows))
+
+    def save(self):
+        '''Save the checkpoint so the next run only reads rows added after the ones exported by this one'''
+        self.states[self.key] = {"db" : self.db, "device" : self.device, "artifact" : self.artifact, "schema" : self.schema,
+                                 "last" : self._max, "segment" : self.segment, "updated" : dt.now().isoformat()}
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as sf:
+            json.dump(self.states, sf, indent=1)
+        os.replace(tmp_file, self.state_file)
+
+USE_RESULT_CACHE = False
+RESULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".forensic_tools_cache")
+RESULT_CACHE_MAX_BYTES = 2147483648
+RESULT_CACHE_VERSION = 2
+HASH_CHUNK_SIZE = 8388608
+
+_file_digests = {}
+_loaded_digests = []
+_result_recorder = None
+_MISS = object()
+
+def set_result_cache(enabled, directory=None, max_bytes=None):
+    '''Serve repeated reads of the same evidence with the same options from the result cache, see cached_result'''
+    global USE_RESULT_CACHE, RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+    USE_RESULT_CACHE = enabled
+    if directory:
+        RESULT_CACHE_DIR = directory
+    if max_bytes:
+        RESULT_CACHE_MAX_BYTES = max_bytes
+
+def _hash_chunk(chunk):
+    return hashlib.blake2b(chunk, digest_size=32).digest()
+
+def _load_digests():
+    '''Read the digests saved by previous runs once per cache directory'''
+    memo_file = os.path.join(RESULT_CACHE_DIR, "digests.json")
+    if memo_file not in _loaded_digests:
+        _loaded_digests.append(memo_file)
+        try:
+            with open(memo_file, encoding="utf-8") as mf:
+                _file_digests.update(json.load(mf))
+        except (IOError, OSError, ValueError):
+            pass
+    return memo_file
+
+def _save_digest(memo_file, memo, digest):
+    '''Add a digest to the ones saved on disk, keeping the ones other processes saved in the meantime'''
+    digests = {}
+    try:
+        with open(memo_file, encoding="utf-8") as mf:
+            digests = json.load(mf)
+    except (IOError, OSError, ValueError):
+        pass
+    digests[memo] = digest
+    tmp_file = "%s.%d.tmp" % (memo_file, os.getpid())
+    try:
+        os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+        with open(tmp_file, "w", encoding="utf-8") as mf:
+            json.dump(digests, mf)
+        os.replace(tmp_file, memo_file)
+    except (IOError, OSError):
+        pass
+
+def file_digest(path):
+    '''Hash a file's contents. The file is memory mapped and its HASH_CHUNK_SIZE chunks are hashed by a pool of
+threads, hashlib releases the GIL while hashing, the digest is the hash of the chunk hashes. Digests are memoized by
+(device, inode, modification time, size), in memory and in the cache directory, so an unchanged multi GB database is
+hashed only once'''
+    stats = os.stat(path)
+    memo = "%d:%d:%d:%d" % (stats.st_dev, stats.st_ino, stats.st_mtime_ns, stats.st_size)
+    memo_file = _load_digests()
+    if memo in _file_digests:
+        return _file_digests[memo]
+
+    digest = hashlib.blake2b(str(stats.st_size).encode("ascii"), digest_size=32)
+    if stats.st_size:
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(buf)
+            chunks = [view[i:i + HASH_CHUNK_SIZE] for i in range(0, len(buf), HASH_CHUNK_SIZE)]
+            try:
+                with ThreadPoolExecutor(max_workers=min(len(chunks), os.cpu_count() or 1)) as pool:
+                    for chunk_digest in pool.map(_hash_chunk, chunks):
+                        digest.update(chunk_digest)
+            finally:
+                for chunk in chunks:
+                    chunk.release()
+                view.release()
+                buf.close()
+    _file_digests[memo] = digest.hexdigest()
+    _save_digest(memo_file, memo, _file_digests[memo])
+    return _file_digests[memo]
+
+def result_key(function, arguments, companions=()):
+    '''The cache key of a read function call: the function and the code that renders its rows, its arguments with
+the files among them identified by their contents (with their -wal file and the companion files next to them), the
+output format and the timezone local times are shown in'''
+    module_file = getattr(sys.modules[function.__module__], "__file__", "")
+    parts = [RESULT_CACHE_VERSION, os.path.basename(module_file), function.__qualname__,
+             [file_digest(source) for source in (module_file, __file__) if source], OUTPUT_FORMAT, time.tzname, time.timezone,
+             time.altzone]
+    for name, value in sorted(arguments.items()):
+        if isinstance(value, str) and os.path.isfile(value):
+            related = [value + "-wal"] + [os.path.join(os.path.dirname(value), companion) for companion in companions]
+            value = ("file", file_digest(value)) + tuple(file_digest(path) if os.path.isfile(path) else None for path in related)
+        parts.append((name, value))
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=20).hexdigest()
+
+def _write_frame(f, frame):
+    data = zlib.compress(marshal.dumps(frame), 1)
+    f.write(struct.pack(">I", len(data)) + data)
+
+def _read_frames(f):
+    while True:
+        head = f.read(4)
+        if not head:
+            return
+        yield marshal.loads(zlib.decompress(f.read(struct.unpack(">I", head)[0])))
+
+class _ResultRecorder(object):
+    '''Copy the row batches flushed by the reports of one read function call into a new cache entry. An entry is a
+sequence of length prefixed, zlib compressed marshal frames: one per report, one per row batch and the return value.
+Text reports save their batches already rendered, so replaying them is little more than a file copy'''
+    def __init__(self, entry):
+        self.entry = entry
+        self.tmp_file = "%s.%d.tmp" % (entry, os.getpid())
+        self.file = open(self.tmp_file, "wb")
+        self.reports = {}
+        self.failed = False
+
+    def add_report(self, writer):
+        self.reports[id(writer)] = len(self.reports)
+        self.write(("report", self.reports[id(writer)], writer.report_name, writer.title, writer.header_template, writer.columns))
+
+    def add_rows(self, writer, rows):
+        self.write(("rows", self.reports[id(writer)], rows))
+
+    def add_text(self, writer, text, rows):
+        self.write(("text", self.reports[id(writer)], text, rows))
+
+    def write(self, frame):
+        if self.failed:
+            return
+        try:
+            _write_frame(self.file, frame)
+        except ValueError:
+            # a value marshal can't store, this result isn't cached
+            self.failed = True
+
+    def finish(self, result):
+        self.write(("result", result))
+        self.file.close()
+        if self.failed:
+            os.remove(self.tmp_file)
+            return
+        os.replace(self.tmp_file, self.entry)
+        evict_results()
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.tmp_file)
+
+def _replay_result(entry):
+    '''Write the reports saved in a cache entry again, in the current output format and directory. Returns the read
+function's return value, or _MISS if the entry is damaged'''
+    writers = {}
+    result = None
+    try:
+        with open(entry, "rb") as f:
+            for frame in _read_frames(f):
+                if frame[0] == "report":
+                    ref, name, title, header_template, columns = frame[1:]
+                    if compression_of(name):
+                        name = os.path.splitext(name)[0]
+                    writers[ref] = open_report(os.path.splitext(name)[0] + ".html", title, header_template, columns=columns)
+                elif frame[0] == "rows":
+                    writers[frame[1]].write_batch(frame[2])
+                elif frame[0] == "text":
+                    writers[frame[1]].write_rendered(frame[2], frame[3])
+                else:
+                    result = frame[1]
+    except (zlib.error, ValueError, EOFError, TypeError, KeyError, IndexError, struct.error):
+        for writer in writers.values():
+            writer.close()
+            os.remove(writer.file_name)
+        os.remove(entry)
+        return _MISS
+    for writer in writers.values():
+        writer.close()
+    # mark the entry as recently used
+    os.utime(entry)
+    return result
+
+def evict_results():
+    '''Delete the least recently used cache entries until the cache fits in RESULT_CACHE_MAX_BYTES'''
+    entries = []
+    for name in os.listdir(RESULT_CACHE_DIR):
+        if name.endswith(".bin"):
+            try:
+                stats = os.stat(os.path.join(RESULT_CACHE_DIR, name))
+            except OSError:
+                continue
+            entries.append((stats.st_mtime, stats.st_size, os.path.join(RESULT_CACHE_DIR, name)))
+    total = sum(entry[1] for entry in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= RESULT_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+def cached_result(*companions):
+    '''Decorate a read function so that while the result cache is enabled, calling it again on the same evidence with
+the same arguments writes the reports saved by the first call instead of querying and rendering everything again.
+companions are the names of other databases the function reads from the directory of its database, eg: wa.db.
+Incremental reads depend on the saved scan state and always run'''
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            global _result_recorder
+            if not USE_RESULT_CACHE or _result_recorder is not None:
+                return function(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if bound.arguments.get("incremental"):
+                return function(*args, **kwargs)
+
+            entry = os.path.join(RESULT_CACHE_DIR, result_key(function, bound.arguments, companions) + ".bin")
+            if os.path.isfile(entry):
+                result = _replay_result(entry)
+                if result is not _MISS:
+                    return result
+            os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+            recorder = _result_recorder = _ResultRecorder(entry)
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                recorder.discard()
+                raise
+            finally:
+                _result_recorder = None
+            recorder.finish(result)
+            return result
+        return wrapper
+    return decorator
+
+SQLITE_MAX_INT = 9223372036854775807
+
+class Query(object):
+    '''Build a parameterized SELECT statement. Conditions are added with where, time_range and like, values are
+always bound as parameters instead of being formatted into the sql. Takes 1 argument: the select statement without
+its WHERE clause, eg: "SELECT url, title FROM urls"'''
+    def __init__(self, select):
+        self.select = select
+        self.conditions = []
+        self.params = []
+        self.order = None
+        self.indexes = []
+
+    def where(self, condition, *params):
+        '''Add a condition, with ? placeholders for the params'''
+        self.conditions.append("(%s)" % condition)
+        self.params.extend(params)
+        return self
+
+    def time_range(self, column, tm_min=None, tm_max=None, scale=1, epoch=0):
+        '''Keep the rows where column / scale - epoch is greater than tm_min and less than tm_max, epoch being the
+seconds between the column's epoch and the unix epoch. The bounds are converted to the column's units instead of
+converting the column, so sqlite can use an index on the column'''
+        if tm_min is not None:
+            self.where("%s > ?" % column, self._bound((tm_min + epoch) * scale))
+        if tm_max is not None and (tm_max + epoch) * scale < SQLITE_MAX_INT:
+            self.where("%s < ?" % column, self._bound((tm_max + epoch) * scale))
+        return self
+
+    @staticmethod
+    def _bound(value):
+        '''Keep whole bounds as integers so they compare exactly with integer timestamp columns'''
+        return int(value) if value == int(value) else value
+
+    def like(self, column, value, contains=True):
+        '''Keep the rows where column matches value, anywhere in the column if contains is True'''
+        return self.where("%s LIKE ?" % column, "%" + value + "%" if contains else value)
+
+    def add_columns(self, *columns):
+        '''Add columns to the end of the select list, after the ones the readers use'''
+        select, sep, tables = self.select.partition(" FROM ")
+        self.select = select + ", " + ", ".join(columns) + sep + tables
+        return self
+
+    def order_by(self, order):
+        self.order = order
+        return self
+
+    def index(self, table, *columns):
+        '''Declare the index that would serve this query, it's created on a working copy of the database if
+working indexes are enabled with set_working_indexes'''
+        self.indexes.append((table, columns))
+        return self
+
+    @property
+    def sql(self):
+        command = self.select
+        if self.conditions:
+            command += " WHERE " + " AND ".join(self.conditions)
+        if self.order:
+            command += " ORDER BY " + self.order
+        return command + ";"
+
+    def run(self, db, batch_size=FETCH_BATCH_SIZE):
+        '''Run the query and return an iterator over the resulting rows'''
+        return (row for rows in self.run_batches(db, batch_size) for row in rows)
+
+    def run_batches(self, db, batch_size=FETCH_BATCH_SIZE):
+        '''Run the query and return an iterator over the resulting rows, batch_size rows at a time'''
+        if USE_WORKING_INDEXES and self.indexes:
+            with profile_stage("open"):
+                db = working_copy(db, self.indexes)
+        return iter_batches_from_db(db, self.sql, self.params, batch_size)
+
+USE_WORKING_INDEXES = False
+_working_copies = {}
+
+def set_working_indexes(enabled):
+    '''Run indexed queries against a temporary working copy of each database with the indexes they need'''
+    global USE_WORKING_INDEXES
+    USE_WORKING_INDEXES = enabled
+
+def working_copy(db, indexes):
+    '''Copy a database to a temporary file once per process and create the given indexes on the copy, the evidence
+file itself is never modified. indexes is a list of (table, columns) tuples, returns the path of the copy'''
+    path = os.path.abspath(db)
+    copy = _working_copies.get(path)
+    if copy is None:
+        copy = os.path.join(tempfile.mkdtemp(prefix="forensic_tools_"), os.path.basename(path))
+        dst = sqlite3.connect(copy)
+        try:
+            get_connection(path).backup(dst)
+        except sqlite3.Error as e:
+            sys.exit("Error copying the database: %s" % e)
+        dst.close()
+        _working_copies[path] = copy
+
+    dst = sqlite3.connect(copy)
+    try:
+        existing = set(row[0] for row in dst.execute("SELECT name FROM sqlite_master WHERE type = 'index';"))
+        missing = [(table, columns) for table, columns in indexes if "_".join(("ft_idx", table) + tuple(columns)) not in existing]
+        for table, columns in missing:
+            dst.execute("CREATE INDEX %s ON %s (%s);" % ("_".join(("ft_idx", table) + tuple(columns)), table, ", ".join(columns)))
+        dst.commit()
+    except sqlite3.Error as e:
+        sys.exit("Error indexing the working copy of the database: %s" % e)
+    finally:
+        dst.close()
+    if missing:
+        # the copy has changed, drop any cached read only connection to it
+        conn = _connections.pop(os.path.abspath(copy), None)
+        if conn is not None:
+            conn.close()
+    return copy
+
+def prepare_working_copies(queries):
+    '''Create every index a group of queries needs before any of them runs, for queries whose results are read at
+the same time: adding an index to a working copy later would close the connection under the open ones.
+queries is a list of (database path, Query) tuples, nothing is done unless working indexes are enabled'''
+    if not USE_WORKING_INDEXES:
+        return
+    indexes = {}
+    for db, query in queries:
+        indexes.setdefault(db, []).extend(query.indexes)
+    for db, db_indexes in indexes.items():
+        working_copy(db, db_indexes)
+
+@atexit.register
+def remove_working_copies():
+    '''Delete the temporary working copies'''
+    for copy in _working_copies.values():
+        conn = _connections.pop(os.path.abspath(copy), None)
+        if conn is not None:
+            conn.close()
+        shutil.rmtree(os.path.dirname(copy), ignore_errors=True)
+    _working_copies.clear()
 
 def init_data(title, size):
     '''Generate static html with a time code and an appropriate title'''
     now = dt.now()
     try:
-        with open(r"./templates/init_static_html.html") as tf:
-            data = tf.readlines()
+        data = read_template(r"./templates/init_static_html.html").splitlines(True)
 
         data[1] = data[1] % title
         data[-1] = data[-1] % (now.year, now.month, now.day, now.hour, now.minute, now.second, size)
@@ -90,20 +1564,267 @@ def init_data(title, size):
 def init_table_header(template_file):
     '''Get the html table header from a given template file'''
     try:
-        with open(template_file) as tf:
-            data = tf.read()
-        return data
+        return read_template(template_file)
     except IOError:
         sys.exit("Couldn't find the template file: %s. Make sure the (unmodified) templates directory is" % template_file \
                  + " in the same directory as the script and try again...")
 
-def parse_timestamp(tm_stmp):
+# unit name : (ticks per second, seconds between the unit's epoch and the unix epoch)
+TIMESTAMP_UNITS = {"webkit" : (1000000, 11644473600),  # chrome, microseconds since 1601-01-01
+                   "prtime" : (1000000, 0),            # firefox, microseconds since 1970-01-01
+                   "unix_ms" : (1000, 0),
+                   "unix_s" : (1, 0)}
+TIMESTAMP_STYLES = ("iso", "ctime")
+
+def timestamp_to_text(tm_stmp, unit="unix_s", style="iso"):
+    '''Convert one raw timestamp to a local time string. Takes 3 arguments:
+tm_stmp: the raw timestamp value
+unit: one of the TIMESTAMP_UNITS, default unix_s
+style: iso for 2016-01-03 12:00:00 or ctime for Sun Jan  3 12:00:00 2016, default iso
+values that can't be converted return "Not Applicable"'''
+    ticks, epoch = TIMESTAMP_UNITS[unit]
     try:
-        ret_val = dt.fromtimestamp(tm_stmp/1000).ctime()
+        seconds = tm_stmp/ticks
+        if epoch:
+            seconds -= epoch
+        ret_val = dt.fromtimestamp(seconds)
+        ret_val = ret_val.ctime() if style == "ctime" else str(ret_val)
     except:
         ret_val = "Not Applicable"
     return ret_val
 
+def parse_timestamp(tm_stmp):
+    return timestamp_to_text(tm_stmp, "unix_ms", "ctime")
+
+@lru_cache(maxsize=65536)
+def _utc_offset(seconds):
+    '''The local utc offset in seconds at the given unix time, None if the platform can't convert it'''
+    try:
+        return time.localtime(seconds).tm_gmtoff
+    except (OverflowError, OSError, ValueError):
+        return None
+
+def _day_offset(day):
+    '''The local utc offset for a whole utc day, None if it changes during the day or can't be converted'''
+    offset = _utc_offset(day * 86400)
+    if offset is None or offset != _utc_offset(day * 86400 + 86399):
+        return None
+    return offset
+
+# the local time range datetime accepts, fromtimestamp also looks one day back to detect folds
+_MIN_LOCAL_SECONDS = -62135596800 + 86400
+_MAX_LOCAL_SECONDS = 253402300799
+_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+def _put_digits(text, column, values, width):
+    '''Write an array of numbers as zero padded digits into the given columns of a character code matrix'''
+    values = values.astype(numpy.uint32)
+    for i in range(column + width - 1, column - 1, -1):
+        values, digit = numpy.divmod(values, 10)
+        text[:, i] = digit + ord("0")
+
+def _char_codes(names):
+    return numpy.array([[ord(char) for char in name] for name in names], dtype=numpy.uint32)
+
+def _numpy_timestamps(values, unit, style):
+    '''Vectorized timestamp_to_text for an int64 or float64 array, gives the exact same strings'''
+    ticks, epoch = TIMESTAMP_UNITS[unit]
+    if values.dtype.kind == "f":
+        seconds = values / ticks
+    else:
+        seconds = values / ticks
+        # python divides integers exactly, the float conversion above is only exact up to 2**53
+        big = (values >= 2**53) | (values <= -2**53)
+        if big.any():
+            quotient, remainder = numpy.divmod(values[big], ticks)
+            seconds[big] = quotient.astype(numpy.float64) + remainder / ticks
+    if epoch:
+        seconds = seconds - epoch
+
+    # split into whole seconds and microseconds the way fromtimestamp does, rounding half to even
+    valid = numpy.isfinite(seconds) & (numpy.abs(seconds) < 1e12)
+    seconds = numpy.where(valid, seconds, 0.0)
+    whole = numpy.trunc(seconds)
+    micro = numpy.rint((seconds - whole) * 1e6)
+    whole = (whole + (micro >= 1e6) - (micro < 0)).astype(numpy.int64)
+    micro = (micro - 1e6 * (micro >= 1e6) + 1e6 * (micro < 0)).astype(numpy.int64)
+
+    # one utc offset lookup per day instead of one per value, only days with a dst change are looked up per value
+    days, inverse = numpy.unique(whole // 86400, return_inverse=True)
+    offsets = numpy.array([_day_offset(int(day)) for day in days], dtype=numpy.float64)[inverse.reshape(-1)]
+    for i in numpy.flatnonzero(numpy.isnan(offsets)):
+        offset = _utc_offset(int(whole[i]))
+        offsets[i] = numpy.nan if offset is None else offset
+    valid &= ~numpy.isnan(offsets)
+    local = whole + numpy.where(valid, offsets, 0).astype(numpy.int64)
+    valid &= (local >= _MIN_LOCAL_SECONDS) & (local <= _MAX_LOCAL_SECONDS)
+    local = numpy.where(valid, local, 0)
+
+    # build the strings in a matrix of character codes, one row per value, instead of formatting them one at a time
+    dates = (local // 86400).astype("datetime64[D]")
+    months = dates.astype("datetime64[M]")
+    year = months.astype("datetime64[Y]").astype(numpy.int64) + 1970
+    month = months.astype(numpy.int64) % 12
+    day = (dates - months.astype("datetime64[D]")).astype(numpy.int64) + 1
+    clock = local % 86400
+    if style == "ctime":
+        # Sun Jan  3 12:00:00 2016
+        text = numpy.full((len(local), 24), ord(" "), dtype=numpy.uint32)
+        text[:, 0:3] = _char_codes(_WEEKDAYS)[(local // 86400 + 3) % 7]
+        text[:, 4:7] = _char_codes(_MONTHS)[month]
+        _put_digits(text, 8, day, 2)
+        text[day < 10, 8] = ord(" ")
+        clock_column, year_column = 11, 20
+    else:
+        # 2016-01-03 12:00:00.123456, without the fraction when it's zero like str(datetime)
+        # unused trailing characters are left as 0, numpy strips them from the strings
+        text = numpy.zeros((len(local), 26), dtype=numpy.uint32)
+        text[:, [4, 7]] = ord("-")
+        text[:, 10] = ord(" ")
+        _put_digits(text, 5, month + 1, 2)
+        _put_digits(text, 8, day, 2)
+        text[:, 19] = ord(".")
+        _put_digits(text, 20, micro, 6)
+        text[micro == 0, 19:] = 0
+        clock_column, year_column = 11, 0
+    _put_digits(text, clock_column, clock // 3600, 2)
+    _put_digits(text, clock_column + 3, clock // 60 % 60, 2)
+    _put_digits(text, clock_column + 6, clock % 60, 2)
+    text[:, [clock_column + 2, clock_column + 5]] = ord(":")
+    _put_digits(text, year_column, year, 4)
+    text = numpy.ascontiguousarray(text).view("U%d" % text.shape[1]).reshape(-1)
+    return numpy.where(valid, text, "Not Applicable").tolist()
+
+def convert_timestamps(values, unit="unix_s", style="iso"):
+    '''Convert a whole column of raw timestamps to local time strings at once, with numpy if it's installed and
+one value at a time otherwise, the results are the same either way. Takes 3 arguments:
+values: a list of raw timestamps
+unit: one of the TIMESTAMP_UNITS, default unix_s
+style: iso or ctime, default iso
+values that can't be converted become "Not Applicable"'''
+    if unit not in TIMESTAMP_UNITS or style not in TIMESTAMP_STYLES:
+        raise ValueError("unknown timestamp unit or style: %s, %s" % (unit, style))
+    if numpy is None or not values:
+        return [timestamp_to_text(value, unit, style) for value in values]
+
+    column = numpy.array(values)
+    if column.dtype.kind == "i":
+        return _numpy_timestamps(column, unit, style)
+    # ints below 2**53 are converted to floats exactly, larger ones need the integer path
+    if column.dtype.kind == "f" and not any(type(values[i]) is int for i in numpy.flatnonzero(numpy.abs(column) >= 2**53)):
+        return _numpy_timestamps(column, unit, style)
+
+    # mixed columns: convert the ints and floats with numpy and the rest (nulls, text...) one at a time
+    ret_val = [None] * len(values)
+    ints = [i for i, value in enumerate(values) if type(value) is int and -2**63 <= value < 2**63]
+    floats = [i for i, value in enumerate(values) if type(value) is float]
+    for indexes, dtype in ((ints, numpy.int64), (floats, numpy.float64)):
+        if indexes:
+            column = numpy.array([values[i] for i in indexes], dtype=dtype)
+            for i, text in zip(indexes, _numpy_timestamps(column, unit, style)):
+                ret_val[i] = text
+    if len(ints) + len(floats) < len(values):
+        for i, value in enumerate(values):
+            if ret_val[i] is None:
+                ret_val[i] = timestamp_to_text(value, unit, style)
+    return ret_val
+
+def iter_timestamps(batches, *columns):
+    '''Convert the timestamp columns of query results one batch at a time. Takes an iterator over batches of rows,
+as returned by iter_batches_from_db or Query.run_batches, and the columns to convert as (column index, unit) or
+(column index, unit, style) tuples. Yields (row, converted timestamps) tuples, the row itself is left untouched'''
+    for rows in batches:
+        with profile_stage("timestamps", len(rows)):
+            converted = [convert_timestamps([row[column[0]] for row in rows], *column[1:]) for column in columns]
+        for row, times in zip(rows, zip(*converted)):
+            yield row, times
+
+def markup(template, *columns, empty=None):
+    '''A RowSpec converter building html, like a link, from the values of the given columns of a row. The values are
+escaped and put in the template's %s placeholders in order. Pass empty to use that text instead when the first of
+the columns is empty. eg: markup('<a href="%s">Link</a>', 3)'''
+    def convert(row):
+        if empty is not None and not row[columns[0]]:
+            return empty
+        return template % tuple([html_escape(str(row[column])) for column in columns])
+    convert.markup = True
+    return convert
+
+class RowSpec(object):
+    '''A declarative description of how the query rows of an artifact become report cells, compiled once into a
+function that builds all the cells of a row in a single expression. Takes 2 arguments:
+columns: one (source, converter) or (source, converter, default) tuple per report column. source is the index of
+    the query column, or None to pass the whole row to the converter. converter is one of:
+    None: the value as it is, the report writers turn it into text
+    a unit from TIMESTAMP_UNITS or a (unit, style) tuple: the value is converted to local time a whole batch at a
+        time by convert_timestamps. If a default is given it replaces empty, negative and text timestamps
+    a dict: a lookup table, values that aren't in it become default, "Unknown" if not given. Integer keys also match
+        numbers stored as text
+    a function made by markup: html written to html reports as it is
+    any other callable: called with the value, or with the row
+where: an optional function taking the cells of a row, rows it returns False for are left out
+eg: RowSpec([(0, "unix_s"), (1, None), (2, {0 : "outgoing", 1 : "incoming"})])'''
+    def __init__(self, columns, where=None):
+        self.columns = list(columns)
+        self.where = where
+        self.timestamps = []
+        self.markup_columns = []
+        names = {}
+        cells = []
+        for i, column in enumerate(self.columns):
+            source, converter = column[0], column[1]
+            value = "row" if source is None else "row[%d]" % source
+            if converter is None:
+                cells.append(value)
+            elif isinstance(converter, (str, tuple)):
+                unit, style = (converter, "iso") if isinstance(converter, str) else converter
+                if source is None or unit not in TIMESTAMP_UNITS or style not in TIMESTAMP_STYLES:
+                    raise ValueError("bad timestamp column %d: %s" % (i, converter))
+                cells.append("times[%d]" % len(self.timestamps))
+                if len(column) > 2:
+                    names["default_%d" % i] = column[2]
+                    # loosely typed sqlite columns can hold text, which also gets the default
+                    cells[-1] = "(%s if isinstance(%s, (int, float)) and %s > 0 else default_%d)" % (cells[-1], value, value, i)
+                self.timestamps.append((source, unit, style))
+            elif isinstance(converter, dict):
+                table = dict(converter)
+                for key, text in converter.items():
+                    if isinstance(key, int) and not isinstance(key, bool):
+                        table.setdefault(str(key), text)
+                names["lookup_%d" % i] = table.get
+                names["default_%d" % i] = column[2] if len(column) > 2 else "Unknown"
+                cells.append("lookup_%d(%s, default_%d)" % (i, value, i))
+            elif callable(converter):
+                names["convert_%d" % i] = converter
+                cells.append("convert_%d(%s)" % (i, value))
+                if getattr(converter, "markup", False):
+                    self.markup_columns.append(i)
+            else:
+                raise ValueError("bad converter for column %d: %r" % (i, converter))
+        exec("def cells(row, times):\n    return (%s,)\n" % ", ".join(cells), names)
+        self._cells = names["cells"]
+
+    def cells(self, rows):
+        '''Turn a batch of query rows into a list of report rows'''
+        cells = self._cells
+        if self.timestamps:
+            with profile_stage("timestamps", len(rows)):
+                converted = [convert_timestamps([row[source] for row in rows], unit, style)
+                             for source, unit, style in self.timestamps]
+            res = [cells(row, times) for row, times in zip(rows, zip(*converted))]
+        else:
+            res = [cells(row, ()) for row in rows]
+        if self.where is not None:
+            res = [row for row in res if self.where(row)]
+        return res
+
+    def write(self, report, batches):
+        '''Write every batch of query rows to a report, returns the number of rows in the report'''
+        for rows in batches:
+            report.write_batch(self.cells(rows))
+        return report.rows
+
 
 def close_table_html():
     '''Close html tags'''
@@ -1,19 +1,174 @@
 #!/usr/bin/env python
-import sys, os, optparse
-from PIL import Image
-from PIL.ExifTags import TAGS
-from common_tools import *
+import sys, os, mmap, struct, numbers, optparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime as dt
+from common_methods import *
+try:
+    from PIL import Image
+    from PIL.ExifTags import TAGS
+except ImportError:
+    Image = None
 
 
-def getExif(image_file, save=True, verbose=True):
-    '''Get image file EXIF metadata'''
-    if not os.path.isfile(image_file):
-        sys.exit("%s is not a valid image file!")
-    data = "Time: %d/%d/%d %d : %d : %d. Found the following Exif data for the image %s:\n\n" % (now.year, now.month,
-                                                                                                 now.day, now.hour, now.minute,
-                                                                                                 now.second, name)
-    img = Image.open(image_file)
-    info = img._getexif()
+# EXIF field types: type id -> (struct format of one value, size of one value)
+EXIF_TYPES = {1 : ("B", 1), 2 : ("s", 1), 3 : ("H", 2), 4 : ("I", 4), 5 : ("I", 8), 6 : ("b", 1), 7 : ("s", 1),
+              8 : ("h", 2), 9 : ("i", 4), 10 : ("i", 8), 11 : ("f", 4), 12 : ("d", 8)}
+RATIONAL_TYPES = (5, 10)
+# the IFD0 and Exif IFD tags read by the built in parser, with the names PIL gives them
+EXIF_TAGS = {0x0100 : "ImageWidth", 0x0101 : "ImageLength", 0x010e : "ImageDescription", 0x010f : "Make",
+             0x0110 : "Model", 0x0112 : "Orientation", 0x011a : "XResolution", 0x011b : "YResolution",
+             0x0128 : "ResolutionUnit", 0x0131 : "Software", 0x0132 : "DateTime", 0x013b : "Artist",
+             0x8298 : "Copyright", 0x829a : "ExposureTime", 0x829d : "FNumber", 0x8769 : "ExifOffset",
+             0x8825 : "GPSInfo", 0x8827 : "ISOSpeedRatings", 0x9000 : "ExifVersion", 0x9003 : "DateTimeOriginal",
+             0x9004 : "DateTimeDigitized", 0x9010 : "OffsetTime", 0x9011 : "OffsetTimeOriginal", 0x9209 : "Flash",
+             0x920a : "FocalLength", 0xa002 : "ExifImageWidth", 0xa003 : "ExifImageHeight", 0xa420 : "ImageUniqueID",
+             0xa430 : "CameraOwnerName", 0xa431 : "BodySerialNumber", 0xa433 : "LensMake", 0xa434 : "LensModel"}
+GPS_TAGS = {0x00 : "GPSVersionID", 0x01 : "GPSLatitudeRef", 0x02 : "GPSLatitude", 0x03 : "GPSLongitudeRef",
+            0x04 : "GPSLongitude", 0x05 : "GPSAltitudeRef", 0x06 : "GPSAltitude", 0x07 : "GPSTimeStamp",
+            0x12 : "GPSMapDatum", 0x1d : "GPSDateStamp"}
+# tags holding the offset of another IFD
+IFD_POINTERS = ("ExifOffset", "GPSInfo")
+# IFDs with more entries than this are taken for corrupt data
+MAX_IFD_ENTRIES = 1000
+JPEG_APP1 = 0xe1
+JPEG_SOS = 0xda
+JPEG_EOI = 0xd9
+EXIF_HEADER = b"Exif\x00\x00"
+
+# the columns of the batch mode results
+EXIF_FIELDS = ["path", "make", "model", "serial", "lens", "software", "artist", "owner", "description", "taken",
+               "digitized", "modified", "utc_offset", "width", "height", "orientation", "latitude", "longitude",
+               "altitude", "gps_time", "error"]
+# the tags they are made of, the others aren't decoded in batch mode
+RECORD_TAGS = frozenset(["Make", "Model", "BodySerialNumber", "LensModel", "Software", "Artist", "CameraOwnerName",
+                         "ImageDescription", "DateTimeOriginal", "DateTimeDigitized", "DateTime", "OffsetTimeOriginal",
+                         "ExifImageWidth", "ExifImageHeight", "ImageWidth", "ImageLength", "Orientation",
+                         "GPSLatitudeRef", "GPSLatitude", "GPSLongitudeRef", "GPSLongitude", "GPSAltitudeRef",
+                         "GPSAltitude", "GPSTimeStamp", "GPSDateStamp"])
+
+class ExifError(Exception):
+    '''Raised when an image's EXIF data is corrupt'''
+    pass
+
+def ifd_value(buf, endian, type_id, count, pos):
+    '''Decode the value of an IFD entry starting at pos. ASCII values are returned as text, undefined ones as bytes,
+rationals as floats (None for a zero denominator) and single numbers on their own rather than in a tuple'''
+    fmt, size = EXIF_TYPES[type_id]
+    end = pos + size * count
+    if end > len(buf):
+        raise ExifError("IFD entry value past the end of the data")
+    if fmt == "s":
+        data = buf[pos:end]
+        if type_id == 2:
+            return data.split(b"\x00", 1)[0].decode("utf-8", "replace")
+        return data
+    if type_id in RATIONAL_TYPES:
+        parts = struct.unpack_from("%s%d%s" % (endian, count * 2, fmt), buf, pos)
+        values = tuple(parts[i] / float(parts[i + 1]) if parts[i + 1] else None for i in range(0, len(parts), 2))
+    else:
+        values = struct.unpack_from("%s%d%s" % (endian, count, fmt), buf, pos)
+    return values[0] if count == 1 else values
+
+def read_ifd(buf, endian, offset, names, tags, wanted=None):
+    '''Read the entries of the IFD at offset into the tags dict, named from the names dict. Tags missing from names
+are skipped, pass a set of names as wanted to only decode those. Entries pointing to other IFDs are always read'''
+    if offset + 2 > len(buf):
+        raise ExifError("IFD offset past the end of the data")
+    count = struct.unpack_from(endian + "H", buf, offset)[0]
+    if count > MAX_IFD_ENTRIES:
+        raise ExifError("IFD with %d entries" % count)
+    entry_format = endian + "HHI"
+    pos = offset + 2
+    for i in range(count):
+        if pos + 12 > len(buf):
+            raise ExifError("IFD entry past the end of the data")
+        tag, type_id, value_count = struct.unpack_from(entry_format, buf, pos)
+        name = names.get(tag)
+        if name is not None and type_id in EXIF_TYPES \
+           and (wanted is None or name in wanted or name in IFD_POINTERS):
+            value_pos = pos + 8
+            if EXIF_TYPES[type_id][1] * value_count > 4:
+                value_pos = struct.unpack_from(endian + "I", buf, value_pos)[0]
+            tags[name] = ifd_value(buf, endian, type_id, value_count, value_pos)
+        pos += 12
+
+def parse_tiff(buf, wanted=None):
+    '''Parse the tags of IFD0, the Exif IFD and the GPS IFD from TIFF structured data: an EXIF segment or a whole tiff
+file. Offsets are relative to the start of buf. Returns a dict of tag names to values, GPS tags included'''
+    if buf[:2] == b"II":
+        endian = "<"
+    elif buf[:2] == b"MM":
+        endian = ">"
+    else:
+        raise ExifError("not TIFF structured data")
+    if len(buf) < 8:
+        raise ExifError("truncated TIFF header")
+    tags = {}
+    read_ifd(buf, endian, struct.unpack_from(endian + "I", buf, 4)[0], EXIF_TAGS, tags, wanted)
+    exif_ifd = tags.pop("ExifOffset", None)
+    gps_ifd = tags.pop("GPSInfo", None)
+    if type(exif_ifd) is int:
+        read_ifd(buf, endian, exif_ifd, EXIF_TAGS, tags, wanted)
+    if type(gps_ifd) is int:
+        read_ifd(buf, endian, gps_ifd, GPS_TAGS, tags, wanted)
+    return tags
+
+def jpeg_exif_segment(f):
+    '''Walk the marker segments of a jpeg file opened at its first marker, after the SOI, and return the TIFF data of
+its EXIF (APP1) segment, or None if it has none. Only the segment headers are read, the scan data is never reached'''
+    while True:
+        head = f.read(4)
+        if len(head) < 4 or head[0] != 0xff:
+            return None
+        marker = head[1]
+        if marker == 0xff:
+            # fill byte before a marker
+            f.seek(-3, 1)
+            continue
+        if marker in (JPEG_SOS, JPEG_EOI):
+            return None
+        if 0xd0 <= marker <= 0xd7 or marker == 0x01:
+            # markers without a length
+            f.seek(-2, 1)
+            continue
+        length = struct.unpack(">H", head[2:])[0]
+        if length < 2:
+            return None
+        if marker == JPEG_APP1:
+            data = f.read(length - 2)
+            if data[:6] == EXIF_HEADER:
+                return data[6:]
+        else:
+            f.seek(length - 2, 1)
+
+def readExifTags(image_file, wanted=None):
+    '''Read the EXIF tags of a jpeg or tiff image without decoding the image itself: only the EXIF segment of a jpeg
+is read, tiff files are memory mapped. Pass a set of tag names as wanted to only decode those. Returns a dict of tag
+names to values, empty if the image has no EXIF data, or None if the file isn't a jpeg or tiff image'''
+    with open(image_file, "rb") as f:
+        head = f.read(4)
+        if head[:3] == b"\xff\xd8\xff":
+            f.seek(2)
+            data = jpeg_exif_segment(f)
+            return parse_tiff(data, wanted) if data else {}
+        if head in (b"II*\x00", b"MM\x00*"):
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                return parse_tiff(buf, wanted)
+            finally:
+                buf.close()
+    return None
+
+def readExif(image_file):
+    '''Read the EXIF tags of an image file, returns a dict mapping tag names to values, empty if none were found.
+Uses PIL if it's installed, otherwise the built in parser which only reads jpeg and tiff images'''
+    if Image is None:
+        return readExifTags(image_file) or {}
+    with Image.open(image_file) as img:
+        if hasattr(img, "_getexif"):
+            info = img._getexif()
+        else:
+            info = dict(img.getexif())
     exif_data = {}
     if info:
         for (tag, value) in info.items():
@@ -25,14 +180,134 @@ def getExif(image_file, save=True, verbose=True):
                     pass
             else:
                 exif_data[decoded] = value
-    else:
+    return exif_data
+
+def exif_text(value):
+    '''The value of a text tag as a stripped str. Text written as undefined data (bytes) is decoded, values of other
+types give None'''
+    if isinstance(value, bytes):
+        value = value.split(b"\x00", 1)[0].decode("utf-8", "replace")
+    return value.strip() if isinstance(value, str) else None
+
+def exif_number(value):
+    '''The value of a numeric tag, None if it has another type or more than one value'''
+    return value if isinstance(value, numbers.Real) else None
+
+def exif_time(value):
+    '''An EXIF date and time, YYYY:MM:DD HH:MM:SS, as YYYY-MM-DD HH:MM:SS'''
+    value = exif_text(value)
+    if not value:
+        return None
+    return value[:10].replace(":", "-") + value[10:]
+
+def gps_degrees(dms, ref):
+    '''Decimal degrees from GPS degrees, minutes and seconds, negative south and west'''
+    if type(dms) is not tuple or len(dms) != 3 or not all(isinstance(part, numbers.Real) for part in dms):
+        return None
+    degrees = dms[0] + dms[1] / 60.0 + dms[2] / 3600.0
+    return round(-degrees if exif_text(ref) in ("S", "W") else degrees, 7)
+
+def gps_fields(tags):
+    '''The latitude, longitude, altitude and UTC time of a GPS fix from the GPS tags'''
+    altitude = exif_number(tags.get("GPSAltitude"))
+    if altitude is not None and tags.get("GPSAltitudeRef") in (1, b"\x01"):
+        altitude = -altitude
+    gps_time = None
+    date = exif_text(tags.get("GPSDateStamp"))
+    stamp = tags.get("GPSTimeStamp")
+    if date and type(stamp) is tuple and len(stamp) == 3 and all(isinstance(part, numbers.Real) for part in stamp):
+        gps_time = "%s %02d:%02d:%02d" % (date.replace(":", "-"), stamp[0], stamp[1], stamp[2])
+    return {"latitude" : gps_degrees(tags.get("GPSLatitude"), tags.get("GPSLatitudeRef")),
+            "longitude" : gps_degrees(tags.get("GPSLongitude"), tags.get("GPSLongitudeRef")),
+            "altitude" : altitude,
+            "gps_time" : gps_time}
+
+def gps_tags(exif_data):
+    '''The GPS tags of readExif's results by name, with rationals as floats. PIL keeps them by number in a GPSInfo dict,
+the built in parser already names them'''
+    info = exif_data.get("GPSInfo")
+    if not isinstance(info, dict):
+        return exif_data
+    def number(value):
+        return float(value) if isinstance(value, numbers.Rational) and not isinstance(value, int) else value
+    return dict((GPS_TAGS.get(tag, tag), tuple(number(v) for v in value) if type(value) is tuple else number(value))
+                for tag, value in info.items())
+
+def exifRecord(image_file):
+    '''Read the EXIF metadata of one image for the batch mode without printing or saving anything, returns a dict with
+the EXIF_FIELDS keys, or None if the file isn't a jpeg or tiff image or can't be read. Corrupt EXIF data, tags of an
+unexpected type included, is reported in the "error" field instead of stopping the caller'''
+    record = dict.fromkeys(EXIF_FIELDS)
+    record["path"] = image_file
+    try:
+        tags = readExifTags(image_file, RECORD_TAGS)
+        if tags is None:
+            return None
+        fields = {"make" : exif_text(tags.get("Make")),
+                  "model" : exif_text(tags.get("Model")),
+                  "serial" : exif_text(tags.get("BodySerialNumber")),
+                  "lens" : exif_text(tags.get("LensModel")),
+                  "software" : exif_text(tags.get("Software")),
+                  "artist" : exif_text(tags.get("Artist")),
+                  "owner" : exif_text(tags.get("CameraOwnerName")),
+                  "description" : exif_text(tags.get("ImageDescription")),
+                  "taken" : exif_time(tags.get("DateTimeOriginal")),
+                  "digitized" : exif_time(tags.get("DateTimeDigitized")),
+                  "modified" : exif_time(tags.get("DateTime")),
+                  "utc_offset" : exif_text(tags.get("OffsetTimeOriginal")),
+                  "width" : exif_number(tags.get("ExifImageWidth", tags.get("ImageWidth"))),
+                  "height" : exif_number(tags.get("ExifImageHeight", tags.get("ImageLength"))),
+                  "orientation" : exif_number(tags.get("Orientation"))}
+        fields.update(gps_fields(tags))
+    except (IOError, OSError):
+        return None
+    except Exception as e:
+        record["error"] = "%s: %s" % (type(e).__name__, e)
+        return record
+    record.update(fields)
+    return record
+
+def batchExif(root, output_file, workers=None, chunksize=256):
+    '''Extract the EXIF metadata, GPS position included, of every jpeg and tiff image under a directory tree using a
+pool of worker processes. Images are recognized by their signature and only their EXIF segment is read, the pixel data
+is never decoded. The results are written to one csv, jsonl (json lines) or parquet file depending on the output file
+extension as they come in. Returns a tuple: (images processed, images with a GPS position, images that failed)'''
+    done, located, failed = 0, 0, 0
+    with open_output_file(output_file, "exif_extractor", EXIF_FIELDS) as out, \
+         ProcessPoolExecutor(max_workers=workers) as pool:
+        for record in pool.map(exifRecord, walkFiles(root), chunksize=chunksize):
+            if record is None:
+                continue
+            done += 1
+            if record["error"]:
+                failed += 1
+                print("%s: %s" % (record["path"], record["error"]))
+            elif record["latitude"] is not None:
+                located += 1
+            out.write_row([record[field] for field in EXIF_FIELDS])
+    return done, located, failed
+
+def getExif(image_file, save=True, verbose=True):
+    '''Get image file EXIF metadata'''
+    if not os.path.isfile(image_file):
+        sys.exit("%s is not a valid image file!" % image_file)
+    now = dt.now()
+    name = getFileName(image_file)
+    data = "Time: %d/%d/%d %d : %d : %d. Found the following Exif data for the image %s:\n\n" % (now.year, now.month,
+                                                                                                 now.day, now.hour, now.minute,
+                                                                                                 now.second, name)
+    exif_data = readExif(image_file)
+    if not exif_data:
         sys.exit("No EXIF data found!")
 
     for key in exif_data:
         data += "{}    :   {}\n".format(key, exif_data[key])
+    position = gps_fields(gps_tags(exif_data))
+    if normalize_coordinates(position["latitude"], position["longitude"]):
+        data += "GPS position    :   %.7f, %.7f (latitude, longitude in decimal degrees)\n" % (position["latitude"],
+                                                                                             position["longitude"])
 
     if save:
-        name = getFileName(image_file)
         tgt = name + ".txt"
         saveResult(tgt, data)
 
@@ -45,12 +320,31 @@ if __name__ == "__main__":
     print('    #                most images contain Exif Metadata                #')
     print('    #               for more info refer to Google/wiki                #')
     print('    ###################################################################\n\n')
-    parser = optparse.OptionParser("Usage: python exif_extractor.py -i <image path> -s <True or False> -v <True or False>")
+    parser = optparse.OptionParser("Usage: python exif_extractor.py -i <image path> -s <True or False> -v <True or False>" \
+                                   + " or python exif_extractor.py -r <directory> -o <output file>")
     parser.add_option("-i", dest="image_path", type="string", help="provide the full path to the image file. eg: E:\images\img_1.jpg")
     parser.add_option("-s", dest="save", type="string", help="(optional) save the exif data as a text file? default True")
     parser.add_option("-v", dest="verbose", type="string", help="(optional) if False results won't be displayed in the console. default True")
+    parser.add_option("-r", dest="root", type="string", help="extract the exif data of every jpeg and tiff image under this directory")
+    out_help = "used with -r, the file to save all the results to, a .csv, .jsonl or .parquet file. default exif.csv"
+    parser.add_option("-o", dest="output", type="string", default="exif.csv", help=out_help)
+    parser.add_option("-w", dest="workers", type="int", help="used with -r, number of worker processes, default one per cpu")
+    compress_help = "compress the saved text file, or the -o file, with gzip or zstd (requires zstandard), .gz or .zst is" \
+                    + " added to its name. Parquet files aren't compressed"
+    add_output_options(parser, "reading the images, formatting and writing the results", reports=None,
+                       compress_help=compress_help)
 
     (options, args) = parser.parse_args()
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
+    set_output_compression(options.compress)
+
+    if options.root:
+        if not os.path.isdir(options.root):
+            sys.exit("%s is not a directory!" % options.root)
+        print("Working...\n")
+        done, located, failed = batchExif(options.root, options.output, options.workers)
+        print("Processed %d image(s), %d with a GPS position, %d failed" % (done, located, failed))
+        sys.exit()
 
     path = options.image_path
     if not path:
@@ -2,139 +2,114 @@
 import os
 import optparse
 import sys
+from functools import lru_cache
 try:
     from common_methods import *
 except ImportError:
     sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
 
 
-def get_name_from_threadKey(threadKey, core_db):
-    command = "SELECT thread_name FROM threads WHERE thread_key = \"%s\";" % threadKey
-    return str(pull_from_db(core_db, command)[0][0])
-
+@profiled("lookup")
+@lru_cache(maxsize=None)
 def get_uid_from_name(name, core_db):
     try:
-        command = "select contact_user_id from contact where name = \"%s\";" % name
-        return str(pull_from_db(core_db, command)[0][0])
+        command = "select contact_user_id from contact where name = ?;"
+        return str(pull_from_db(core_db, command, params=(name,))[0][0])
     except IndexError:
         raise ValueError("specified user not found!")
 
+@profiled("lookup")
+@lru_cache(maxsize=None)
 def get_db_owner(accounts_db):
     command = "SELECT display_name FROM accounts;"
     return str(pull_from_db(accounts_db, command, facebook_name=True)[0][0])
 
+FB_TIME = ("unix_ms", "ctime")
+
+# report columns built from the rows of the queries in this file
+FB_PROFILE_LINK = '<a href="https://facebook.com/profile.php?id=%s" target="_blank">Link</a>'
+FB_AVATAR = '<a href="%s" target="_blank"><img src="%s" alt="%s\'s Avatar"></a>'
+FB_CONTACTS = RowSpec([(0, None), (None, markup(FB_PROFILE_LINK, 1)), (None, markup(FB_AVATAR, 2, 2, 0)),
+                       (3, {1 : "Yes"}, "No"), (4, FB_TIME), (5, FB_TIME), (6, {1 : "Yes"}, "No")])
+FB_CALLS = RowSpec([(0, None), (1, FB_TIME), (2, {1 : "incoming"}, "outgoing"), (3, {1 : "Yes"}, "No"), (4, None)])
+FB_ACCOUNTS = RowSpec([(1, None), (None, markup(FB_AVATAR, 2, 2, 1)), (None, markup(FB_PROFILE_LINK, 0)), (3, parse_value)])
+
+def fb_msgs_spec(db_owner):
+    '''The report columns of messages, db_owner is the display name of the account, the sender or recipient of
+messages without one'''
+    owner = "Database owner: %s" % db_owner
+
+    def recipient(row):
+        thread_key = str(row[1])
+        if thread_key.split(":")[1] == str(row[13]) or "GROUP:" in thread_key:
+            return owner
+        return row[14] if row[14] is not None else "Name Unavailable"
+
+    return RowSpec([(0, lambda sender: sender if sender else owner), (None, recipient), (2, FB_TIME), (3, None),
+                    (4, {1 : "No"}, "Yes"), (5, None), (6, lambda size: parse_value(str(size), integer=True, div=1024)),
+                    (7, lambda mime_type: parse_value(str(mime_type))),
+                    (None, markup("<a href='%s' target='_blank'>Link</a>", 8, empty="Not Applicable")), (10, FB_TIME),
+                    (11, {1 : "Yes"}, "No/ Not Applicable"), (12, {1 : "incoming", 0 : "outgoing"}, "Not Applicable"),
+                    (9, lambda duration: parse_value(str(duration), integer=True, div=60))])
+
+@cached_result()
 def read_fb_contacts(core_db="core.db"):
     command = "SELECT name, contact_user_id, profile_picture_url, is_blocked, " \
             + "last_seen_timestamp, last_seen_update_timestamp, is_friend " \
             + "from contact;"
 
-    res = pull_from_db(core_db, command)
-    data = init_data("facebook_messenger Contacts", len(res)) + init_table_header("./templates/init_fb_msngr_contacts_html.html")
-
-    for row in res:
-        name = str(row[0])
-        account_url = "<a href=\"https://facebook.com/profile.php?id=%s\" target=\"_blank\">Link</a>" % str(row[1])
-        profile_pic = '<a href="%s" target="_blank"><img src="%s" alt="%s\'s Avatar"></a>' % (str(row[2]), str(row[2]), str(row[0]))
-        blocked = "Yes" if row[3] == "1" else "No"
-        last_seen = parse_timestamp(row[4])
-        last_seen_update = parse_timestamp(row[5])
-        friend = "Yes" if str(row[6]) == "1" else "No"
-
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td>" % (name, account_url, profile_pic, blocked) \
-             + "<td>%s</td><td>%s</td><td>%s</td></tr>" % (last_seen, last_seen_update, friend)
-        data += line
-
-    data += close_table_html()
+    with open_report("facebook_scanner_contacts.html", "facebook_messenger Contacts",
+                     "./templates/init_fb_msngr_contacts_html.html", markup_columns=FB_CONTACTS.markup_columns) as report:
+        FB_CONTACTS.write(report, iter_batches_from_db(core_db, command))
+    return report.rows
+
+def fb_messages_query(tm_min=0, tm_max=10000000000000, partner=None, user_id=None):
+    '''Build the messenger messages query, message timestamps are in milliseconds'''
+    query = Query("SELECT messages.sender, messages.thread_key, messages.timestamp, messages.snippet, messages.is_unsent, " \
+                  + "messages.attachment_filename, messages.attachment_filesize, messages.attachment_mime_type, " \
+                  + "messages.media_playable_url, messages.voice_call_duration_s, messages.voice_call_start_time, " \
+                  + "messages.is_voice_call_answered, messages.is_voice_call_incoming, messages.user_id, threads.thread_name " \
+                  + "FROM messages LEFT JOIN threads ON (threads.thread_key = messages.thread_key)") \
+            .time_range("messages.timestamp", tm_min, tm_max, scale=1000).index("messages", "timestamp")
+    if partner:
+        query.where("messages.sender = ? OR messages.thread_key LIKE ?", partner, "%" + str(user_id))
+    return query
 
-    saveResult("facebook_scanner_contacts.html", data)
+def fb_calls_query(tm_min=0, tm_max=10000000000000, partner=None):
+    query = Query("SELECT thread_name, updated_timestamp, is_incoming, is_answered, attempt_count FROM aggregated_calls") \
+            .time_range("updated_timestamp", tm_min, tm_max, scale=1000).index("aggregated_calls", "updated_timestamp")
+    if partner:
+        query.where("thread_name = ?", partner)
+    return query
 
+@cached_result("cross_account.db")
 def read_fb_messages(core_db, partner=None, tm_min=0, tm_max=10000000000000):
     db_owner = get_db_owner(os.path.split(core_db)[0] + "/cross_account.db")
 
-    command = "SELECT sender, thread_key, timestamp, snippet, is_unsent, attachment_filename, attachment_filesize, " \
-            + "attachment_mime_type, media_playable_url, voice_call_duration_s, voice_call_start_time, " \
-            + "is_voice_call_answered, is_voice_call_incoming, user_id from messages " \
-            + "WHERE (timestamp > %s AND timestamp < %s);" % (tm_min, tm_max)
-
-    if partner:
-        user_id = get_uid_from_name(partner, core_db)
-        command = command[:-1] + " AND (sender = \"{}\" OR thread_key LIKE \"%{}\");".format(partner, user_id)
-
-    res = pull_from_db(core_db, command)
-
-    data = init_data("facebook_messenger Messages", len(res)) + init_table_header("./templates/init_fb_msngr_msgs_html.html")
-
-    for row in res:
-        sender = str(row[0]) if row[0] else "Database owner: " + db_owner
-        threadKey = str(row[1])
-        time = parse_timestamp(row[2])
-        contents = str(row[3])
-        sent = "No" if str(row[4]) == "1" else "Yes"
-        attachment_name = str(row[5])
-        attachment_size = parse_value(str(row[6]), integer=True, div=1024)
-        attachment_type = parse_value(str(row[7]))
-        media_url = "<a href='%s' target='_blank'>Link</a>" % parse_value(str(row[8])) if row[8] else "Not Applicable"
-        voice_call_dur = parse_value(str(row[9]), integer=True, div= 60)
-        voice_call_start = parse_timestamp(row[10])
-        call_answered = "Yes" if str(row[11]) == 1 else "No/ Not Applicable"
-        call_direction = "incoming" if str(row[12]) == "1" else "outgoing" if str(row[12]) == "0" else "Not Applicable"
-
-        recipient = "Database owner: %s" % db_owner if (threadKey.split(":")[1] == str(row[13])) or "GROUP:" in threadKey else get_name_from_threadKey(threadKey, core_db)
-
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td>" % (sender, recipient, time, contents, sent) \
-             + "<td>%s</td><td>%s</td><td>%s</td>" % (attachment_name, attachment_size, attachment_type) \
-             + "<td>%s</td><td>%s</td><td>%s</td><td>%s</td>" %(media_url, voice_call_start, call_answered, call_direction) \
-             + "<td>%s</td></tr>" % voice_call_dur
-        data += line
+    user_id = get_uid_from_name(partner, core_db) if partner else None
+    spec = fb_msgs_spec(db_owner)
 
-    data += close_table_html()
-
-    saveResult("facebook_scanner_msgs.html", data)
+    with open_report("facebook_scanner_msgs.html", "facebook_messenger Messages",
+                     "./templates/init_fb_msngr_msgs_html.html", markup_columns=spec.markup_columns) as report:
+        spec.write(report, fb_messages_query(tm_min, tm_max, partner, user_id).run_batches(core_db))
+    return report.rows
 
 
+@cached_result()
 def read_fb_call_log(core_db, partner=None, tm_min=0, tm_max=10000000000000):
-    command = "SELECT thread_name, updated_timestamp, is_incoming, " \
-            + "is_answered, attempt_count FROM aggregated_calls " \
-            + "WHERE (updated_timestamp > %s AND updated_timestamp < %s);" % (tm_min, tm_max)
-
-    if partner:
-        command = command[:-1] + " AND thread_name = \"%s\";" % partner
-
-    res = pull_from_db(core_db, command)
-    data = init_data("facebook_messenger Call Log", len(res)) + init_table_header("./templates/init_fb_msngr_calls_html.html")
-
-    for row in res:
-        call_partner = str(row[0])
-        call_time = parse_timestamp(row[1])
-        direction = "incoming" if str(row[2]) == "1" else "outgoing"
-        answered = "Yes" if str(row[3]) == "1" else "No"
-
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td>" % (call_partner, call_time, direction)\
-             + "<td>%s</td><td>%s</td></tr>" % (answered, row[4])
-        data += line
-
-    data += close_table_html()
-
-    saveResult("facebook_scanner_calls.html", data)
+    with open_report("facebook_scanner_calls.html", "facebook_messenger Call Log",
+                     "./templates/init_fb_msngr_calls_html.html") as report:
+        FB_CALLS.write(report, fb_calls_query(tm_min, tm_max, partner).run_batches(core_db))
+    return report.rows
 
+@cached_result()
 def read_fb_accounts(cross_account_db):
     command = "SELECT user_id, display_name, profile_pic, nonce FROM accounts;"
 
-    res = pull_from_db(cross_account_db, command)
-    data = init_data("facebook_messenger Accounts", len(res)) + init_table_header("./templates/init_fb_msngr_accounts_html.html")
-
-    for row in res:
-        name = str(row[1])
-        account_url = "<a href=\"https://facebook.com/profile.php?id=%s\" target=\"_blank\">Link</a>" % str(row[0])
-        profile_pic = '<a href="%s" target="_blank"><img src="%s" alt="%s\'s Avatar"></a>' % (str(row[2]), str(row[2]), str(row[1]))
-        nonce = parse_value(row[3])
-
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td>" % (name, profile_pic, account_url, nonce)
-        data += line
-
-    data += close_table_html()
-
-    saveResult("facebook_scanner_accounts.html", data)
+    with open_report("facebook_scanner_accounts.html", "facebook_messenger Accounts",
+                     "./templates/init_fb_msngr_accounts_html.html", markup_columns=FB_ACCOUNTS.markup_columns) as report:
+        FB_ACCOUNTS.write(report, iter_batches_from_db(cross_account_db, command))
+    return report.rows
 
 if __name__ == "__main__":
     print('\n\n    ##############A Python script that reads facebook app data #####################')
@@ -162,13 +137,26 @@ if __name__ == "__main__":
 
     min_time_help = "read messages/calls after a given date and time, " \
                   + "must be a string separated by _ like YYYY_MM_DD_HH_MM_SS"
-    parser.add_option("--min_time", dest="min_time", default=0, type="string", help=min_time_help)
+    parser.add_option("--min_time", dest="min_time", type="string", help=min_time_help)
 
     max_time_help = "read messages/calls before a given date and time, " \
                   + "must be a string separated by _ like YYYY_MM_DD_HH_MM_SS"
-    parser.add_option("--max_time", dest="max_time", default=10000000000000, type="string", help=max_time_help)
-
+    parser.add_option("--max_time", dest="max_time", type="string", help=max_time_help)
+
+    add_output_options(parser, "opening the database, queries, fetching rows, timestamp conversion, user and thread name" \
+                       + " lookups, formatting, rendering and writing the reports")
+    index_help = "speed up time window searches on large databases by indexing a temporary working copy of the database," \
+                 + " the original file is never modified"
+    parser.add_option("--index", dest="index", action="store_true", default=False, help=index_help)
+    cache_help = "save the results in the result cache and reuse them when the same database is read again with the same" \
+                 + " options, instead of reading it again. The cache is kept in " + RESULT_CACHE_DIR
+    parser.add_option("--cache", dest="cache", action="store_true", default=False, help=cache_help)
     (options, args) = parser.parse_args()
+    set_output_format(options.format)
+    set_output_compression(options.compress)
+    set_working_indexes(options.index)
+    set_result_cache(options.cache)
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
 
     if not options.target:
         sys.exit("please enter a target!\n\n%s" % parser.usage)
@@ -180,8 +168,8 @@ if __name__ == "__main__":
     if not os.path.isfile(db):
         db = os.path.join(db, "core.db")
 
-    min_time = time_to_epoch(options.min_time) if options.min_time > 0 else 0
-    max_time = time_to_epoch(options.max_time) if options.max_time < 10000000000000 else 10000000000000
+    min_time = time_to_epoch(options.min_time) if options.min_time else 0
+    max_time = time_to_epoch(options.max_time) if options.max_time else 10000000000000
 
     if options.target.lower() == "msgs":
         read_fb_messages(core_db=db, partner=options.chat_partner, tm_min=min_time, tm_max=max_time)
@@ -6,111 +6,107 @@ except ImportError:
     sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
 
 
+def moz_history_query(tm_min=0, tm_max=10000000000000, google=False, android=False):
+    '''Build the firefox history query, visit dates are compared in seconds (microseconds on desktop,
+milliseconds on android). The raw visit date is the last column'''
+    if android:
+        if google:
+            query = Query("SELECT query, datetime(date/1000, 'unixepoch'), date FROM searchhistory")
+        else:
+            query = Query("SELECT url, datetime(date/1000, 'unixepoch'), title, date FROM history")
+        return query.where("visits > 0").time_range("date", tm_min, tm_max, scale=1000)
+    return Query("SELECT url, datetime(visit_date/1000000, 'unixepoch'), title, visit_date FROM moz_places, moz_historyvisits") \
+           .where("visit_count > 0").where("moz_places.id == moz_historyvisits.place_id") \
+           .time_range("visit_date", tm_min, tm_max, scale=1000000).index("moz_historyvisits", "visit_date", "place_id")
+
+def moz_forms_query(tm_min=0, tm_max=10000000000000):
+    return Query("SELECT fieldname, value, timesUsed, datetime(firstUsed/1000000, 'unixepoch'), " \
+                 + "datetime(lastUsed/1000000, 'unixepoch'), firstUsed FROM moz_formhistory") \
+           .time_range("firstUsed", tm_min, tm_max, scale=1000000).index("moz_formhistory", "firstUsed")
+
+def moz_downloads_query(tm_min=0, tm_max=10000000000000):
+    return Query("SELECT name, source, datetime(endTime/1000000, 'unixepoch'), endTime FROM moz_downloads") \
+           .time_range("endTime", tm_min, tm_max, scale=1000000).index("moz_downloads", "endTime")
+
+GOOGLE_QUERY = re.compile(r'q=.*\&')
+
+def google_search(url):
+    '''The search terms of a google search url, or an empty string for other urls'''
+    if "google" not in str(url).lower():
+        return ""
+    r = GOOGLE_QUERY.findall(str(url))
+    if not r:
+        return ""
+    return r[0].split('&')[0].replace('q=', '').replace('+', ' ')
+
+def title_or_url(row):
+    return row[2] if row[2] else row[0]
+
+def has_search(cells):
+    return cells[2] != ""
+
+# report columns built from the rows of the queries above
+MOZ_COOKIES = RowSpec([(0, None), (1, None), (2, None)])
+MOZ_HISTORY = RowSpec([(1, None), (None, title_or_url), (0, None)])
+MOZ_GOOGLE_SEARCHES = RowSpec([(1, None), (2, None), (0, google_search)], where=has_search)
+MOZ_ANDROID_SEARCHES = RowSpec([(1, None), (None, lambda row: "Search"), (0, str)], where=has_search)
+MOZ_FORMS = RowSpec([(0, None), (1, None), (2, None), (3, None), (4, None)])
+MOZ_DOWNLOADS = RowSpec([(0, None), (1, None), (2, None)])
+
+@cached_result()
 def read_moz_cookies(cookies_db):
     '''Read mozilla firefox cookies. Takes one argument: the full path of the cookies sqlite database file'''
     command = "SELECT host, name, value FROM moz_cookies"
-    res = pull_from_db(cookies_db, command)
-    data = init_data("firefox_scanner Cookies", len(res)) + init_table_header("./templates/init_cookies_html.html")
-
-    for row in res:
-        host = str(row[0])
-        name = str(row[1])
-        value = str(row[2])
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td></tr>" % (host, name, value)
-        data += line
-
-    data += close_table_html()
     file_name = getFileName(cookies_db)
     tgt = file_name + ".html"
-    saveResult(tgt, data)
 
+    with open_report(tgt, "firefox_scanner Cookies", "./templates/init_cookies_html.html") as report:
+        MOZ_COOKIES.write(report, iter_batches_from_db(cookies_db, command))
+    return report.rows
+
+@cached_result()
 def read_moz_history(history_db, tm_min=0, tm_max=10000000000000, google=False, android=False):
     '''Read mozilla firefox history. Takes 4 argument:
 history_db: the full path of the places sqlite database file
 tm_min: the minimum visit timestamp, default value is 0
 tm_max: the maximum visit timestamp, default value is 10000000000000
 google: Look for google searches only? default value is False'''
-    command = "SELECT url, datetime(visit_date/1000000, 'unixepoch'), title FROM moz_places, moz_historyvisits " \
-              + "WHERE (visit_count > 0) AND (moz_places.id == moz_historyvisits.place_id) AND (visit_date/1000000 > %s AND visit_date/1000000 < %s);" % (tm_min, tm_max)
-    if android:
-        command = "SELECT url, datetime(date/1000, 'unixepoch'), title FROM history WHERE (visits > 0)" \
-                  + " AND (date/1000 > %s AND date/1000 < %s);" % (tm_min, tm_max)
-        if google:
-            command = "SELECT query, datetime(date/1000, 'unixepoch') FROM searchhistory WHERE (visits > 0)" \
-                  + " AND (date/1000 > %s AND date/1000 < %s);" % (tm_min, tm_max)
-    res = pull_from_db(history_db, command)
-    data = init_data("firefox_scanner History", len(res)) + init_table_header("./templates/init_history_html.html")
-
-    for row in res:
-        if google:
-            if android:
-                search = str(row[0])
-                date = str(row[1])
-                title = "Search"
-            else:
-                url = str(row[0])
-                date = str(row[1])
-                title = str(row[2])
-                if "google" in url.lower():
-                    r = re.findall(r'q=.*\&', url)
-                    if r:
-                        search = r[0].split('&')[0]
-                        search = search.replace('q=', '').replace('+', ' ')
-            if not search == "":
-                line = "<tr><td>%s</td><td>%s</td><td>%s</td></tr>" % (date, title, search)
-                data += line
-        else:
-            url = str(row[0])
-            date = str(row[1])
-            title = str(row[2])
-            if len(title) == 0:
-                title = url
-            line = "<tr><td>%s</td><td>%s</td><td>%s</td></tr>" % (date, title, url)
-            data += line
-
-    data += close_table_html()
+    if google:
+        spec = MOZ_ANDROID_SEARCHES if android else MOZ_GOOGLE_SEARCHES
+    else:
+        spec = MOZ_HISTORY
     file_name = getFileName(history_db)
     tgt = file_name + ".html"
-    saveResult(tgt, data)
 
+    with open_report(tgt, "firefox_scanner History", "./templates/init_history_html.html") as report:
+        spec.write(report, moz_history_query(tm_min, tm_max, google, android).run_batches(history_db))
+    return report.rows
+
+@cached_result()
 def read_moz_forms(forms_db, tm_min=0, tm_max=10000000000000):
     '''Read mozilla firefox forms history. Takes 3 argument:
 forms_db: the full path of the form_history sqlite database file
 tm_min: the minimum form use timestamp, default value is 0
 tm_max: the maximum form use timestamp, default value is 10000000000000'''
-    command = "SELECT fieldname, value, timesUsed, datetime(firstUsed/1000000, 'unixepoch'), " \
-              + "datetime(lastUsed/1000000, 'unixepoch') FROM moz_formhistory WHERE (firstUsed/1000000 > %s AND firstUsed/1000000 < %s);" % (tm_min, tm_max)
-    res = pull_from_db(forms_db, command)
-    data = init_data("firefox_scanner Forms History", len(res)) + init_table_header("./templates/init_formhistory_html.html")
-    for row in res:
-
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>" % (str(row[0]), str(row[1]),
-                                                                                     str(row[2]), str(row[3]),
-                                                                                     str(row[4]))
-        data += line
-
-    data += close_table_html()
     file_name = getFileName(forms_db)
     tgt = file_name + ".html"
-    saveResult(tgt, data)
 
+    with open_report(tgt, "firefox_scanner Forms History", "./templates/init_formhistory_html.html") as report:
+        MOZ_FORMS.write(report, moz_forms_query(tm_min, tm_max).run_batches(forms_db))
+    return report.rows
+
+@cached_result()
 def read_moz_downloads(downloads_db, tm_min=0, tm_max=10000000000000):
     '''Read mozilla firefox downloads. Takes 3 argument:
 forms_db: the full path of the downloads sqlite database file
 tm_min: the minimum download timestamp, default value is 0
 tm_max: the maximum download timestamp, default value is 10000000000000'''
-    command = "SELECT name, source, datetime(endTime/1000000, 'unixepoch') FROM moz_downloads WHERE (endtime/1000000 > %s AND endtime/1000000 < %s);" % (tm_min, tm_max)
-    res = pull_from_db(downloads_db, command)
-    data = init_data("firefox_scanner Downloads", len(res)) + init_table_header("./templates/init_downloads_html.html")
-
-    for row in res:
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td></tr>" % (row[0], row[1], row[2])
-        data += line
-
-    data += close_table_html()
     file_name = getFileName(downloads_db)
     tgt = file_name + ".html"
-    saveResult(tgt, data)
+
+    with open_report(tgt, "firefox_scanner Downloads", "./templates/init_downloads_html.html") as report:
+        MOZ_DOWNLOADS.write(report, moz_downloads_query(tm_min, tm_max).run_batches(downloads_db))
+    return report.rows
 
 if __name__ == "__main__":
     print('\n\n    ##############A Python script to read firefox browser data ############')
@@ -135,7 +131,20 @@ if __name__ == "__main__":
     parser.add_option("--max_time", dest="max", type="string", help=max_help)
     android_help = "True if target database is a firefox android database. default False"
     parser.add_option("--android", dest="droid", type="string", help=android_help)
+    add_output_options(parser, "opening the database, queries, fetching rows, timestamp conversion, formatting, rendering" \
+                       + " and writing the reports")
+    index_help = "speed up time window searches on large databases by indexing a temporary working copy of the database," \
+                 + " the original file is never modified"
+    parser.add_option("--index", dest="index", action="store_true", default=False, help=index_help)
+    cache_help = "save the results in the result cache and reuse them when the same database is read again with the same" \
+                 + " options, instead of reading it again. The cache is kept in " + RESULT_CACHE_DIR
+    parser.add_option("--cache", dest="cache", action="store_true", default=False, help=cache_help)
     (options, args) = parser.parse_args()
+    set_output_format(options.format)
+    set_output_compression(options.compress)
+    set_working_indexes(options.index)
+    set_result_cache(options.cache)
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
     if not options.target:
         sys.exit("please enter a target:\n\n%s" % parser.usage)
 
@@ -149,7 +158,7 @@ if __name__ == "__main__":
     else:
         min_time = 0
     if options.max:
-        max_time = time_to_epoch(options.min)
+        max_time = time_to_epoch(options.max)
     else:
         max_time = 10000000000000
 
@@ -0,0 +1,451 @@
+#!/usr/bin/env python
+import os, sys, time, json, math, sqlite3, calendar, optparse, importlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime as dt
+try:
+    from common_methods import *
+except ImportError:
+    sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
+from search_index import find_sources
+from exif_extractor import exifRecord
+
+
+def wa_location_label(row):
+    return ("%s %s" % (str(row[16]).partition("@")[0], row[2] or "")).strip()
+
+# (database file name, table that must exist in it,
+#  [(artifact, module, query function, timestamp column index, unit, table, condition, latitude column index,
+#    longitude column index, label function), ...])
+# condition picks the rows with a position in sql, the table's rowid is added to the end of each query as the row provenance
+GEO_SOURCES = [("msgstore.db", "messages", [("whatsapp locations", "whatsapp_scanner", "wa_msgs_query", 3, "unix_ms", "messages",
+                                             "latitude != 0 OR longitude != 0", 11, 12, wa_location_label)])]
+IMAGES_ARTIFACT = "image gps"
+
+# the r-tree indexes the positions, times are checked in the points table. Time isn't a third r-tree dimension because
+# its range, years of seconds, would make the tree split on time alone and slow every position search down
+# the sources keep the box and time span of their points to choose between the two
+INDEX_SCHEMA = ["CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, artifact TEXT, db TEXT, tbl TEXT, size INTEGER, " \
+                + "mtime REAL, rows INTEGER, south REAL, west REAL, north REAL, east REAL, first REAL, last REAL, " \
+                + "UNIQUE (artifact, db));",
+                "CREATE TABLE IF NOT EXISTS points (id INTEGER PRIMARY KEY, source INTEGER, row_id TEXT, lat REAL, lon REAL, " \
+                + "seconds REAL, time TEXT, label TEXT);",
+                "CREATE INDEX IF NOT EXISTS points_seconds ON points (seconds);",
+                "CREATE VIRTUAL TABLE IF NOT EXISTS point_index USING rtree(id, min_lat, max_lat, min_lon, max_lon);"]
+EARTH_RADIUS = 6371008.8
+METERS_PER_DEGREE = EARTH_RADIUS * math.pi / 180
+INSERT_BATCH = 10000
+
+
+def open_index(index_db):
+    '''Open (and create if needed) the location index side database'''
+    try:
+        conn = sqlite3.connect(index_db)
+        for command in INDEX_SCHEMA:
+            conn.execute(command)
+    except sqlite3.OperationalError as e:
+        sys.exit("Couldn't open the location index, your sqlite library must be built with RTREE: %s" % e)
+    return conn
+
+def add_source(conn, artifact, db, table, size=None, mtime=None):
+    '''Register a source, removing the points of a previous version of it. Returns the new source id'''
+    res = conn.execute("SELECT id FROM sources WHERE artifact = ? AND db = ?;", (artifact, db)).fetchall()
+    if res:
+        conn.execute("DELETE FROM point_index WHERE id IN (SELECT id FROM points WHERE source = ?);", (res[0][0],))
+        conn.execute("DELETE FROM points WHERE source = ?;", (res[0][0],))
+        conn.execute("DELETE FROM sources WHERE id = ?;", (res[0][0],))
+    return conn.execute("INSERT INTO sources (artifact, db, tbl, size, mtime, rows) VALUES (?, ?, ?, ?, ?, 0);",
+                        (artifact, db, table, size, mtime)).lastrowid
+
+def add_points(conn, source_id, points):
+    '''Insert a list of (row id, latitude, longitude, seconds, local time, label) points into the table and the r-tree,
+and add them to their source's count, box and time span'''
+    if not points:
+        return
+    lats = [point[1] for point in points]
+    lons = [point[2] for point in points]
+    conn.execute("UPDATE sources SET rows = rows + ?, south = MIN(IFNULL(south, 90), ?), west = MIN(IFNULL(west, 180), ?), " \
+                 + "north = MAX(IFNULL(north, -90), ?), east = MAX(IFNULL(east, -180), ?) WHERE id = ?;",
+                 (len(points), min(lats), min(lons), max(lats), max(lons), source_id))
+    times = [point[3] for point in points if point[3] is not None]
+    if times:
+        conn.execute("UPDATE sources SET first = MIN(IFNULL(first, ?), ?), last = MAX(IFNULL(last, ?), ?) WHERE id = ?;",
+                     (times[0], min(times), times[0], max(times), source_id))
+    first = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM points;").fetchone()[0]
+    conn.executemany("INSERT INTO points (id, source, row_id, lat, lon, seconds, time, label) VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+                     [(first + i, source_id) + point for i, point in enumerate(points)])
+    conn.executemany("INSERT INTO point_index VALUES (?, ?, ?, ?, ?);",
+                     [(first + i, point[1], point[1], point[2], point[2]) for i, point in enumerate(points)])
+
+def index_source(conn, source):
+    '''Add the positions found in one database to the index, replacing them if the database has changed since it was
+last indexed. Returns the number of points indexed, None if the source was already up to date'''
+    artifact, db, module, function, index, unit, table, condition, lat_index, lon_index, label = source
+    stats = os.stat(db)
+    res = conn.execute("SELECT size, mtime FROM sources WHERE artifact = ? AND db = ?;", (artifact, db)).fetchall()
+    if res and res[0] == (stats.st_size, stats.st_mtime):
+        return None
+    source_id = add_source(conn, artifact, db, table, stats.st_size, stats.st_mtime)
+
+    query = getattr(importlib.import_module(module), function)().where(condition).add_columns("%s.rowid" % table)
+    ticks, epoch = TIMESTAMP_UNITS[unit]
+    rows = 0
+    for batch in query.run_batches(db):
+        times = convert_timestamps([row[index] for row in batch], unit)
+        points = []
+        for row, local_time in zip(batch, times):
+            position = normalize_coordinates(row[lat_index], row[lon_index])
+            if position is None:
+                continue
+            raw = row[index]
+            seconds = raw / ticks - epoch if type(raw) in (int, float) else None
+            points.append((row[-1], position[0], position[1], seconds, local_time, label(row)))
+        add_points(conn, source_id, points)
+        rows += len(points)
+    return rows
+
+def image_seconds(record):
+    '''The unix time of an image's exif record: its GPS fix time, else the time it was taken, corrected by its UTC
+offset when the camera saved one. None if the image has no valid time'''
+    try:
+        if record["gps_time"]:
+            return calendar.timegm(time.strptime(record["gps_time"], "%Y-%m-%d %H:%M:%S"))
+        if not record["taken"]:
+            return None
+        taken = dt.strptime(record["taken"][:19], "%Y-%m-%d %H:%M:%S")
+        offset = record["utc_offset"]
+        if offset and len(offset) == 6 and offset[0] in "+-":
+            seconds = int(offset[1:3]) * 3600 + int(offset[4:6]) * 60
+            return calendar.timegm(taken.timetuple()) - (seconds if offset[0] == "+" else -seconds)
+        return taken.timestamp()
+    except (ValueError, OverflowError):
+        return None
+
+def index_images(conn, root, workers=None, chunksize=256):
+    '''Add the GPS positions of every jpeg and tiff image under root to the index, read by a pool of worker processes.
+The images of a directory are indexed again every time. Returns the number of points indexed'''
+    source_id = add_source(conn, IMAGES_ARTIFACT, os.path.abspath(root), None)
+    rows = 0
+    points = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for record in pool.map(exifRecord, walkFiles(root), chunksize=chunksize):
+            if record is None:
+                continue
+            position = normalize_coordinates(record["latitude"], record["longitude"])
+            if position is None:
+                continue
+            seconds = image_seconds(record)
+            local_time = timestamp_to_text(seconds) if seconds is not None else None
+            label = " ".join(record[field] for field in ("make", "model") if record[field])
+            points.append((os.path.abspath(record["path"]), position[0], position[1], seconds, local_time, label))
+            if len(points) == INSERT_BATCH:
+                add_points(conn, source_id, points)
+                rows += len(points)
+                points = []
+    add_points(conn, source_id, points)
+    return rows + len(points)
+
+def build_index(root, index_db="geo_index.db", workers=None, images=True):
+    '''Index the positions of whatsapp location messages and the GPS positions of the images found under root.
+Databases that were already indexed and haven't changed are skipped, so one index can be built up from many devices.
+Pass images=False to skip the images. Returns a list of (artifact, db, rows) tuples, rows is None for the skipped sources'''
+    conn = open_index(index_db)
+    conn.execute("PRAGMA synchronous = OFF;")
+    results = []
+    try:
+        for source in find_sources(root, GEO_SOURCES):
+            with conn:
+                rows = index_source(conn, source)
+            results.append((source[0], source[1], rows))
+            if rows is None:
+                print("%-24s already indexed  (%s)" % (source[0], source[1]))
+            else:
+                print("%-24s %10d point(s)  (%s)" % (source[0], rows, source[1]))
+        if images:
+            with conn:
+                rows = index_images(conn, root, workers)
+            results.append((IMAGES_ARTIFACT, os.path.abspath(root), rows))
+            print("%-24s %10d point(s)  (%s)" % (IMAGES_ARTIFACT, rows, os.path.abspath(root)))
+    finally:
+        conn.close()
+    return results
+
+def distance(lat1, lon1, lat2, lon2):
+    '''The great circle distance between two positions in meters'''
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+def point_tables(conn, south, west, north, east, tm_min=None, tm_max=None):
+    '''The from clause of a search, that starts with the r-tree or with the time index: whichever narrows the search
+down to the smallest share of the points, going by the box and time span of all the indexed points'''
+    span = conn.execute("SELECT MIN(south), MIN(west), MAX(north), MAX(east), MIN(first), MAX(last) FROM sources;").fetchone()
+    rtree_first = "point_index i CROSS JOIN points p ON (p.id = i.id)"
+    if (tm_min is None and tm_max is None) or None in span:
+        return rtree_first
+    first, last = span[4], span[5]
+    time_share = (min(last, tm_max if tm_max is not None else last) - max(first, tm_min if tm_min is not None else first)) \
+                 / max(last - first, 1.0)
+    lat_share = (min(north, span[2]) - max(south, span[0])) / max(span[2] - span[0], 1e-7)
+    if west <= east:
+        lon_share = (min(east, span[3]) - max(west, span[1])) / max(span[3] - span[1], 1e-7)
+    else:
+        lon_share = min(1.0, (east - west + 360) / max(span[3] - span[1], 1e-7))
+    if time_share < max(0.0, lat_share) * max(0.0, lon_share):
+        return "points p CROSS JOIN point_index i ON (i.id = p.id)"
+    return rtree_first
+
+def point_filters(south, west, north, east, artifact=None, tm_min=None, tm_max=None):
+    '''The where clauses and params selecting the points of a bounding box, the r-tree narrows the search down and the
+exact positions and times are then checked in the points table. A box with west > east crosses the 180th meridian'''
+    conditions = ["i.max_lat >= ? AND i.min_lat <= ? AND p.lat BETWEEN ? AND ?"]
+    params = [south, north, south, north]
+    if west <= east:
+        conditions.append("i.max_lon >= ? AND i.min_lon <= ? AND p.lon BETWEEN ? AND ?")
+        params.extend((west, east, west, east))
+    else:
+        conditions.append("(i.max_lon >= ? OR i.min_lon <= ?) AND (p.lon >= ? OR p.lon <= ?)")
+        params.extend((west, east, west, east))
+    if tm_min is not None:
+        conditions.append("p.seconds > ?")
+        params.append(tm_min)
+    if tm_max is not None:
+        conditions.append("p.seconds < ?")
+        params.append(tm_max)
+    if artifact:
+        conditions.append("s.artifact = ?")
+        params.append(artifact)
+    return " AND ".join(conditions), params
+
+def bbox_query(index_db, south, west, north, east, artifact=None, tm_min=None, tm_max=None, limit=None):
+    '''Find the points inside a bounding box, optionally between two unix times and of one artifact. Returns the
+oldest first as (local time, latitude, longitude, artifact, database, table, row id, label) tuples'''
+    if not os.path.isfile(index_db):
+        sys.exit("Couldn't find the location index %s, build it first with -t build" % index_db)
+    conn = open_index(index_db)
+    conditions, params = point_filters(south, west, north, east, artifact, tm_min, tm_max)
+    command = "SELECT p.time, p.lat, p.lon, s.artifact, s.db, s.tbl, p.row_id, p.label FROM %s " \
+              % point_tables(conn, south, west, north, east, tm_min, tm_max) \
+              + "JOIN sources s ON (s.id = p.source) WHERE %s ORDER BY p.seconds" % conditions
+    if limit:
+        command += " LIMIT ?"
+        params.append(limit)
+    try:
+        return conn.execute(command + ";", params).fetchall()
+    finally:
+        conn.close()
+
+def radius_query(index_db, lat, lon, meters, artifact=None, tm_min=None, tm_max=None, limit=None):
+    '''Find the points within meters of a position, optionally between two unix times and of one artifact. Returns the
+nearest first as (distance in meters, local time, latitude, longitude, artifact, database, table, row id, label) tuples'''
+    lat_delta = meters / METERS_PER_DEGREE
+    south, north = max(-90.0, lat - lat_delta), min(90.0, lat + lat_delta)
+    cos_lat = min(math.cos(math.radians(south)), math.cos(math.radians(north)))
+    lon_delta = meters / (METERS_PER_DEGREE * cos_lat) if cos_lat > 1e-9 else 360
+    if lon_delta >= 180:
+        west, east = -180.0, 180.0
+    else:
+        west = lon - lon_delta if lon - lon_delta >= -180 else lon - lon_delta + 360
+        east = lon + lon_delta if lon + lon_delta <= 180 else lon + lon_delta - 360
+    hits = []
+    for point in bbox_query(index_db, south, west, north, east, artifact, tm_min, tm_max):
+        meters_away = distance(lat, lon, point[1], point[2])
+        if meters_away <= meters:
+            hits.append((meters_away,) + point)
+    hits.sort(key=lambda hit: hit[0])
+    return hits[:limit] if limit else hits
+
+def wrap_longitude(lon):
+    '''Bring a longitude shifted by whole turns back to -180..180'''
+    return lon if -180 <= lon <= 180 else (lon + 180) % 360 - 180
+
+def hotspots(index_db, cell_meters=100, min_points=5, artifact=None, tm_min=None, tm_max=None, bbox=None):
+    '''Cluster the points into hotspots: the points are counted on a grid of cells of about cell_meters, and each cell
+with at least min_points points starts a hotspot. Like DBSCAN's core and border points, the dense cells of a hotspot grow
+it over their neighbours with points, while its sparse cells join it without growing it further, so sparse edges count
+but a trail of sparse cells doesn't chain on. The grid wraps around at the antimeridian. Pass bbox as (south, west,
+north, east) to only cluster the points inside it. Returns a GeoJSON FeatureCollection dict, the biggest hotspot first,
+each a point at its center with its number of points, first and last times, bounding box and artifacts'''
+    if not os.path.isfile(index_db):
+        sys.exit("Couldn't find the location index %s, build it first with -t build" % index_db)
+    cell = cell_meters / METERS_PER_DEGREE
+    columns = int(math.ceil(360 / cell))
+    conn = open_index(index_db)
+    try:
+        if bbox:
+            tables = point_tables(conn, bbox[0], bbox[1], bbox[2], bbox[3], tm_min, tm_max)
+            conditions, params = point_filters(bbox[0], bbox[1], bbox[2], bbox[3], artifact, tm_min, tm_max)
+        else:
+            tables = "points p"
+            conditions, params = [], []
+            if tm_min is not None:
+                conditions.append("p.seconds > ?")
+                params.append(tm_min)
+            if tm_max is not None:
+                conditions.append("p.seconds < ?")
+                params.append(tm_max)
+            if artifact:
+                conditions.append("s.artifact = ?")
+                params.append(artifact)
+            conditions = " AND ".join(conditions) or "1"
+        command = "SELECT CAST((p.lat + 90) / ? AS INTEGER) AS y, CAST((p.lon + 180) / ? AS INTEGER) % ? AS x, COUNT(*), " \
+                  + "SUM(p.lat), SUM(p.lon), MIN(p.lat), MIN(p.lon), MAX(p.lat), MAX(p.lon), MIN(p.seconds), MAX(p.seconds), " \
+                  + "GROUP_CONCAT(DISTINCT s.artifact) FROM %s JOIN sources s ON (s.id = p.source) WHERE %s " % (tables, conditions) \
+                  + "GROUP BY y, x;"
+        cells = dict(((row[0], row[1]), row[2:]) for row in conn.execute(command, [cell, cell, columns] + params))
+    finally:
+        conn.close()
+
+    # flood fill the grid from each dense cell over the cells with points, only the dense cells spread the fill
+    clusters = []
+    seen = set()
+    for start in cells:
+        if start in seen or cells[start][0] < min_points:
+            continue
+        seen.add(start)
+        stack, members = [start], []
+        while stack:
+            y, x = stack.pop()
+            members.append(cells[(y, x)])
+            if cells[(y, x)][0] < min_points:
+                continue
+            for neighbour in ((y + dy, (x + dx) % columns) for dy in (-1, 0, 1) for dx in (-1, 0, 1)):
+                if neighbour in cells and neighbour not in seen:
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+        clusters.append(members)
+
+    features = []
+    for members in clusters:
+        # shift the cells across the antimeridian from the first one by a whole turn, so the center and box are
+        # computed on one side of it
+        first_lon = members[0][2] / members[0][0]
+        count, lat_sum, lon_sum, wests, easts = 0, 0.0, 0.0, [], []
+        for member in members:
+            shift = 0
+            if member[2] / member[0] - first_lon > 180:
+                shift = -360
+            elif member[2] / member[0] - first_lon < -180:
+                shift = 360
+            count += member[0]
+            lat_sum += member[1]
+            lon_sum += member[2] + shift * member[0]
+            wests.append(member[4] + shift)
+            easts.append(member[6] + shift)
+        firsts = [member[7] for member in members if member[7] is not None]
+        lasts = [member[8] for member in members if member[8] is not None]
+        artifacts = sorted(set(",".join(member[9] for member in members).split(",")))
+        features.append({"type" : "Feature",
+                         "geometry" : {"type" : "Point",
+                                       "coordinates" : [round(wrap_longitude(lon_sum / count), 7), round(lat_sum / count, 7)]},
+                         # west is greater than east for the hotspots crossing the antimeridian, like GeoJSON does
+                         "bbox" : [wrap_longitude(min(wests)), min(member[3] for member in members),
+                                   wrap_longitude(max(easts)), max(member[5] for member in members)],
+                         "properties" : {"points" : count,
+                                         "first" : timestamp_to_text(min(firsts)) if firsts else None,
+                                         "last" : timestamp_to_text(max(lasts)) if lasts else None,
+                                         "artifacts" : artifacts}})
+    features.sort(key=lambda feature: -feature["properties"]["points"])
+    return {"type" : "FeatureCollection", "features" : features}
+
+def points_geojson(points):
+    '''A GeoJSON FeatureCollection dict of the results of bbox_query'''
+    return {"type" : "FeatureCollection",
+            "features" : [{"type" : "Feature", "geometry" : {"type" : "Point", "coordinates" : [lon, lat]},
+                           "properties" : {"time" : local_time, "artifact" : artifact, "db" : db, "table" : table,
+                                           "row_id" : row_id, "label" : label}}
+                          for local_time, lat, lon, artifact, db, table, row_id, label in points]}
+
+def provenance(db, table, row_id):
+    '''Where a point comes from: the database, table and rowid of a row, or the path of an image'''
+    return "%s:%s#%s" % (db, table, row_id) if table else row_id
+
+def parse_numbers(text, count, name):
+    try:
+        numbers = [float(item) for item in text.split(",")]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        sys.exit("%s must be %d comma separated numbers" % (name, count))
+    return numbers
+
+if __name__ == "__main__":
+    print('\n\n    ##############A Python script to search locations #######################')
+    print('    #  indexes the positions of whatsapp location messages and photos once,  #')
+    print('    #  then finds the ones near a place in milliseconds and maps hotspots    #')
+    print('    ##########################################################################\n\n')
+
+    parser = optparse.OptionParser("Usage: python %prog -t build -d <image or extraction directory> -i <(optional) index file>" \
+                                   + " or python %prog -t radius --center <latitude,longitude> -r <meters>" \
+                                   + " or python %prog -t bbox --bbox <south,west,north,east>" \
+                                   + " or python %prog -t hotspots -c <(optional) cell meters> -m <(optional) minimum points>" \
+                                   + " -o <(optional) GeoJSON file> or python %prog -h for help")
+    parser.add_option("-t", dest="target", type="string", help="one of build, radius, bbox or hotspots")
+    parser.add_option("-d", dest="root", type="string", help="enter only if target is 'build', the mounted image or extraction directory to index")
+    index_help = "the location index file, default geo_index.db. Build it once per case, then add more devices to it by " \
+                 + "building again with another directory"
+    parser.add_option("-i", dest="index_db", type="string", default="geo_index.db", help=index_help)
+    parser.add_option("-w", dest="workers", type="int", help="enter only if target is 'build', number of worker processes reading the images, default one per cpu")
+    parser.add_option("--no_images", dest="no_images", action="store_true", default=False, help="enter only if target is 'build' to skip the images")
+    parser.add_option("--center", dest="center", type="string", help="enter only if target is 'radius', the position to search around, eg: 48.8584,2.2945")
+    parser.add_option("-r", dest="radius", type="float", default=500, help="enter only if target is 'radius', the search radius in meters, default 500")
+    bbox_help = "the box to search in, or to find hotspots in, as south,west,north,east in decimal degrees. eg: 48.8,2.2,48.9,2.4"
+    parser.add_option("--bbox", dest="bbox", type="string", help=bbox_help)
+    parser.add_option("-c", dest="cell", type="float", default=100, help="enter only if target is 'hotspots', the size of the grid cells in meters, default 100")
+    parser.add_option("-m", dest="min_points", type="int", default=5, help="enter only if target is 'hotspots', the minimum points of a cell to start a hotspot, default 5")
+    out_help = "save the results as GeoJSON to the given file, default hotspots.geojson for hotspots. The points found by radius " \
+               + "and bbox searches are only saved if it's given"
+    parser.add_option("-o", dest="output", type="string", help=out_help)
+    parser.add_option("-a", dest="artifact", type="string", help="only search one artifact: 'whatsapp locations' or 'image gps'")
+    parser.add_option("-n", dest="limit", type="int", default=50, help="enter only if target is 'radius' or 'bbox', the maximum number of points shown, default 50")
+    min_help = "only find positions after a given date and time, must be a string separated by _ YYYY_MM_DD_HH_MM_SS"
+    parser.add_option("--min_time", dest="min", type="string", help=min_help)
+    max_help = "only find positions before a given date and time, must be a string separated by _ YYYY_MM_DD_HH_MM_SS"
+    parser.add_option("--max_time", dest="max", type="string", help=max_help)
+    add_output_options(parser, "opening the databases, queries, fetching rows and timestamp conversion while" \
+                       + " building the index, the rest of the run, images and queries included, is counted as transform",
+                       reports=None)
+    (options, args) = parser.parse_args()
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
+
+    if options.target not in ("build", "radius", "bbox", "hotspots"):
+        sys.exit("please enter a target:\n\n%s" % parser.usage)
+
+    start = time.time()
+    min_time = time_to_epoch(options.min) if options.min else None
+    max_time = time_to_epoch(options.max) if options.max else None
+    bbox = parse_numbers(options.bbox, 4, "--bbox") if options.bbox else None
+    if options.target == "build":
+        if not options.root or not os.path.isdir(options.root):
+            sys.exit("please enter a valid directory to index:\n\n%s" % parser.usage)
+        print("Working...\n")
+        build_index(options.root, options.index_db, options.workers, not options.no_images)
+        print("\nIndex saved to %s in %.2fs\n" % (options.index_db, time.time() - start))
+    elif options.target == "hotspots":
+        collection = hotspots(options.index_db, options.cell, options.min_points, options.artifact, min_time, max_time, bbox)
+        for feature in collection["features"][:options.limit]:
+            lon, lat = feature["geometry"]["coordinates"]
+            props = feature["properties"]
+            print("%11.7f, %12.7f  %8d point(s)  %s - %s  %s" % (lat, lon, props["points"], props["first"], props["last"],
+                                                                 ", ".join(props["artifacts"])))
+        print("\n%d hotspot(s) in %.1f ms\n" % (len(collection["features"]), (time.time() - start) * 1000))
+        saveResult(options.output or "hotspots.geojson", json.dumps(collection, indent=1))
+    else:
+        if options.target == "radius":
+            if not options.center:
+                sys.exit("please enter the position to search around:\n\n%s" % parser.usage)
+            lat, lon = parse_numbers(options.center, 2, "--center")
+            hits = radius_query(options.index_db, lat, lon, options.radius, options.artifact, min_time, max_time)
+            points = [hit[1:] for hit in hits]
+            for hit in hits[:options.limit]:
+                print("%8.0fm  %s  %11.7f, %12.7f  %-18s %s  %s" % (hit[0], hit[1], hit[2], hit[3], hit[4], hit[8],
+                                                                    provenance(hit[5], hit[6], hit[7])))
+        else:
+            if not bbox:
+                sys.exit("please enter the box to search in:\n\n%s" % parser.usage)
+            points = bbox_query(options.index_db, bbox[0], bbox[1], bbox[2], bbox[3], options.artifact, min_time, max_time)
+            for point in points[:options.limit]:
+                print("%s  %11.7f, %12.7f  %-18s %s  %s" % (point[0], point[1], point[2], point[3], point[7],
+                                                            provenance(point[4], point[5], point[6])))
+        print("\n%d point(s) in %.1f ms\n" % (len(points), (time.time() - start) * 1000))
+        if options.output:
+            saveResult(options.output, json.dumps(points_geojson(points), indent=1))
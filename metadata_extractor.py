@@ -1,6 +1,7 @@
 from zipfile import BadZipFile, ZipFile
 from olefile import OleFileIO
 import os, sys, optparse
+from concurrent.futures import ProcessPoolExecutor
 import lxml.etree as tree
 from datetime import datetime as dt
 from common_methods import *
@@ -10,6 +11,114 @@ except ImportError:
     sys.exit("PyPDF2 module not found... to install it use the command: pip install PyPDF2")
 
 
+META_FIELDS = ["path", "type", "author", "last_author", "created", "modified", "last_printed", "revisions", "application",
+               "producer", "company", "title", "subject", "owner_uid", "metadata_changed", "last_modified", "last_accessed",
+               "error"]
+
+class MetaDataError(Exception):
+    '''Raised when a document's metadata can't be read'''
+    pass
+
+def readFileStats(file_path):
+    '''Get the file system metadata of a file as a dict'''
+    stats = os.stat(file_path)
+    return {"owner_uid" : stats.st_uid,
+            "metadata_changed" : dt.fromtimestamp(stats.st_ctime),
+            "last_modified" : dt.fromtimestamp(stats.st_mtime),
+            "last_accessed" : dt.fromtimestamp(stats.st_atime)}
+
+def readCompMetaData(file_path):
+    '''Read the core properties of an office open xml (zip based) document, returns a dict'''
+    try:
+        with ZipFile(file_path) as f:
+            doc = tree.fromstring(f.read("docProps/core.xml"))
+    except (BadZipFile, KeyError) as e:
+        raise MetaDataError("not an office open xml document: %s" % e)
+
+    ns = {'dc': 'http://purl.org/dc/elements/1.1/',
+          'dcterms': 'http://purl.org/dc/terms/',
+          'cp' : 'http://schemas.openxmlformats.org/package/2006/metadata/core-properties'}
+
+    def first(path):
+        res = doc.xpath(path, namespaces=ns)
+        return res[0].text if res else None
+
+    return {"author" : first('//dc:creator'),
+            "last_author" : first('//cp:lastModifiedBy'),
+            "created" : first('//dcterms:created'),
+            "modified" : first('//dcterms:modified'),
+            "revisions" : first('//cp:revision'),
+            "title" : first('//dc:title'),
+            "subject" : first('//dc:subject')}
+
+def readOleMetaData(file_path):
+    '''Read the summary information of an ole (legacy office) document, returns a dict'''
+    def text(val):
+        return val.decode("latin-1") if val is not None else None
+
+    def date(val):
+        return val.ctime() if val is not None else None
+
+    try:
+        ole = OleFileIO(file_path)
+        meta = ole.get_metadata()
+        ole.close()
+    except OSError as e:
+        raise MetaDataError("File not supported: %s" % e)
+
+    return {"author" : text(meta.author),
+            "created" : date(meta.create_time),
+            "last_author" : text(meta.last_saved_by),
+            "modified" : date(meta.last_saved_time),
+            "last_printed" : date(meta.last_printed),
+            "revisions" : text(meta.revision_number),
+            "company" : text(meta.company),
+            "application" : text(meta.creating_application),
+            "title" : text(meta.title),
+            "subject" : text(meta.subject)}
+
+def readPdfInfo(file_path, password=""):
+    '''Open a pdf document, decrypting it if needed, and return its document info dictionary'''
+    with open(file_path, "rb") as pdf_file:
+        pdf_doc = PdfFileReader(pdf_file, strict=False)
+
+        if pdf_doc.isEncrypted:
+            try:
+                if pdf_doc.decrypt(password) != 1:
+                    raise MetaDataError("target pdf document is encrypted...")
+            except MetaDataError:
+                raise
+            except Exception:
+                raise MetaDataError("target pdf document is encrypted with an unsupported algorithm...")
+
+        doc_info = pdf_doc.getDocumentInfo()
+        if doc_info is None:
+            raise MetaDataError("Couldn't read document info! Make sure target is a valid pdf document...")
+        return dict((str(md[1:]), str(doc_info[md])) for md in doc_info)
+
+def readPdfMetaData(file_path, password=""):
+    '''Read the document info of a pdf document, returns a dict'''
+    info = readPdfInfo(file_path, password)
+    return {"author" : info.get("Author"),
+            "created" : pretifyPyPDF2Time("CreationDate", info.get("CreationDate", "")) or None,
+            "modified" : pretifyPyPDF2Time("ModDate", info.get("ModDate", "")) or None,
+            "application" : info.get("Creator"),
+            "producer" : info.get("Producer"),
+            "title" : info.get("Title"),
+            "subject" : info.get("Subject")}
+
+def readImageMetaData(file_path):
+    '''Read the EXIF metadata of a jpeg or tiff image, returns a dict'''
+    from exif_extractor import readExifTags
+    exif = readExifTags(file_path) or {}
+    camera = " ".join(str(exif[tag]).strip() for tag in ("Make", "Model") if exif.get(tag))
+    return {"author" : exif.get("Artist"),
+            "created" : exif.get("DateTimeOriginal"),
+            "modified" : exif.get("DateTime"),
+            "application" : exif.get("Software"),
+            "producer" : camera or None,
+            "title" : exif.get("ImageDescription")}
+
 def compMetaData(file_path, save=True):
     now = dt.now()
     file_name = getFileName(file_path)
@@ -18,35 +127,25 @@ def compMetaData(file_path, save=True):
                                                                                                    now.day, now.hour, now.minute,
                                                                                                    now.second, file_name[:-4])
     try:
-        f = ZipFile(file_path)
-        doc = tree.fromstring(f.read("docProps/core.xml"))
-
-        ns = {'dc': 'http://purl.org/dc/elements/1.1/'}
-        ns2 = {'dcterms': 'http://purl.org/dc/terms/'}
-        ns3 = {'cp' : 'http://schemas.openxmlformats.org/package/2006/metadata/core-properties'}
+        meta = readCompMetaData(file_path)
+        creator = meta["author"]
+        last_modifier = meta["last_author"]
+        creation_time = meta["created"]
+        xml_mod_time = meta["modified"]
 
-        creator = doc.xpath('//dc:creator', namespaces=ns)[0].text
-        last_modifier = doc.xpath('//cp:lastModifiedBy', namespaces=ns3)[0].text
-        creation_time = doc.xpath('//dcterms:created', namespaces=ns2)[0].text
-        xml_mod_time = doc.xpath('//dcterms:modified', namespaces=ns2)[0].text
-
-    except BadZipFile:
+    except MetaDataError:
         creator = "Could not get creator... File format not supported!"
         last_modifier = "Could not get last modifier... File format not supported!"
         creation_time = "Could not get creation time... File format not supported!"
         xml_mod_time = "Could not get xml modification time... File format not supported!"
 
-    stats = os.stat(file_path)
-    c_time = dt.fromtimestamp(stats.st_ctime)
-    last_access_time = dt.fromtimestamp(stats.st_atime)
-    last_mod_time = dt.fromtimestamp(stats.st_mtime)
-    owner_user_id = stats.st_uid
+    stats = readFileStats(file_path)
 
     metadata += """Creator: %s\nLast Modified By: %s\nOwner User ID: %s\nLast metadata mod Time: %s\nCreation Time: %s
-Last Modification Time: %s\nXML Modification Time: %s\nLast Access Time: %s""" % (creator, last_modifier, owner_user_id,
-                                                                                  c_time, creation_time,
-                                                                                  last_mod_time, xml_mod_time,
-                                                                                  last_access_time)
+Last Modification Time: %s\nXML Modification Time: %s\nLast Access Time: %s""" % (creator, last_modifier, stats["owner_uid"],
+                                                                                  stats["metadata_changed"], creation_time,
+                                                                                  stats["last_modified"], xml_mod_time,
+                                                                                  stats["last_accessed"])
     try:
         print(metadata)
     except UnicodeEncodeError:
@@ -65,21 +164,12 @@ def oleMetaData(file_path, save=True):
                                                                                                now.day, now.hour, now.minute,
                                                                                                now.second, file_name[:-4])
     try:
-        ole = OleFileIO(file_path)
-        meta = ole.get_metadata()
-        ole.close()
-        author = meta.author.decode("latin-1")
-        creation_time = meta.create_time.ctime()
-        last_author = meta.last_saved_by.decode("latin-1")
-        last_edit_time = meta.last_saved_time.ctime()
-        last_printed = meta.last_printed.ctime()
-        revisions = meta.revision_number.decode("latin-1")
-        company = meta.company.decode("latin-1")
-        creating_app = meta.creating_application.decode("latin-1")
-
-        metadata += "Original Author: %s\nCreation Time: %s\nLast Author: %s\n" % (author, creation_time, last_author) \
-                    + "Last Modification Time: %s\nLast Printed at: %s\Total Revisions: %s\n" % (last_edit_time, last_printed, revisions) \
-                    + "Created with: %s\nCompany: %s" % (creating_app, company)
+        meta = readOleMetaData(file_path)
+
+        metadata += "Original Author: %s\nCreation Time: %s\nLast Author: %s\n" % (meta["author"], meta["created"], meta["last_author"]) \
+                    + "Last Modification Time: %s\nLast Printed at: %s\nTotal Revisions: %s\n" % (meta["modified"], meta["last_printed"],
+                                                                                                    meta["revisions"]) \
+                    + "Created with: %s\nCompany: %s" % (meta["application"], meta["company"])
 
         try:
             print(metadata)
@@ -91,9 +181,9 @@ def oleMetaData(file_path, save=True):
             tgt = file_name + ".txt"
 
             saveResult(tgt, metadata)
-            
-    except OSError as e1:
-        print("File not supported: %s" % e1)
+
+    except MetaDataError as e1:
+        print(e1)
     except FileNotFoundError:
         print("Specified file could not be found")
 
@@ -112,32 +202,24 @@ def pretifyPyPDF2Time(key, val):
 
 def pdfMetaData(file_path, save=True):
     '''Get PDF document metadata, takes 2 arguments, file_path and save (boolean, default is True)'''
-    pdf_doc = PdfFileReader(open(file_path, "rb"))
-
-    if pdf_doc.isEncrypted:
-        try:
-            if pdf_doc.decrypt("") != 1:
-                sys.exit("target pdf document is encrypted... exiting...")
-        except:
-            sys.exit("target pdf document is encrypted with an unsupported algorithm... exiting...")
+    try:
+        doc_info = readPdfInfo(file_path)
+    except MetaDataError as e:
+        sys.exit("%s exiting..." % e)
 
-    doc_info = pdf_doc.getDocumentInfo()
-    stats = os.stat(file_path)
+    stats = readFileStats(file_path)
     now = dt.now()
     file_name = getFileName(file_path)
     metadata = "Time: %d/%d/%d %d : %d : %d. Found the following metadata for file %s:\n\n" % (now.year, now.month,
                                                                                                now.day, now.hour, now.minute,
                                                                                                now.second, file_name[:-4])
-    try:
-        for md in doc_info:
-            metadata += str(md[1:]) + " : " + pretifyPyPDF2Time(str(md[1:]) ,str(doc_info[md])) + "\n"
-    except TypeError:
-        sys.exit("Couldn't read document info! Make sure target is a valid pdf document...")
-
-    metadata += "Last metadata mod Date: %s\nLast Mod Date: %s\nLast Access Date: %s\nOwner User ID: %s" %(dt.fromtimestamp(stats.st_ctime),
-                                                                                                           dt.fromtimestamp(stats.st_mtime),
-                                                                                                           dt.fromtimestamp(stats.st_atime),
-                                                                                                           stats.st_uid)
+    for md in doc_info:
+        metadata += md + " : " + pretifyPyPDF2Time(md, doc_info[md]) + "\n"
+
+    metadata += "Last metadata mod Date: %s\nLast Mod Date: %s\nLast Access Date: %s\nOwner User ID: %s" %(stats["metadata_changed"],
+                                                                                                           stats["last_modified"],
+                                                                                                           stats["last_accessed"],
+                                                                                                           stats["owner_uid"])
     try:
         print(metadata)
     except UnicodeEncodeError:
@@ -149,17 +231,95 @@ def pdfMetaData(file_path, save=True):
 
         saveResult(tgt, metadata)
 
+# file types detected by sniff_file_type and the document types they are read as
+SIGNATURE_DOC_TYPES = {"zip" : "comp", "ole" : "ole", "pdf" : "pdf", "jpeg" : "image", "tiff" : "image"}
+# the members that tell an office open xml document from other zip files (archives, apk and jar files...)
+OOXML_MEMBERS = ("[Content_Types].xml", "docProps/core.xml")
+
+def isOfficeOpenXml(file_path):
+    '''Check a zip file's directory for the members of an office open xml document'''
+    try:
+        with ZipFile(file_path) as f:
+            names = set(f.namelist())
+    except (BadZipFile, IOError, OSError):
+        return False
+    return any(member in names for member in OOXML_MEMBERS)
+
+def getDocType(file_path):
+    '''Detect a document type from the file's first bytes rather than its extension, so renamed and extensionless
+files are still read by the right parser: "comp", "ole", "pdf", "image" or None if it isn't supported. Zip files that
+aren't office open xml documents aren't supported'''
+    doc_type = SIGNATURE_DOC_TYPES.get(sniff_file_type(file_path))
+    if doc_type == "comp" and not isOfficeOpenXml(file_path):
+        return None
+    return doc_type
+
+READERS = {"comp" : readCompMetaData, "ole" : readOleMetaData, "pdf" : readPdfMetaData, "image" : readImageMetaData}
+
+def extractMetaData(file_path, doc_type=None):
+    '''Read the metadata of one document without printing or saving anything, returns a dict with the META_FIELDS keys,
+or None if the file type isn't supported. Errors are reported in the "error" field instead of stopping the caller'''
+    doc_type = doc_type or getDocType(file_path)
+    if doc_type is None:
+        return None
+    record = dict.fromkeys(META_FIELDS)
+    record["path"] = file_path
+    record["type"] = doc_type
+    try:
+        record.update(readFileStats(file_path))
+        record.update(READERS[doc_type](file_path))
+    except Exception as e:
+        record["error"] = "%s: %s" % (type(e).__name__, e)
+    return record
+
+def batchMetaData(root, output_file, workers=None, chunksize=64):
+    '''Extract the metadata of every supported document under a directory tree using a pool of worker processes.
+Files are recognized by their signature, the worker processes sniff them so the walk itself stays cheap. The results
+are written to one csv, jsonl (json lines) or parquet file depending on the output file extension, csv and jsonl
+files can be compressed by ending their name with .gz or .zst or with set_output_compression.
+Returns a tuple: (documents processed, documents that failed)'''
+    done, failed = 0, 0
+    with open_output_file(output_file, "metadata_extractor", META_FIELDS) as out, \
+         ProcessPoolExecutor(max_workers=workers) as pool:
+        for record in pool.map(extractMetaData, walkFiles(root), chunksize=chunksize):
+            if record is None:
+                continue
+            done += 1
+            if record["error"]:
+                failed += 1
+                print("%s: %s" % (record["path"], record["error"]))
+            out.write_row([record[field] for field in META_FIELDS])
+    return done, failed
+
 if __name__ == "__main__":
     print('\n\n    ##########A simple Python script to extract document metadata #########')
     print('    #                      Coded by monrocoury                            #')
     print('    #                most documents contain Metadata                      #')
     print('    #               for more info refer to Google/wiki                    #')
     print('    #######################################################################\n\n')
-    parser = optparse.OptionParser("Usage: python %prog -p <file path> -s <True or False>")
-    parser.add_option("-p", dest="file_path", type="string", help="provide the full path to the document. eg: E:\test.doc")
+    parser = optparse.OptionParser("Usage: python %prog -p <file path> -s <True or False> or python %prog -r <directory> -o <output file>")
+    parser.add_option("-p", dest="file_path", type="string", help="provide the full path to the document. eg: E:\\test.doc")
     parser.add_option("-s", dest="save", type="string", help="(optional) save the metadata as a text file? default True")
+    parser.add_option("-r", dest="root", type="string", help="extract the metadata of every supported document under this directory")
+    out_help = "used with -r, the file to save all the results to, a .csv, .jsonl or .parquet file. default metadata.csv"
+    parser.add_option("-o", dest="output", type="string", default="metadata.csv", help=out_help)
+    parser.add_option("-w", dest="workers", type="int", help="used with -r, number of worker processes, default one per cpu")
+    compress_help = "compress the saved text files, or the -o file, with gzip or zstd (requires zstandard), .gz or .zst is" \
+                    + " added to their names. Parquet files aren't compressed"
+    add_output_options(parser, "reading the documents, formatting and writing the results", reports=None,
+                       compress_help=compress_help)
 
     (options, args) = parser.parse_args()
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
+    set_output_compression(options.compress)
+
+    if options.root:
+        if not os.path.isdir(options.root):
+            sys.exit("%s is not a directory!" % options.root)
+        print("Working...\n")
+        done, failed = batchMetaData(options.root, options.output, options.workers)
+        print("Processed %d document(s), %d failed" % (done, failed))
+        sys.exit()
 
     path = options.file_path
     if not path:
@@ -172,11 +332,15 @@ if __name__ == "__main__":
     else:
         save = eval(save.title())
 
-    if any(path.endswith(ext) for ext in (".docx", ".pptx", ".xlsx", ".vsdx", "thmx", "xltx", ".potx", ".vtx", ".ppsx", ".pub", ".zip")):
+    doc_type = getDocType(path)
+    if doc_type == "comp":
         compMetaData(path, save)
-    elif path.endswith(".pdf"):
+    elif doc_type == "pdf":
         pdfMetaData(path, save)
-    elif any(path.endswith(ext) for ext in (".doc", ".ppt", ".xls", ".pps")):
+    elif doc_type == "ole":
         oleMetaData(path, save)
+    elif doc_type == "image":
+        from exif_extractor import getExif
+        getExif(path, save, verbose=True)
     else:
-        print("File extension not supported/recognized... Make sure the file has the correct extension...")
+        print("File type not supported/recognized... Supported types are office, pdf and jpeg/tiff image files")
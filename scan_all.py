@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+import os, sys, io, time, sqlite3, optparse, importlib, contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+try:
+    from common_methods import *
+except ImportError:
+    sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
+
+
+# (database file name, table that must exist in it, [(artifact, module, read function), ...])
+ARTIFACTS = [("History", "urls", [("chrome history", "chrome_scanner", "read_chrome_history"),
+                                  ("chrome downloads", "chrome_scanner", "read_chrome_downloads")]),
+             ("Cookies", "cookies", [("chrome cookies", "chrome_scanner", "read_chrome_cookies")]),
+             ("Login Data", "logins", [("chrome logins", "chrome_scanner", "read_chrome_logins")]),
+             ("places.sqlite", "moz_places", [("firefox history", "firefox_scanner", "read_moz_history")]),
+             ("cookies.sqlite", "moz_cookies", [("firefox cookies", "firefox_scanner", "read_moz_cookies")]),
+             ("formhistory.sqlite", "moz_formhistory", [("firefox forms history", "firefox_scanner", "read_moz_forms")]),
+             ("downloads.sqlite", "moz_downloads", [("firefox downloads", "firefox_scanner", "read_moz_downloads")]),
+             ("main.db", "Messages", [("skype accounts", "skype_scanner", "read_accounts"),
+                                      ("skype contacts", "skype_scanner", "read_contacts"),
+                                      ("skype call log", "skype_scanner", "read_call_log"),
+                                      ("skype messages", "skype_scanner", "read_msgs")]),
+             ("msgstore.db", "messages", [("whatsapp messages", "whatsapp_scanner", "read_wa_msgs")]),
+             ("wa.db", "wa_contacts", [("whatsapp contacts", "whatsapp_scanner", "read_wa_contacts")]),
+             ("core.db", "threads", [("messenger messages", "facebook_scanner", "read_fb_messages"),
+                                     ("messenger contacts", "facebook_scanner", "read_fb_contacts"),
+                                     ("messenger call log", "facebook_scanner", "read_fb_call_log")]),
+             ("cross_account.db", "accounts", [("messenger accounts", "facebook_scanner", "read_fb_accounts")])]
+
+
+def has_table(db, table):
+    '''Check that a file is a sqlite database containing the given table'''
+    try:
+        res = get_connection(db).execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE;",
+                                         (table,)).fetchall()
+        return len(res) > 0
+    except sqlite3.Error:
+        return False
+
+def find_artifacts(root):
+    '''Walk a mounted image or extraction directory and return a list of scan jobs for every supported database found.
+Each job is a tuple: (artifact, database path, module, read function)'''
+    by_name = dict((db_name, (table, readers)) for db_name, table, readers in ARTIFACTS)
+    jobs = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        for file_name in sorted(file_names):
+            if file_name not in by_name:
+                continue
+            db = os.path.join(dir_path, file_name)
+            table, readers = by_name[file_name]
+            if not has_table(db, table):
+                continue
+            for artifact, module, function in readers:
+                jobs.append((artifact, db, module, function))
+    close_connections()
+    return jobs
+
+def report_dir(root, db, out_dir):
+    '''Every source directory gets its own output directory, mirroring its path under root, so reports from different
+profiles don't collide'''
+    rel = os.path.relpath(os.path.dirname(os.path.abspath(db)), os.path.abspath(root))
+    if rel == os.curdir:
+        return out_dir
+    return os.path.join(out_dir, rel)
+
+def run_job(artifact, db, module, function, out_dir, fmt="html", cache=False, profile=False, compression=None):
+    '''Run one read function in a worker process. Returns (artifact, db, rows, seconds, error, stage results), the
+stage results are None unless profile is True'''
+    start = time.time()
+    rows, error = 0, None
+    set_profiling(profile, report=False)
+    try:
+        # jobs of the same database share its report directory and run at the same time
+        os.makedirs(out_dir, exist_ok=True)
+        set_output_dir(out_dir)
+        set_output_format(fmt)
+        set_output_compression(compression)
+        set_result_cache(cache)
+        reader = getattr(importlib.import_module(module), function)
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows = reader(db) or 0
+    except SystemExit as e:
+        error = str(e)
+    except Exception as e:
+        error = "%s: %s" % (type(e).__name__, e)
+    return artifact, db, rows, time.time() - start, error, profile_results()
+
+def scan_all(root, out_dir, workers=None, fmt="html", cache=False, profile=False, compression=None):
+    '''Find every supported database under root and run all the matching read functions in parallel, one worker
+process per artifact. Reports are saved under out_dir in the given format and compression (gzip, zstd or None), pass
+cache=True to reuse the results of previous scans from the result cache and profile=True to time the stages of every
+job.
+Returns a list of (artifact, db, rows, seconds, error, stage results)'''
+    jobs = find_artifacts(root)
+    if not jobs:
+        return []
+    if not workers:
+        workers = len(jobs)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = [pool.submit(run_job, artifact, db, module, function, report_dir(root, db, out_dir), fmt, cache, profile,
+                               compression)
+                   for artifact, db, module, function in jobs]
+        for future in as_completed(futures):
+            res = future.result()
+            results.append(res)
+            artifact, db, rows, seconds, error, stages = res
+            if error:
+                print("%-24s failed after %.2fs: %s" % (artifact, seconds, error))
+            else:
+                print("%-24s %10d row(s) in %8.2fs  (%s)" % (artifact, rows, seconds, db))
+    return results
+
+if __name__ == "__main__":
+    print('\n\n    ##############A Python script to scan every supported artifact ############')
+    print('    #          runs all the scanners on a mounted image or directory          #')
+    print('    ###########################################################################\n\n')
+
+    parser = optparse.OptionParser("Usage: python %prog -d <image or extraction directory> -o <output directory>" \
+                                   + " -w <(optional) number of worker processes> -f <(optional) report format>" \
+                                   + " -c <(optional)> or python %prog -h for help")
+    parser.add_option("-d", dest="root", type="string", help="the mounted image or extraction directory to search for databases")
+    parser.add_option("-o", dest="out_dir", type="string", default="scan_results",
+                      help="the directory to save the reports in, default scan_results")
+    workers_help = "maximum number of worker processes, default one per artifact found"
+    parser.add_option("-w", dest="workers", type="int", help=workers_help)
+    add_output_options(parser, "opening the databases, queries, fetching rows, timestamp conversion, lookups," \
+                       + " formatting, rendering and writing the reports, added up over every artifact", format_flag="-f",
+                       pstats=False)
+    cache_help = "reuse the results of previous scans of unchanged databases from the result cache, kept in " + RESULT_CACHE_DIR
+    parser.add_option("-c", dest="cache", action="store_true", default=False, help=cache_help)
+    (options, args) = parser.parse_args()
+
+    if not options.root or not os.path.isdir(options.root):
+        sys.exit("please enter a valid directory to scan:\n\n%s" % parser.usage)
+
+    print("Working...\n")
+    start = time.time()
+    set_output_compression(options.compress)
+    results = scan_all(options.root, options.out_dir, options.workers, options.format, options.cache, options.profile,
+                       options.compress)
+    if not results:
+        sys.exit("No supported databases found in %s" % options.root)
+
+    failed = len([res for res in results if res[4]])
+    print("\nScanned %d artifact(s), %d failed, %d row(s) in %.2fs. Reports saved to %s\n" % (len(results), failed,
+                                                                                        sum(res[2] for res in results),
+                                                                                        time.time() - start,
+                                                                                        options.out_dir))
+    if options.profile:
+        print("Time spent in each stage by all the worker processes:")
+        print_profile(merge_profile_results(res[5] for res in results if res[5]))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+import os, sys, time, sqlite3, optparse, importlib
+try:
+    from common_methods import *
+except ImportError:
+    sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
+from scan_all import has_table
+
+
+def history_text(row):
+    return "%s %s" % (row[1] or "", row[0] or "")
+
+def moz_history_text(row):
+    return "%s %s" % (row[2] or "", row[0] or "")
+
+def form_text(row):
+    return "%s %s" % (row[0], row[1])
+
+# (database file name, table that must exist in it,
+#  [(artifact, module, query function, timestamp column index, unit, table, content), ...])
+# content is the column index or function giving the text to index, the table's rowid is added to the end of each
+# query as the row provenance
+SEARCH_SOURCES = [("History", "urls", [("chrome history", "chrome_scanner", "chrome_history_query", 2, "webkit", "visits", history_text)]),
+                  ("places.sqlite", "moz_places", [("firefox history", "firefox_scanner", "moz_history_query", 3, "prtime",
+                                                    "moz_historyvisits", moz_history_text)]),
+                  ("formhistory.sqlite", "moz_formhistory", [("firefox forms history", "firefox_scanner", "moz_forms_query", 5, "prtime",
+                                                              "moz_formhistory", form_text)]),
+                  ("main.db", "Messages", [("skype messages", "skype_scanner", "skype_msgs_query", 0, "unix_s", "Messages", 3)]),
+                  ("msgstore.db", "messages", [("whatsapp messages", "whatsapp_scanner", "wa_msgs_query", 3, "unix_ms", "messages", 2)]),
+                  ("core.db", "threads", [("messenger messages", "facebook_scanner", "fb_messages_query", 2, "unix_ms", "messages", 3)])]
+
+INDEX_SCHEMA = ["CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, artifact TEXT, db TEXT, tbl TEXT, size INTEGER, " \
+                + "mtime REAL, rows INTEGER, UNIQUE (artifact, db));",
+                "CREATE VIRTUAL TABLE IF NOT EXISTS events USING fts5(content, source UNINDEXED, row_id UNINDEXED, " \
+                + "seconds UNINDEXED, time UNINDEXED, tokenize = 'unicode61 remove_diacritics 2');"]
+
+
+def open_index(index_db):
+    '''Open (and create if needed) the full text search side database'''
+    try:
+        conn = sqlite3.connect(index_db)
+        for command in INDEX_SCHEMA:
+            conn.execute(command)
+    except sqlite3.OperationalError as e:
+        sys.exit("Couldn't open the search index, your sqlite library must be built with FTS5: %s" % e)
+    return conn
+
+def find_sources(root, known_sources=SEARCH_SOURCES):
+    '''Walk a mounted image or extraction directory and return every searchable source found.
+Each source is a tuple: (artifact, database path, module, query function, column index, unit, table, content function),
+pass another list laid out like SEARCH_SOURCES as known_sources to find those instead'''
+    by_name = dict((db_name, (table, sources)) for db_name, table, sources in known_sources)
+    found = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        for file_name in sorted(file_names):
+            if file_name not in by_name:
+                continue
+            db = os.path.join(dir_path, file_name)
+            table, sources = by_name[file_name]
+            if has_table(db, table):
+                found.extend((source[0], os.path.abspath(db)) + source[1:] for source in sources)
+    return found
+
+def index_source(conn, source):
+    '''Add one source's rows to the index, replacing them if the database has changed since it was last indexed.
+Returns the number of rows indexed, None if the source was already up to date'''
+    artifact, db, module, function, index, unit, table, content = source
+    stats = os.stat(db)
+    res = conn.execute("SELECT id, size, mtime FROM sources WHERE artifact = ? AND db = ?;", (artifact, db)).fetchall()
+    if res and res[0][1:] == (stats.st_size, stats.st_mtime):
+        return None
+    if res:
+        conn.execute("DELETE FROM events WHERE source = ?;", (res[0][0],))
+        conn.execute("DELETE FROM sources WHERE id = ?;", (res[0][0],))
+    source_id = conn.execute("INSERT INTO sources (artifact, db, tbl, size, mtime, rows) VALUES (?, ?, ?, ?, ?, 0);",
+                             (artifact, db, table, stats.st_size, stats.st_mtime)).lastrowid
+
+    query = getattr(importlib.import_module(module), function)().add_columns("%s.rowid" % table)
+    ticks, epoch = TIMESTAMP_UNITS[unit]
+    rows = 0
+    for batch in query.run_batches(db):
+        times = convert_timestamps([row[index] for row in batch], unit)
+        events = []
+        for row, local_time in zip(batch, times):
+            text = row[content] if type(content) is int else content(row)
+            if not text:
+                continue
+            raw = row[index]
+            seconds = raw / ticks - epoch if type(raw) in (int, float) else None
+            events.append((str(text), source_id, row[-1], seconds, local_time))
+        conn.executemany("INSERT INTO events (content, source, row_id, seconds, time) VALUES (?, ?, ?, ?, ?);", events)
+        rows += len(events)
+    conn.execute("UPDATE sources SET rows = ? WHERE id = ?;", (rows, source_id))
+    return rows
+
+def build_index(root, index_db="search_index.db"):
+    '''Index the messages, history and form history of every supported database under root. Databases that were
+already indexed and haven't changed are skipped, so one index can be built up from many devices.
+Returns a list of (artifact, db, rows) tuples, rows is None for the skipped sources'''
+    conn = open_index(index_db)
+    conn.execute("PRAGMA synchronous = OFF;")
+    results = []
+    try:
+        for source in find_sources(root):
+            with conn:
+                rows = index_source(conn, source)
+            results.append((source[0], source[1], rows))
+            if rows is None:
+                print("%-24s already indexed  (%s)" % (source[0], source[1]))
+            else:
+                print("%-24s %10d row(s)  (%s)" % (source[0], rows, source[1]))
+        with conn:
+            conn.execute("INSERT INTO events (events) VALUES ('optimize');")
+    finally:
+        conn.close()
+    return results
+
+def search(index_db, terms, artifact=None, tm_min=None, tm_max=None, limit=50):
+    '''Search the index, terms uses the fts5 query syntax (words, "phrases", AND, OR, NOT, prefix*). Returns the best
+matches first as (local time, artifact, database, table, rowid, snippet) tuples'''
+    if not os.path.isfile(index_db):
+        sys.exit("Couldn't find the search index %s, build it first with -t build" % index_db)
+    conn = open_index(index_db)
+    command = "SELECT events.time, sources.artifact, sources.db, sources.tbl, events.row_id, " \
+              + "snippet(events, 0, '[', ']', '...', 12) FROM events JOIN sources ON (sources.id = events.source) " \
+              + "WHERE events MATCH ?"
+    params = [terms]
+    if artifact:
+        command += " AND sources.artifact = ?"
+        params.append(artifact)
+    if tm_min is not None:
+        command += " AND events.seconds > ?"
+        params.append(tm_min)
+    if tm_max is not None:
+        command += " AND events.seconds < ?"
+        params.append(tm_max)
+    command += " ORDER BY rank LIMIT ?;"
+    params.append(limit)
+    try:
+        return conn.execute(command, params).fetchall()
+    except sqlite3.OperationalError as e:
+        sys.exit("Invalid search: %s" % e)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    print('\n\n    ##############A Python script to search messages and browsing history ####')
+    print('    #   builds a full text index once, then searches it in milliseconds      #')
+    print('    ##########################################################################\n\n')
+
+    parser = optparse.OptionParser("Usage: python %prog -t build -d <image or extraction directory> -i <(optional) index file>" \
+                                   + " or python %prog -t query -q <search terms> -i <(optional) index file> -a <(optional) artifact>" \
+                                   + " -n <(optional) maximum number of hits> or python %prog -h for help")
+    parser.add_option("-t", dest="target", type="string", help="either build or query")
+    parser.add_option("-d", dest="root", type="string", help="enter only if target is 'build', the mounted image or extraction directory to index")
+    index_help = "the search index file, default search_index.db. Build it once per case, then add more devices to it by " \
+                 + "building again with another directory"
+    parser.add_option("-i", dest="index_db", type="string", default="search_index.db", help=index_help)
+    query_help = "enter only if target is 'query', the words to search for. Supports \"exact phrases\", AND, OR, NOT and " \
+                 + "prefix* searches"
+    parser.add_option("-q", dest="query", type="string", help=query_help)
+    parser.add_option("-a", dest="artifact", type="string", help="enter only if target is 'query' to only search one artifact, eg: 'whatsapp messages'")
+    parser.add_option("-n", dest="limit", type="int", default=50, help="enter only if target is 'query', the maximum number of hits, default 50")
+    min_help = "enter only if target is 'query' to find entries after a given date and time, must be a string separated by _ YYYY_MM_DD_HH_MM_SS"
+    parser.add_option("--min_time", dest="min", type="string", help=min_help)
+    max_help = "enter only if target is 'query' to find entries before a given date and time, must be a string separated by _ YYYY_MM_DD_HH_MM_SS"
+    parser.add_option("--max_time", dest="max", type="string", help=max_help)
+    add_output_options(parser, "opening the databases, queries, fetching rows and timestamp conversion while" \
+                       + " building the index, the rest of the run, searching included, is counted as transform", reports=None)
+    (options, args) = parser.parse_args()
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
+
+    if options.target not in ("build", "query"):
+        sys.exit("please enter a target:\n\n%s" % parser.usage)
+
+    start = time.time()
+    if options.target == "build":
+        if not options.root or not os.path.isdir(options.root):
+            sys.exit("please enter a valid directory to index:\n\n%s" % parser.usage)
+        print("Working...\n")
+        build_index(options.root, options.index_db)
+        print("\nIndex saved to %s in %.2fs\n" % (options.index_db, time.time() - start))
+    else:
+        if not options.query:
+            sys.exit("please enter something to search for:\n\n%s" % parser.usage)
+        min_time = time_to_epoch(options.min) if options.min else None
+        max_time = time_to_epoch(options.max) if options.max else None
+        hits = search(options.index_db, options.query, options.artifact, min_time, max_time, options.limit)
+        for local_time, artifact, db, table, row_id, snippet in hits:
+            print("%s  %-20s %s  %s:%s#%s" % (local_time, artifact, snippet, db, table, row_id))
+        print("\n%d hit(s) in %.1f ms\n" % (len(hits), (time.time() - start) * 1000))
@@ -7,103 +7,106 @@ except ImportError:
     sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
 
 
+def location(row):
+    '''The country and city of an account or contact row, the city and country are its third and fourth columns'''
+    if not row[2]:
+        return "%s, unspecified city/town" % row[3]
+    return "%s, %s" % (row[3], row[2])
+
+def not_participant_list(cells):
+    return cells[4] is None or 'partlist' not in str(cells[4])
+
+# report columns built from the rows of the queries in this file
+SKYPE_ACCOUNTS = RowSpec([(0, None), (1, None), (None, location), (4, None)])
+SKYPE_CONTACTS = RowSpec([(0, None), (1, None), (None, location), (4, None), (5, None)])
+SKYPE_CALLS = RowSpec([(0, None), (1, None), (2, None), (3, {0 : "outgoing", 1 : "incoming"})])
+MSG_STATUS = {1 : "pending", 2 : "delivered", "1" : "pending", "2" : "delivered"}
+
+def message_status(row):
+    if row[5] in MSG_STATUS:
+        return MSG_STATUS.get(row[4], "Unknown")
+    return "incoming"
+
+def skype_msgs_spec(user):
+    '''The report columns of messages, user is the account's skype name, the recipient of incoming messages'''
+    return RowSpec([(0, "unix_s"), (6, None), (2, None), (1, lambda partner: partner if partner else user), (3, None),
+                    (None, message_status)], where=not_participant_list)
+
+@cached_result()
 def read_accounts(db):
     '''Read account details from skype database. Takes one argument: database file full path'''
     command = "SELECT fullname, skypename, city, country, datetime(profile_timestamp, 'unixepoch') FROM Accounts;"
-    res = pull_from_db(db, command)
-    data = init_data("skype_scanner Account", len(res)) + init_table_header("./templates/init_account_html.html")
-    for row in res:
-        if not row[2]:
-            loc = str(row[3]) + ", unspecified city/town"
-        else:
-            loc = str(row[3]) + ', ' + str(row[2])
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>" % (row[0], row[1],
-                                                                          loc, row[4])
-        data += line
-
-    data += close_table_html()
     tgt = "skype_scanner_accounts.html"
-    saveResult(tgt, data)
+    with open_report(tgt, "skype_scanner Account", "./templates/init_account_html.html") as report:
+        SKYPE_ACCOUNTS.write(report, iter_batches_from_db(db, command))
+    return report.rows
 
+@cached_result()
 def read_contacts(db):
     '''Read contacts details from skype database. Takes one argument: database file full path'''
     command = "SELECT displayname, skypename, city, country, phone_mobile, birthday FROM Contacts;"
-    res = pull_from_db(db, command)
-    data = init_data("skype_scanner Contacts", len(res)) + init_table_header("./templates/init_contacts_html.html")
-    for row in res:
-        if not row[2]:
-            loc = str(row[3]) + ", unspecified city/town"
-        else:
-            loc = str(row[3]) + ', ' + str(row[2])
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>" % (row[0], row[1],
-                                                                                    loc, row[4], row[5])
-        data += line
-
-    data += close_table_html()
     tgt = "skype_scanner_contacts.html"
-    saveResult(tgt, data)
+    with open_report(tgt, "skype_scanner Contacts", "./templates/init_contacts_html.html") as report:
+        SKYPE_CONTACTS.write(report, iter_batches_from_db(db, command))
+    return report.rows
+
+def skype_calls_query(tm_min=0, tm_max=10000000000000, partner=None):
+    query = Query("SELECT datetime(begin_timestamp, 'unixepoch'), identity, duration, is_incoming, begin_timestamp " \
+                  + "FROM calls, conversations") \
+            .where("calls.conv_dbid = conversations.id").time_range("begin_timestamp", tm_min, tm_max) \
+            .index("calls", "begin_timestamp")
+    if partner:
+        query.like("chatname", partner)
+    return query
+
+def skype_msgs_query(tm_min=0, tm_max=10000000000000, partner=None):
+    query = Query("SELECT timestamp, dialog_partner, author, body_xml, chatmsg_status, sending_status, chatname FROM Messages") \
+            .time_range("timestamp", tm_min, tm_max).index("Messages", "timestamp")
+    if partner:
+        query.like("chatname", partner)
+    return query
 
+@cached_result()
 def read_call_log(db, partner=None, tm_min=0, tm_max=10000000000000):
     '''Read call log details from skype database. Takes 4 arguments:
 db: database file full path
 partner: call partner, default value None
 tm_min: minimum call timestamp, default value 0
 tm_max: maximum call timestamp, default value 10000000000000'''
-    command = "SELECT datetime(begin_timestamp, 'unixepoch'), identity, duration, is_incoming FROM calls, conversations WHERE " \
-              + "(calls.conv_dbid = conversations.id) AND (begin_timestamp > %s AND begin_timestamp < %s);" % (tm_min, tm_max)
-    if partner:
-        command = command[:-1] + " AND (chatname LIKE %s);" % ("'%" + partner + "%'")
-
-    res = pull_from_db(db, command)
-    data = init_data("skype_scanner Call Log", len(res)) + init_table_header("./templates/init_clog_html.html")
-    for row in res:
-        dir_dict = {"0" : "outgoing", "1" : "incoming"}
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>" % (row[0], row[1], row[2], dir_dict[str(row[3])])
-        data += line
-
-    data += close_table_html()
     tgt = "skype_scanner_calls.html"
-    saveResult(tgt, data)
+    with open_report(tgt, "skype_scanner Call Log", "./templates/init_clog_html.html") as report:
+        SKYPE_CALLS.write(report, skype_calls_query(tm_min, tm_max, partner).run_batches(db))
+    return report.rows
 
-def read_msgs(db, partner=None, tm_min=0, tm_max=10000000000000):
-    '''Read Messages from skype database. Takes 4 arguments:
+@cached_result()
+def read_msgs(db, partner=None, tm_min=0, tm_max=10000000000000, incremental=False, device=None):
+    '''Read Messages from skype database. Takes 6 arguments:
 db: database file full path
 partner: chat partner, default value None
 tm_min: minimum Message timestamp, default value 0
-tm_max: maximum Message timestamp, default value 10000000000000'''
-    command = "SELECT timestamp, dialog_partner, author, body_xml, chatmsg_status, sending_status, chatname " \
-              + "FROM Messages WHERE (timestamp > %s AND timestamp < %s);" % (tm_min, tm_max)
-    if partner:
-        command = command[:-1] + " AND (chatname LIKE %s);" % ("'%" + partner + "%'")
+tm_max: maximum Message timestamp, default value 10000000000000
+incremental: pass True to only read messages added after the ones exported by the previous incremental run
+device: the name of the device the database was pulled from, default value None for the database path'''
+    query = skype_msgs_query(tm_min, tm_max, partner)
+
+    tgt = "skype_scanner_msgs.html"
+    state = None
+    if incremental:
+        state = ScanState(db, "skype_msgs" if not partner else "skype_msgs_%s" % partner, "Messages", device)
+        state.apply(query)
+        tgt = state.report_name(tgt)
 
-    res = pull_from_db(db, command)
     user = pull_from_db(db, "SELECT skypename from Accounts;")
-    data = init_data("skype_scanner Messages", len(res)) + init_table_header("./templates/init_msgs_html.html")
-
-    for row in res:
-        try:
-            if 'partlist' not in str(row[3]):
-                if row[1]:
-                    From = str(row[2])
-                    To = str(row[1])
-                else:
-                    From = str(row[2])
-                    To = str(user[0][0])
-                status_dict = {"1" : "pending", "2" : "delivered"}
-                if str(row[5]) in ("1", "2"):
-                    status = status_dict[str(row[4])]
-                else:
-                    status = "incoming"
-                line = "\n\t\t\t\t\t<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>" % (dt.fromtimestamp(float(row[0])),
-                                                                                                                    row[6], From, To, row[3],
-                                                                                                                    status)
-                data += line
-        except:
-            pass
-    data += close_table_html()
+    spec = skype_msgs_spec(str(user[0][0]) if user else "Unknown")
 
-    tgt = "skype_scanner_msgs.html"
-    saveResult(tgt, data)
+    with open_report(tgt, "skype_scanner Messages", "./templates/init_msgs_html.html") as report:
+        for rows in query.run_batches(db):
+            if state:
+                state.seen_batch(rows)
+            report.write_batch(spec.cells(rows))
+    if state:
+        state.save()
+    return report.rows
 
 if __name__ == "__main__":
     print('\n\n    ##############A Python script to read skype profile data ################')
@@ -130,7 +133,26 @@ if __name__ == "__main__":
     parser.add_option("--min_time", dest="min", type="string", help=min_help)
     max_help = "enter only if target is 'msgs' or 'clog' to read messages/calls before a given date and time, must be a string separated by _ YYYY_MM_DD_HH_MM_SS"
     parser.add_option("--max_time", dest="max", type="string", help=max_help)
+    inc_help = "enter only if target is 'msgs' to only read messages added after the ones saved by the previous incremental" \
+               + " run on the same profile, the results are saved to a new numbered report"
+    parser.add_option("--incremental", dest="incremental", action="store_true", default=False, help=inc_help)
+    device_help = "enter with --incremental to name the device the database was pulled from, to continue its incremental" \
+                  + " scans when a fresh pull is saved to another path. Default the database path"
+    parser.add_option("--device", dest="device", type="string", help=device_help)
+    add_output_options(parser, "opening the database, queries, fetching rows, timestamp conversion, formatting, rendering" \
+                       + " and writing the reports")
+    index_help = "speed up time window searches on large databases by indexing a temporary working copy of the database," \
+                 + " the original file is never modified"
+    parser.add_option("--index", dest="index", action="store_true", default=False, help=index_help)
+    cache_help = "save the results in the result cache and reuse them when the same database is read again with the same" \
+                 + " options, instead of reading it again. The cache is kept in " + RESULT_CACHE_DIR
+    parser.add_option("--cache", dest="cache", action="store_true", default=False, help=cache_help)
     (options, args) = parser.parse_args()
+    set_output_format(options.format)
+    set_output_compression(options.compress)
+    set_working_indexes(options.index)
+    set_result_cache(options.cache)
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
 
     if None in (options.target, options.db):
         sys.exit("please enter a target:\n\n%s" % parser.usage)
@@ -149,17 +171,17 @@ if __name__ == "__main__":
         else:
             min_time = 0
         if options.max:
-            max_time = time_to_epoch(options.min)
+            max_time = time_to_epoch(options.max)
         else:
             max_time = 10000000000000
-        read_msgs(db, options.partner, min_time, max_time)
+        read_msgs(db, options.partner, min_time, max_time, options.incremental, options.device)
     elif options.target.lower() == "clog":
         if options.min:
             min_time = time_to_epoch(options.min)
         else:
             min_time = 0
         if options.max:
-            max_time = time_to_epoch(options.min)
+            max_time = time_to_epoch(options.max)
         else:
             max_time = 10000000000000
         read_call_log(db, options.partner, min_time, max_time)
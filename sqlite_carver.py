@@ -0,0 +1,563 @@
+#!/usr/bin/env python
+import os, sys, mmap, struct, optparse
+try:
+    from common_methods import *
+except ImportError:
+    sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
+
+
+# the tables the scanners read, deleted rows are looked for in these by default
+CARVE_TABLES = ("urls", "visits", "downloads", "downloads_url_chains", "cookies", "logins", "moz_places", "moz_historyvisits",
+                "moz_formhistory", "moz_cookies", "moz_downloads", "Accounts", "Contacts", "Messages", "Calls", "Conversations",
+                "messages", "wa_contacts", "threads", "contact", "aggregated_calls", "accounts")
+
+TABLE_INTERIOR = 0x05
+TABLE_LEAF = 0x0D
+WAL_MAGIC = (0x377f0682, 0x377f0683)
+JOURNAL_MAGIC = b"\xd9\xd5\x05\xf9\x20\xa1\x63\xd7"
+ENCODINGS = {1 : "utf-8", 2 : "utf-16-le", 3 : "utf-16-be"}
+# the size of the fixed size serial types 0 to 9, 10 and 11 are reserved
+SERIAL_SIZES = (0, 1, 2, 3, 4, 6, 8, 8, 0, 0)
+# largest record header looked for when guessing where a deleted record starts
+MAX_HEADER_GAP = 10
+
+
+def read_varint(buf, pos):
+    '''Decode a sqlite varint from a buffer. Returns (value, position after the varint)'''
+    value = 0
+    for i in range(8):
+        byte = buf[pos + i]
+        value = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return value, pos + i + 1
+    return (value << 8) | buf[pos + 8], pos + 9
+
+def serial_size(serial_type):
+    if serial_type >= 12:
+        return (serial_type - 12) >> 1
+    return SERIAL_SIZES[serial_type]
+
+def read_record_header(buf, pos, end):
+    '''Parse a record header. Returns (serial types, position of the record body) or None if the bytes at pos
+can't be a record header ending before end'''
+    try:
+        header_size, p = read_varint(buf, pos)
+        header_end = pos + header_size
+        if header_size < 2 or header_end > end:
+            return None
+        types = []
+        body_size = 0
+        while p < header_end:
+            serial_type = buf[p]
+            if serial_type < 0x80:
+                # most serial types fit in one byte
+                p += 1
+            else:
+                serial_type, p = read_varint(buf, p)
+            if serial_type in (10, 11):
+                return None
+            types.append(serial_type)
+            body_size += serial_size(serial_type)
+    except IndexError:
+        return None
+    if p != header_end or header_end + body_size > end:
+        return None
+    return types, header_end
+
+def read_values(buf, pos, types, encoding):
+    '''Decode a record body starting at pos, only the values themselves are copied out of the buffer'''
+    values = []
+    for serial_type in types:
+        size = serial_size(serial_type)
+        if serial_type == 0:
+            values.append(None)
+        elif serial_type <= 6:
+            values.append(int.from_bytes(buf[pos:pos + size], "big", signed=True))
+        elif serial_type == 7:
+            values.append(struct.unpack_from(">d", buf, pos)[0])
+        elif serial_type in (8, 9):
+            values.append(serial_type - 8)
+        elif serial_type % 2 == 0:
+            values.append(bytes(buf[pos:pos + size]))
+        else:
+            values.append(bytes(buf[pos:pos + size]).decode(encoding, "replace"))
+        pos += size
+    return values
+
+def type_affinity(declared):
+    '''The column affinity of a declared column type, following sqlite's rules'''
+    declared = declared.upper()
+    if "INT" in declared:
+        return "integer"
+    if "CHAR" in declared or "CLOB" in declared or "TEXT" in declared:
+        return "text"
+    if not declared or "BLOB" in declared:
+        return "blob"
+    if "REAL" in declared or "FLOA" in declared or "DOUB" in declared:
+        return "real"
+    return "numeric"
+
+def serial_fits(serial_type, affinity):
+    '''Could a value of this serial type be stored in a column with this affinity?'''
+    if serial_type == 0 or affinity == "blob":
+        return True
+    if affinity == "text":
+        return serial_type >= 13 and serial_type % 2 == 1
+    if affinity == "integer":
+        return serial_type <= 9 and serial_type != 7 or serial_type >= 12
+    return True
+
+class CarveTable(object):
+    '''The schema details of a table the carver looks for records of'''
+    def __init__(self, name, root_page, columns):
+        self.name = name
+        self.root_page = root_page
+        self.columns = [column[1] for column in columns]
+        self.affinities = [type_affinity(column[2] or "") for column in columns]
+        # an INTEGER PRIMARY KEY column is an alias of the rowid and is stored as NULL in the record
+        keys = [column for column in columns if column[5]]
+        self.rowid_column = None
+        if len(keys) == 1 and keys[0][2].upper() == "INTEGER":
+            self.rowid_column = columns.index(keys[0])
+        self.not_null = [i for i, column in enumerate(columns) if column[3] and i != self.rowid_column]
+
+    def score(self, types):
+        '''How many of the record's columns fit this table, -1 if the record can't belong to it'''
+        if len(types) != len(self.columns):
+            return -1
+        if self.rowid_column is not None and types[self.rowid_column] != 0:
+            return -1
+        if any(types[i] == 0 for i in self.not_null):
+            return -1
+        return sum(1 for serial_type, affinity in zip(types, self.affinities) if serial_fits(serial_type, affinity))
+
+    def key(self, values):
+        '''The row's values without its rowid alias, to compare rows whether their rowid was recovered or not'''
+        if self.rowid_column is None:
+            return tuple(values)
+        return tuple(values[:self.rowid_column] + values[self.rowid_column + 1:])
+
+def plausible(values):
+    '''Rule out the records guessed from zeroed or overwritten bytes: all NULL, or text with NUL characters'''
+    if all(value is None for value in values):
+        return False
+    return not any(type(value) is str and "\x00" in value for value in values)
+
+def load_tables(db, names=CARVE_TABLES):
+    '''Read the schema of the tables to carve through sqlite. Returns a list of CarveTable'''
+    conn = get_connection(db)
+    tables = []
+    wanted = set(name.lower() for name in names)
+    for name, root_page in conn.execute("SELECT name, rootpage FROM sqlite_master WHERE type = 'table';"):
+        if name.lower() in wanted and root_page:
+            columns = conn.execute("PRAGMA table_info(\"%s\");" % name.replace('"', '""')).fetchall()
+            tables.append(CarveTable(name, root_page, columns))
+    return tables
+
+class SQLiteCarver(object):
+    '''Recover deleted rows from a sqlite database by parsing its pages directly. The database and its -wal and -journal
+files are memory mapped, pages are read in place and only recovered values are copied out. Takes 2 arguments:
+db: the database file full path
+tables: a list of CarveTable to look for'''
+    def __init__(self, db, tables):
+        self.db = db
+        self.tables = tables
+        self._file = open(db, "rb")
+        self.buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buf[:16] != b"SQLite format 3\x00":
+            self.close()
+            raise ValueError("%s is not a sqlite database" % db)
+        self.page_size = struct.unpack_from(">H", self.buf, 16)[0]
+        if self.page_size == 1:
+            self.page_size = 65536
+        self.usable_size = self.page_size - self.buf[20]
+        self.page_count = len(self.buf) // self.page_size
+        self.encoding = ENCODINGS.get(struct.unpack_from(">I", self.buf, 56)[0], "utf-8")
+        self.owners = {}
+        for table in tables:
+            for page in self.table_pages(table.root_page):
+                self.owners[page] = table
+        self._seen = set()
+        self._tables = dict((table.name, table) for table in tables)
+        self._live = {}
+
+    def close(self):
+        self.buf.close()
+        self._file.close()
+
+    def page_start(self, page):
+        return (page - 1) * self.page_size
+
+    def table_pages(self, root_page):
+        '''Walk a table b-tree and return the page numbers of its leaf pages'''
+        leaves = []
+        stack = [root_page]
+        visited = set()
+        while stack:
+            page = stack.pop()
+            if page in visited or not 0 < page <= self.page_count:
+                continue
+            visited.add(page)
+            start = self.page_start(page)
+            header = start + (100 if page == 1 else 0)
+            page_type = self.buf[header]
+            if page_type == TABLE_LEAF:
+                leaves.append(page)
+            elif page_type == TABLE_INTERIOR:
+                cells, right_child = struct.unpack_from(">HxxxI", self.buf, header + 3)
+                stack.append(right_child)
+                for pointer in struct.unpack_from(">%dH" % cells, self.buf, header + 12):
+                    if pointer + 4 <= self.usable_size:
+                        stack.append(struct.unpack_from(">I", self.buf, start + pointer)[0])
+        return leaves
+
+    def freelist_pages(self):
+        '''Return the page numbers of the freelist trunk and leaf pages'''
+        trunk, count = struct.unpack_from(">II", self.buf, 32)
+        pages = []
+        visited = set()
+        while trunk and trunk not in visited and 0 < trunk <= self.page_count:
+            visited.add(trunk)
+            start = self.page_start(trunk)
+            next_trunk, leaves = struct.unpack_from(">II", self.buf, start)
+            leaves = min(leaves, self.usable_size // 4 - 2)
+            pages.append(trunk)
+            pages.extend(page for page in struct.unpack_from(">%dI" % leaves, self.buf, start + 8) if 0 < page <= self.page_count)
+            trunk = next_trunk
+        return pages
+
+    def local_size(self, payload_size):
+        '''How much of a table leaf cell payload is stored on the page itself, the rest is in overflow pages'''
+        max_local = self.usable_size - 35
+        if payload_size <= max_local:
+            return payload_size
+        min_local = ((self.usable_size - 12) * 32 // 255) - 23
+        local = min_local + ((payload_size - min_local) % (self.usable_size - 4))
+        return local if local <= max_local else min_local
+
+    def read_overflow(self, page, size):
+        '''Follow an overflow page chain in the database file, as far as it can be followed'''
+        data = []
+        visited = set()
+        while size > 0 and page not in visited and 0 < page <= self.page_count:
+            visited.add(page)
+            start = self.page_start(page)
+            chunk = min(size, self.usable_size - 4)
+            data.append(self.buf[start + 4:start + 4 + chunk])
+            size -= chunk
+            page = struct.unpack_from(">I", self.buf, start)[0]
+        return b"".join(data)
+
+    def read_cell(self, buf, pos, end):
+        '''Parse a table leaf cell. Returns (rowid, serial types, payload buffer, body position) or None'''
+        try:
+            payload_size, p = read_varint(buf, pos)
+            rowid, p = read_varint(buf, p)
+        except IndexError:
+            return None
+        if rowid >= 2**63:
+            rowid -= 2**64
+        local = self.local_size(payload_size)
+        if payload_size < 2 or p + local > end:
+            return None
+        if local < payload_size:
+            if p + local + 4 > end:
+                return None
+            overflow = struct.unpack_from(">I", buf, p + local)[0]
+            payload = bytes(buf[p:p + local]) + self.read_overflow(overflow, payload_size - local)
+            p, payload_end = 0, len(payload)
+        else:
+            payload, payload_end = buf, p + payload_size
+        header = read_record_header(payload, p, payload_end)
+        if header is None:
+            return None
+        return rowid, header[0], payload, header[1]
+
+    def best_table(self, types, table=None):
+        '''The table a record most likely belongs to, the page owner if it's known'''
+        if table is not None:
+            return table if table.score(types) >= 0 else None
+        scores = [(table.score(types), i) for i, table in enumerate(self.tables)]
+        score, i = max(scores) if scores else (-1, None)
+        return self.tables[i] if score >= 0 else None
+
+    def record(self, table, source, location, rowid, values):
+        '''Build a recovered row, None if the same row was already recovered'''
+        if rowid is not None and table.rowid_column is not None:
+            values[table.rowid_column] = rowid
+        # a record found again in another page image, with or without its rowid, is the same row
+        key = (table.name, table.key(values))
+        if key in self._seen:
+            return None
+        self._seen.add(key)
+        return (table.name, source, location, rowid, values)
+
+    def freeblock_headers(self, buf, start, end):
+        '''Yield the (serial types, body position) a freed cell's record could have. The first 4 bytes of a freeblock
+overwrite the start of the cell: its payload size, its rowid and often the record header size and the first serial
+type too. When they're lost the serial types are read from the 5th byte on, a lost first serial type is only
+recovered when it's an INTEGER PRIMARY KEY column, stored as NULL'''
+        for table in self.tables:
+            for missing in ((0, 1) if table.rowid_column == 0 else (0,)):
+                types = [0] * missing
+                pos = start + 4
+                try:
+                    while len(types) < len(table.columns):
+                        serial_type, pos = read_varint(buf, pos)
+                        if serial_type in (10, 11):
+                            break
+                        types.append(serial_type)
+                except IndexError:
+                    continue
+                if len(types) == len(table.columns) and pos + sum(serial_size(serial_type) for serial_type in types) <= end:
+                    yield types, pos
+        for pos in range(start + 4, min(start + 4 + MAX_HEADER_GAP, end)):
+            header = read_record_header(buf, pos, end)
+            if header is not None:
+                yield header
+
+    def read_freeblock(self, buf, start, end, table=None):
+        '''Find the record of a freed cell. Returns (table, serial types, body position) or None'''
+        for types, body in self.freeblock_headers(buf, start, end):
+            match = self.best_table(types, table)
+            if match is not None and match.score(types) == len(types) and plausible(read_values(buf, body, types, self.encoding)):
+                return match, types, body
+        return None
+
+    def scan_region(self, buf, start, end, page_start, source, location, table=None):
+        '''Look for deleted cells in unallocated space. Whole cells are left there when the cell at the start of the
+content area is deleted, and freeblocks next to it are merged into unallocated space with their first 4 bytes
+overwritten'''
+        if not buf[start:end].strip(b"\x00"):
+            return
+        pos = start
+        while pos < end - 4:
+            if buf[pos] == 0 and buf[pos + 2] == 0 and buf[pos + 3] <= 4:
+                # neither a cell (a payload size is never 0) nor a freeblock
+                pos += 1
+                continue
+            cell = self.read_cell(buf, pos, end)
+            if cell is not None:
+                rowid, types, payload, body = cell
+                match = self.best_table(types, table)
+                values = read_values(payload, body, types, self.encoding) if match is not None else None
+                if match is not None and match.score(types) == len(types) and plausible(values):
+                    row = self.record(match, source, "%s offset %d" % (location, pos - page_start), rowid, values)
+                    if row:
+                        yield row
+                    pos = body + sum(serial_size(serial_type) for serial_type in types) if payload is buf else end
+                    continue
+            # a freeblock's size must cover its record and stay in the region
+            size = struct.unpack_from(">H", buf, pos + 2)[0]
+            if 4 < size <= end - pos:
+                freed = self.read_freeblock(buf, pos, pos + size, table)
+                if freed is not None:
+                    match, types, body = freed
+                    row = self.record(match, source, "%s offset %d" % (location, pos - page_start), None,
+                                      read_values(buf, body, types, self.encoding))
+                    if row:
+                        yield row
+                    pos = body + sum(serial_size(serial_type) for serial_type in types)
+                    continue
+            pos += 1
+
+    def scan_freeblock(self, buf, start, size, page_start, source, location, table=None):
+        '''Recover the record of a freed cell, and of any cells left after it in the same freeblock'''
+        end = start + size
+        freed = self.read_freeblock(buf, start, end, table)
+        if freed is None:
+            return
+        match, types, body = freed
+        row = self.record(match, source, "%s offset %d" % (location, start - page_start), None, read_values(buf, body, types, self.encoding))
+        if row:
+            yield row
+        body_end = body + sum(serial_size(serial_type) for serial_type in types)
+        for row in self.scan_region(buf, body_end, end, page_start, source, location, table):
+            yield row
+
+    def carve_page(self, buf, start, page, source, location, table=None, live=True):
+        '''Recover the rows of one table leaf page image: the deleted ones in its freeblocks and unallocated space, and
+its cells too if the page isn't live (freelist pages and old page images in the -wal and -journal files)'''
+        header = start + (100 if page == 1 else 0)
+        page_end = start + self.usable_size
+        if header + 8 > len(buf) or buf[header] != TABLE_LEAF:
+            return
+        first_freeblock, cells, content_start = struct.unpack_from(">HHH", buf, header + 1)
+        pointers_end = header + 8 + 2 * cells
+        content_start = start + (content_start or 65536)
+        if pointers_end > page_end or page_end > len(buf):
+            return
+
+        if not live:
+            for pointer in struct.unpack_from(">%dH" % cells, buf, header + 8):
+                cell = self.read_cell(buf, start + pointer, page_end) if pointer < self.usable_size else None
+                if cell is None:
+                    continue
+                rowid, types, payload, body = cell
+                match = self.best_table(types, table)
+                if match is not None:
+                    row = self.record(match, source, "%s offset %d" % (location, pointer), rowid,
+                                      read_values(payload, body, types, self.encoding))
+                    if row:
+                        yield row
+
+        freeblock = first_freeblock
+        while freeblock and freeblock + 4 <= self.usable_size:
+            next_freeblock, size = struct.unpack_from(">HH", buf, start + freeblock)
+            if size >= 4 and freeblock + size <= self.usable_size:
+                for row in self.scan_freeblock(buf, start + freeblock, size, start, source, location, table):
+                    yield row
+            if next_freeblock <= freeblock:
+                break
+            freeblock = next_freeblock
+
+        if pointers_end < content_start <= page_end:
+            for row in self.scan_region(buf, pointers_end, content_start, start, source, location, table):
+                yield row
+
+    def carve_database(self):
+        '''Recover deleted rows from the live pages and the freelist pages of the database file'''
+        for page, table in sorted(self.owners.items()):
+            for row in self.carve_page(self.buf, self.page_start(page), page, "unallocated space", "page %d" % page, table):
+                yield row
+        for page in self.freelist_pages():
+            start = self.page_start(page)
+            if self.buf[start] == TABLE_LEAF:
+                rows = self.carve_page(self.buf, start, page, "freelist", "page %d" % page, live=False)
+            else:
+                # trunk pages have their header overwritten by the freelist, the old cells after it are still there
+                rows = self.scan_region(self.buf, start + 8, start + self.usable_size, start, "freelist", "page %d" % page)
+            for row in rows:
+                yield row
+
+    def carve_wal(self, wal):
+        '''Recover rows from every page image in a write ahead log, including the frames already checkpointed'''
+        with open(wal, "rb") as f:
+            if os.fstat(f.fileno()).st_size < 32 + 24 + self.page_size:
+                return
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                magic, version, page_size = struct.unpack_from(">III", buf, 0)
+                if magic not in WAL_MAGIC or page_size != self.page_size:
+                    return
+                frame = 0
+                pos = 32
+                while pos + 24 + page_size <= len(buf):
+                    frame += 1
+                    page = struct.unpack_from(">I", buf, pos)[0]
+                    location = "wal frame %d (page %d)" % (frame, page)
+                    for row in self.carve_page(buf, pos + 24, page, "wal", location, self.owners.get(page), live=False):
+                        yield row
+                    pos += 24 + page_size
+            finally:
+                buf.close()
+
+    def carve_journal(self, journal):
+        '''Recover rows from the original page images saved in a rollback journal. A persisted journal has its header
+zeroed once the transaction commits, the page images that follow it are still read'''
+        with open(journal, "rb") as f:
+            if os.fstat(f.fileno()).st_size < 512 + 8 + self.page_size:
+                return
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                sector_size = 512
+                if buf[:8] == JOURNAL_MAGIC:
+                    sector_size = struct.unpack_from(">I", buf, 20)[0] or 512
+                pos = sector_size
+                while pos + 8 + self.page_size <= len(buf):
+                    page = struct.unpack_from(">I", buf, pos)[0]
+                    if page == 0 or page > 2 * self.page_count + 1024:
+                        # the end of this journal segment, the next one starts on a sector boundary
+                        pos = (pos // sector_size + 1) * sector_size
+                        continue
+                    location = "journal offset %d (page %d)" % (pos, page)
+                    for row in self.carve_page(buf, pos + 4, page, "journal", location, self.owners.get(page), live=False):
+                        yield row
+                    pos += 8 + self.page_size
+            finally:
+                buf.close()
+
+    def carve(self):
+        '''Recover deleted rows from the database and its -wal and -journal files, rows that are still live are skipped'''
+        sources = [self.carve_database()]
+        for suffix, carve in (("-wal", self.carve_wal), ("-journal", self.carve_journal)):
+            if os.path.isfile(self.db + suffix):
+                sources.append(carve(self.db + suffix))
+        for source in sources:
+            for row in source:
+                if not self.is_live(row):
+                    yield row
+
+    def live_rows(self, table):
+        '''The hashes of every live row of a table, without its rowid, read once per table'''
+        if table.name not in self._live:
+            columns = [column for i, column in enumerate(table.columns) if i != table.rowid_column]
+            command = "SELECT %s FROM \"%s\";" % (", ".join('"%s"' % column.replace('"', '""') for column in columns),
+                                                  table.name.replace('"', '""'))
+            self._live[table.name] = set(map(hash, iter_from_db(self.db, command)))
+        return self._live[table.name]
+
+    @profiled("lookup")
+    def is_live(self, row):
+        '''Is a recovered row still in the live database? Page splits and updates leave stale copies of live rows
+behind, rows with a known rowid are compared with the live row, the others with every live row of their table'''
+        name, source, location, rowid, values = row
+        table = self._tables[name]
+        if rowid is None:
+            return hash(table.key(values)) in self.live_rows(table)
+        live = pull_from_db(self.db, "SELECT * FROM \"%s\" WHERE rowid = ?;" % name.replace('"', '""'), params=(rowid,))
+        return bool(live) and list(live[0]) == values
+
+def format_value(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, bytes):
+        return "x'%s'%s" % (value[:64].hex(), "..." if len(value) > 64 else "")
+    return str(value)
+
+def carve_db(db, tables=CARVE_TABLES):
+    '''Recover deleted rows of the given tables from a sqlite database and its -wal and -journal files, and save them
+in a report. Takes 2 arguments:
+db: the database file full path
+tables: the names of the tables to recover rows of, default CARVE_TABLES, the tables the scanners read
+Returns the number of rows recovered'''
+    if sniff_file_type(db) != "sqlite":
+        sys.exit("%s is not a sqlite database" % db)
+    carver = SQLiteCarver(db, load_tables(db, tables))
+    if not carver.tables:
+        carver.close()
+        sys.exit("None of the tables to carve were found in %s" % db)
+    tgt = "carved_%s.html" % getFileName(db)
+    try:
+        with open_report(tgt, "sqlite_carver Recovered Rows", "./templates/init_carved_html.html") as report:
+            for table, source, location, rowid, values in carver.carve():
+                report.write_row((table, source, location, "" if rowid is None else rowid,
+                                  " | ".join(format_value(value) for value in values)))
+    finally:
+        carver.close()
+    return report.rows
+
+if __name__ == "__main__":
+    print('\n\n    ##############A Python script to recover deleted sqlite rows ##############')
+    print('    #   carves freelist pages, unallocated space and -wal/-journal files     #')
+    print('    ##########################################################################\n\n')
+
+    parser = optparse.OptionParser("Usage: python %prog -b <database file> -t <(optional) tables> or python %prog -h for help")
+    parser.add_option("-b", dest="db", type="string", help="the full path of the sqlite database file to carve")
+    tables_help = "comma separated names of the tables to recover rows of, default all the tables the other scanners read: " \
+                  + ", ".join(CARVE_TABLES)
+    parser.add_option("-t", dest="tables", type="string", help=tables_help)
+    add_output_options(parser, "opening the database, reading and parsing the pages, looking up the live rows," \
+                       + " rendering and writing the report")
+    (options, args) = parser.parse_args()
+    set_output_format(options.format)
+    set_output_compression(options.compress)
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
+
+    if not options.db or not os.path.isfile(options.db):
+        sys.exit("please enter a valid database file:\n\n%s" % parser.usage)
+    tables = [table.strip() for table in options.tables.split(",")] if options.tables else CARVE_TABLES
+
+    print("Working...")
+    rows = carve_db(options.db, tables)
+    print("\n%d deleted row(s) recovered\n" % rows)
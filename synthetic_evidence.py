@@ -0,0 +1,665 @@
+#!/usr/bin/env python
+import os, sys, time, random, struct, sqlite3, optparse
+from itertools import islice
+
+
+# the evidence is spread over three years starting 2017-01-01, timestamps grow with the row ids like on a real device
+START_TIME = 1483228800
+TIME_SPAN = 3 * 365 * 86400
+CHROME_EPOCH_OFFSET = 11644473600
+INSERT_BATCH_SIZE = 10000
+FILETIME_EPOCH_OFFSET = 11644473600
+# the largest value data kept in one cell, larger values are split in segments of this size
+BIG_DATA_SEGMENT = 16344
+
+WORDS = ["the", "meeting", "tomorrow", "call", "me", "back", "where", "are", "you", "ok", "thanks", "see", "later",
+         "photo", "address", "bank", "transfer", "flight", "hotel", "password", "account", "invoice", "delivery",
+         "lunch", "office", "car", "keys", "phone", "number", "sent", "received", "today", "tonight", "weekend"]
+HOSTS = ["google.com", "facebook.com", "youtube.com", "wikipedia.org", "amazon.com", "reddit.com", "twitter.com",
+         "github.com", "stackoverflow.com", "bbc.co.uk", "nytimes.com", "mail.yahoo.com", "dropbox.com", "paypal.com"]
+CITIES = [("Berlin", "de"), ("London", "gb"), ("Paris", "fr"), ("Madrid", "es"), ("Rome", "it"), ("Cairo", "eg"),
+          ("Toronto", "ca"), ("Sydney", "au"), ("Chicago", "us"), ("Tokyo", "jp")]
+FIRST_NAMES = ["Alice", "Bob", "Carol", "Dave", "Eve", "Frank", "Grace", "Heidi", "Ivan", "Judy", "Mallory", "Oscar"]
+LAST_NAMES = ["Smith", "Jones", "Brown", "Taylor", "Wilson", "Evans", "Thomas", "Roberts", "Walker", "Wright"]
+MIME_TYPES = ["application/pdf", "application/zip", "image/jpeg", "video/mp4", "text/plain", "application/octet-stream"]
+
+CHROME_HISTORY_SCHEMA = '''
+CREATE TABLE meta(key LONGVARCHAR NOT NULL UNIQUE PRIMARY KEY, value LONGVARCHAR);
+CREATE TABLE urls(id INTEGER PRIMARY KEY AUTOINCREMENT, url LONGVARCHAR, title LONGVARCHAR, visit_count INTEGER DEFAULT 0 NOT NULL,
+    typed_count INTEGER DEFAULT 0 NOT NULL, last_visit_time INTEGER NOT NULL, hidden INTEGER DEFAULT 0 NOT NULL);
+CREATE TABLE visits(id INTEGER PRIMARY KEY, url INTEGER NOT NULL, visit_time INTEGER NOT NULL, from_visit INTEGER,
+    transition INTEGER DEFAULT 0 NOT NULL, segment_id INTEGER, visit_duration INTEGER DEFAULT 0 NOT NULL);
+CREATE INDEX visits_url_index ON visits (url);
+CREATE INDEX visits_time_index ON visits (visit_time);
+CREATE TABLE downloads(id INTEGER PRIMARY KEY, guid VARCHAR NOT NULL, current_path LONGVARCHAR NOT NULL,
+    target_path LONGVARCHAR NOT NULL, start_time INTEGER NOT NULL, received_bytes INTEGER NOT NULL, total_bytes INTEGER NOT NULL,
+    state INTEGER NOT NULL, danger_type INTEGER NOT NULL, interrupt_reason INTEGER NOT NULL, hash BLOB NOT NULL,
+    end_time INTEGER NOT NULL, opened INTEGER NOT NULL, last_access_time INTEGER NOT NULL, transient INTEGER NOT NULL,
+    referrer VARCHAR NOT NULL, site_url VARCHAR NOT NULL, tab_url VARCHAR NOT NULL, tab_referrer_url VARCHAR NOT NULL,
+    http_method VARCHAR NOT NULL, by_ext_id VARCHAR NOT NULL, by_ext_name VARCHAR NOT NULL, etag VARCHAR NOT NULL,
+    last_modified VARCHAR NOT NULL, mime_type VARCHAR(255) NOT NULL, original_mime_type VARCHAR(255) NOT NULL);
+CREATE TABLE downloads_url_chains(id INTEGER NOT NULL, chain_index INTEGER NOT NULL, url LONGVARCHAR NOT NULL,
+    PRIMARY KEY (id, chain_index));
+'''
+
+CHROME_COOKIES_SCHEMA = '''
+CREATE TABLE meta(key LONGVARCHAR NOT NULL UNIQUE PRIMARY KEY, value LONGVARCHAR);
+CREATE TABLE cookies(creation_utc INTEGER NOT NULL, host_key TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL,
+    path TEXT NOT NULL, expires_utc INTEGER NOT NULL, is_secure INTEGER NOT NULL, is_httponly INTEGER NOT NULL,
+    last_access_utc INTEGER NOT NULL, has_expires INTEGER NOT NULL DEFAULT 1, is_persistent INTEGER NOT NULL DEFAULT 1,
+    priority INTEGER NOT NULL DEFAULT 1, encrypted_value BLOB DEFAULT '', samesite INTEGER NOT NULL DEFAULT -1,
+    source_scheme INTEGER NOT NULL DEFAULT 0, UNIQUE (host_key, name, path));
+'''
+
+CHROME_LOGINS_SCHEMA = '''
+CREATE TABLE meta(key LONGVARCHAR NOT NULL UNIQUE PRIMARY KEY, value LONGVARCHAR);
+CREATE TABLE logins(origin_url VARCHAR NOT NULL, action_url VARCHAR, username_element VARCHAR, username_value VARCHAR,
+    password_element VARCHAR, password_value BLOB, submit_element VARCHAR, signon_realm VARCHAR NOT NULL,
+    preferred INTEGER NOT NULL, date_created INTEGER NOT NULL, blacklisted_by_user INTEGER NOT NULL, scheme INTEGER NOT NULL,
+    password_type INTEGER, times_used INTEGER, form_data BLOB, date_synced INTEGER, display_name VARCHAR, icon_url VARCHAR,
+    federation_url VARCHAR, skip_zero_click INTEGER, generation_upload_status INTEGER, possible_username_pairs BLOB,
+    id INTEGER PRIMARY KEY AUTOINCREMENT, date_last_used INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (origin_url, username_element, username_value, password_element, signon_realm));
+CREATE INDEX logins_signon ON logins (signon_realm);
+'''
+
+FIREFOX_PLACES_SCHEMA = '''
+CREATE TABLE moz_places(id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, rev_host LONGVARCHAR,
+    visit_count INTEGER DEFAULT 0, hidden INTEGER DEFAULT 0 NOT NULL, typed INTEGER DEFAULT 0 NOT NULL,
+    frecency INTEGER DEFAULT -1 NOT NULL, last_visit_date INTEGER, guid TEXT, foreign_count INTEGER DEFAULT 0 NOT NULL,
+    url_hash INTEGER DEFAULT 0 NOT NULL, description TEXT, preview_image_url TEXT, origin_id INTEGER);
+CREATE TABLE moz_historyvisits(id INTEGER PRIMARY KEY, from_visit INTEGER, place_id INTEGER, visit_date INTEGER,
+    visit_type INTEGER, session INTEGER, source INTEGER DEFAULT 0 NOT NULL, triggeringPlaceId INTEGER);
+CREATE INDEX moz_historyvisits_placedateindex ON moz_historyvisits (place_id, visit_date);
+CREATE INDEX moz_historyvisits_dateindex ON moz_historyvisits (visit_date);
+'''
+
+FIREFOX_COOKIES_SCHEMA = '''
+CREATE TABLE moz_cookies(id INTEGER PRIMARY KEY, originAttributes TEXT NOT NULL DEFAULT '', name TEXT, value TEXT,
+    host TEXT, path TEXT, expiry INTEGER, lastAccessed INTEGER, creationTime INTEGER, isSecure INTEGER, isHttpOnly INTEGER,
+    inBrowserElement INTEGER DEFAULT 0, sameSite INTEGER DEFAULT 0, CONSTRAINT moz_uniqueid UNIQUE (name, host, path, originAttributes));
+'''
+
+FIREFOX_FORMS_SCHEMA = '''
+CREATE TABLE moz_formhistory(id INTEGER PRIMARY KEY, fieldname TEXT NOT NULL, value TEXT NOT NULL, timesUsed INTEGER,
+    firstUsed INTEGER, lastUsed INTEGER, guid TEXT);
+CREATE INDEX moz_formhistory_index ON moz_formhistory (fieldname);
+CREATE INDEX moz_formhistory_lastused_index ON moz_formhistory (lastUsed);
+'''
+
+FIREFOX_DOWNLOADS_SCHEMA = '''
+CREATE TABLE moz_downloads(id INTEGER PRIMARY KEY, name TEXT, source TEXT, target TEXT, tempPath TEXT, startTime INTEGER,
+    endTime INTEGER, state INTEGER, referrer TEXT, entityID TEXT, currBytes INTEGER NOT NULL DEFAULT 0,
+    maxBytes INTEGER NOT NULL DEFAULT -1, mimeType TEXT, preferredApplication TEXT, preferredAction INTEGER NOT NULL DEFAULT 0,
+    autoResume INTEGER NOT NULL DEFAULT 0, guid TEXT);
+'''
+
+SKYPE_SCHEMA = '''
+CREATE TABLE Accounts(id INTEGER NOT NULL PRIMARY KEY, is_permanent INTEGER, status INTEGER, skypename TEXT, fullname TEXT,
+    birthday INTEGER, gender INTEGER, languages TEXT, country TEXT, province TEXT, city TEXT, phone_home TEXT,
+    phone_office TEXT, phone_mobile TEXT, emails TEXT, homepage TEXT, about TEXT, profile_timestamp INTEGER,
+    mood_text TEXT, timezone INTEGER, liveid_membername TEXT);
+CREATE TABLE Contacts(id INTEGER NOT NULL PRIMARY KEY, is_permanent INTEGER, type INTEGER, skypename TEXT, fullname TEXT,
+    birthday INTEGER, gender INTEGER, languages TEXT, country TEXT, province TEXT, city TEXT, phone_home TEXT,
+    phone_office TEXT, phone_mobile TEXT, emails TEXT, about TEXT, profile_timestamp INTEGER, displayname TEXT,
+    given_displayname TEXT, isblocked INTEGER, lastonline_timestamp INTEGER);
+CREATE TABLE Conversations(id INTEGER NOT NULL PRIMARY KEY, is_permanent INTEGER, identity TEXT, type INTEGER,
+    live_host TEXT, live_start_timestamp INTEGER, displayname TEXT, creation_timestamp INTEGER, last_activity_timestamp INTEGER);
+CREATE TABLE Calls(id INTEGER NOT NULL PRIMARY KEY, is_permanent INTEGER, begin_timestamp INTEGER, topic TEXT,
+    is_muted INTEGER, is_unseen_missed INTEGER, host_identity TEXT, duration INTEGER, name TEXT, type INTEGER,
+    is_incoming INTEGER, is_conference INTEGER, conv_dbid INTEGER, current_video_audience TEXT);
+CREATE TABLE Messages(id INTEGER NOT NULL PRIMARY KEY, is_permanent INTEGER, convo_id INTEGER, chatname TEXT, author TEXT,
+    from_dispname TEXT, guid BLOB, dialog_partner TEXT, timestamp INTEGER, type INTEGER, sending_status INTEGER,
+    consumption_status INTEGER, edited_by TEXT, edited_timestamp INTEGER, body_xml TEXT, identities TEXT,
+    chatmsg_type INTEGER, chatmsg_status INTEGER, remote_id INTEGER);
+CREATE INDEX IX_Messages_convo_id_timestamp ON Messages (convo_id, timestamp);
+'''
+
+WHATSAPP_MSGSTORE_SCHEMA = '''
+CREATE TABLE messages(_id INTEGER PRIMARY KEY AUTOINCREMENT, key_remote_jid TEXT NOT NULL, key_from_me INTEGER,
+    key_id TEXT NOT NULL, status INTEGER, needs_push INTEGER, data TEXT, timestamp INTEGER, media_url TEXT,
+    media_mime_type TEXT, media_wa_type TEXT, media_size INTEGER, media_name TEXT, media_caption TEXT, media_hash TEXT,
+    media_duration INTEGER, origin INTEGER, latitude REAL, longitude REAL, thumb_image TEXT, remote_resource TEXT,
+    received_timestamp INTEGER, send_timestamp INTEGER, receipt_server_timestamp INTEGER, receipt_device_timestamp INTEGER,
+    read_device_timestamp INTEGER, played_device_timestamp INTEGER, raw_data BLOB, recipient_count INTEGER,
+    participant_hash TEXT, starred INTEGER, quoted_row_id INTEGER, mentioned_jids TEXT, multicast_id TEXT,
+    edit_version INTEGER, media_enc_hash TEXT, payment_transaction_id TEXT, forwarded INTEGER);
+CREATE UNIQUE INDEX messages_key_index ON messages (key_remote_jid, key_from_me, key_id);
+'''
+
+WHATSAPP_WA_SCHEMA = '''
+CREATE TABLE wa_contacts(_id INTEGER PRIMARY KEY AUTOINCREMENT, jid TEXT NOT NULL, is_whatsapp_user BOOLEAN NOT NULL,
+    status TEXT, status_timestamp INTEGER, number TEXT, raw_contact_id INTEGER, display_name TEXT, phone_type INTEGER,
+    phone_label TEXT, unseen_msg_count INTEGER, photo_ts INTEGER, thumb_ts INTEGER, photo_id_timestamp INTEGER,
+    given_name TEXT, family_name TEXT, wa_name TEXT, sort_name TEXT, nickname TEXT, company TEXT, title TEXT);
+'''
+
+MESSENGER_CORE_SCHEMA = '''
+CREATE TABLE threads(thread_key TEXT PRIMARY KEY, thread_name TEXT, thread_type INTEGER, last_activity_timestamp INTEGER,
+    thread_picture_url TEXT, unread_message_count INTEGER, is_archived INTEGER);
+CREATE TABLE contact(contact_user_id TEXT PRIMARY KEY, name TEXT, profile_picture_url TEXT, profile_picture_large_url TEXT,
+    is_blocked TEXT, is_friend INTEGER, last_seen_timestamp INTEGER, last_seen_update_timestamp INTEGER, phone_number TEXT);
+CREATE TABLE messages(msg_id TEXT PRIMARY KEY, thread_key TEXT, timestamp INTEGER, sender TEXT, user_id TEXT,
+    snippet TEXT, is_unsent INTEGER, attachment_filename TEXT, attachment_filesize INTEGER, attachment_mime_type TEXT,
+    media_playable_url TEXT, voice_call_duration_s INTEGER, voice_call_start_time INTEGER,
+    is_voice_call_answered INTEGER, is_voice_call_incoming INTEGER);
+CREATE INDEX messages_thread_key_timestamp ON messages (thread_key, timestamp);
+CREATE TABLE aggregated_calls(call_id INTEGER PRIMARY KEY, thread_key TEXT, thread_name TEXT, updated_timestamp INTEGER,
+    is_incoming INTEGER, is_answered INTEGER, attempt_count INTEGER, call_type INTEGER);
+'''
+
+MESSENGER_ACCOUNTS_SCHEMA = '''
+CREATE TABLE accounts(user_id TEXT PRIMARY KEY, display_name TEXT, profile_pic TEXT, nonce TEXT, last_logged_in INTEGER);
+'''
+
+
+def timestamps(rng, n):
+    '''Yield n increasing unix timestamps in seconds (floats) spread over the evidence time span'''
+    step = TIME_SPAN / float(max(n, 1))
+    for i in range(n):
+        yield START_TIME + i * step + rng.random() * step
+
+def chrome_time(unix):
+    '''Convert a unix timestamp to chrome's microseconds since 1601-01-01'''
+    return int((unix + CHROME_EPOCH_OFFSET) * 1000000)
+
+def sentence(rng, low=2, high=12):
+    return " ".join(rng.choice(WORDS) for i in range(rng.randint(low, high)))
+
+def person(rng):
+    return "%s %s" % (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))
+
+def url(rng, i):
+    host = rng.choice(HOSTS)
+    if host == "google.com" and i % 3 == 0:
+        return "https://www.google.com/search?q=%s&ie=UTF-8" % sentence(rng, 1, 4).replace(" ", "+")
+    return "https://%s/%s/%d" % (host, rng.choice(WORDS), i)
+
+def scaled(n, ratio, minimum=1):
+    '''The row count of a table that holds ratio rows per generated row, never less than minimum'''
+    return max(int(n * ratio), minimum)
+
+def insert(conn, table, rows):
+    '''Insert rows from an iterator of tuples, INSERT_BATCH_SIZE at a time so any number of rows fits in memory'''
+    rows = iter(rows)
+    batch = list(islice(rows, INSERT_BATCH_SIZE))
+    if not batch:
+        return 0
+    command = "INSERT INTO %s VALUES (%s);" % (table, ", ".join("?" * len(batch[0])))
+    count = 0
+    while batch:
+        conn.executemany(command, batch)
+        count += len(batch)
+        batch = list(islice(rows, INSERT_BATCH_SIZE))
+    return count
+
+def make_chrome_history(conn, rng, n):
+    '''urls and visits get n rows, one visit per url, downloads get one row per 20'''
+    conn.execute("INSERT INTO meta VALUES ('version', '42');")
+
+    def urls():
+        for i, unix in enumerate(timestamps(rng, n)):
+            title = "Google Search" if i % 3 == 0 else sentence(rng, 1, 6).title()
+            yield (i + 1, url(rng, i), title, rng.randint(1, 30), rng.randint(0, 3), chrome_time(unix), 0)
+
+    def visits():
+        for i, unix in enumerate(timestamps(rng, n)):
+            yield (i + 1, i + 1, chrome_time(unix), i if i % 4 else 0, 805306368, 0, rng.randint(0, 600000000))
+
+    def downloads():
+        for i, unix in enumerate(timestamps(rng, scaled(n, 0.05))):
+            total = rng.randint(0, 50000000)
+            interrupted = i % 9 == 0
+            received = rng.randint(0, total) if interrupted else total
+            end_time = 0 if interrupted else chrome_time(unix + rng.randint(1, 600))
+            name = "%s_%d.%s" % (rng.choice(WORDS), i, rng.choice(["pdf", "zip", "jpg", "mp4", "txt", "exe"]))
+            path = "/home/user/Downloads/" + name
+            yield (i + 1, "guid-%08d" % i, path, path, chrome_time(unix), received, total, 2 if interrupted else 1,
+                   0, 40 if interrupted else 0, b"", end_time, i % 2, 0, 0, url(rng, i), "", "", "", "GET", "", "", "",
+                   "Mon, 01 Jan 2018 00:00:00 GMT", rng.choice(MIME_TYPES), "")
+
+    def chains():
+        for i in range(scaled(n, 0.05)):
+            yield (i + 1, 0, "https://dl.%s/files/%d" % (rng.choice(HOSTS), i))
+
+    return insert(conn, "urls", urls()) + insert(conn, "visits", visits()) + insert(conn, "downloads", downloads()) \
+           + insert(conn, "downloads_url_chains", chains())
+
+def make_chrome_cookies(conn, rng, n):
+    conn.execute("INSERT INTO meta VALUES ('version', '12');")
+
+    def cookies():
+        for i, unix in enumerate(timestamps(rng, n)):
+            created = chrome_time(unix)
+            has_expires = 0 if i % 7 == 0 else 1
+            expires = created + rng.randint(3600, 31536000) * 1000000 if has_expires else 0
+            yield (created, "." + rng.choice(HOSTS), "cookie_%d" % i, "%032x" % rng.getrandbits(128), "/", expires,
+                   i % 2, i % 3 == 0, created + rng.randint(0, 86400) * 1000000, has_expires, has_expires, 1, b"", -1, 2)
+
+    return insert(conn, "cookies", cookies())
+
+def make_chrome_logins(conn, rng, n):
+    conn.execute("INSERT INTO meta VALUES ('version', '19');")
+
+    def logins():
+        for i, unix in enumerate(timestamps(rng, n)):
+            host = rng.choice(HOSTS)
+            created = chrome_time(unix)
+            yield ("https://%s/login" % host, "https://%s/session" % host, "email", "user%d@mail.com" % i, "password",
+                   b"v10" + bytes(rng.getrandbits(8) for b in range(16)), "", "https://%s/" % host, 1, created, 0, 0, 0,
+                   rng.randint(0, 200), b"\x00" * 8 + host.encode("ascii"), 0, "", "", "", 0, 0, b"", i + 1, created)
+
+    return insert(conn, "logins", logins())
+
+def make_firefox_places(conn, rng, n):
+    '''moz_historyvisits gets n rows, visiting one of n / 4 places each'''
+    places = scaled(n, 0.25)
+
+    def moz_places():
+        for i in range(places):
+            address = url(rng, i)
+            title = "" if i % 10 == 0 else sentence(rng, 1, 6).title()
+            host = address.split("/")[2]
+            yield (i + 1, address, title, host[::-1] + ".", rng.randint(1, 20), 0, i % 5 == 0, rng.randint(0, 2000),
+                   None, "guid%08d" % i, 0, rng.getrandbits(47), None, None, None)
+
+    def visits():
+        for i, unix in enumerate(timestamps(rng, n)):
+            yield (i + 1, 0, rng.randint(1, places), int(unix * 1000000), 1, None, 0, 0)
+
+    return insert(conn, "moz_places", moz_places()) + insert(conn, "moz_historyvisits", visits())
+
+def make_firefox_cookies(conn, rng, n):
+    def cookies():
+        for i, unix in enumerate(timestamps(rng, n)):
+            created = int(unix * 1000000)
+            yield (i + 1, "", "cookie_%d" % i, "%032x" % rng.getrandbits(128), "." + rng.choice(HOSTS), "/",
+                   int(unix) + 31536000, created, created, i % 2, i % 3 == 0, 0, 0)
+
+    return insert(conn, "moz_cookies", cookies())
+
+def make_firefox_forms(conn, rng, n):
+    def forms():
+        for i, unix in enumerate(timestamps(rng, n)):
+            first = int(unix * 1000000)
+            field = rng.choice(["searchbar-history", "q", "email", "username", "address", "search"])
+            yield (i + 1, field, "%s %d" % (sentence(rng, 1, 4), i), rng.randint(1, 50), first,
+                   first + rng.randint(0, 86400 * 30) * 1000000, "guid%08d" % i)
+
+    return insert(conn, "moz_formhistory", forms())
+
+def make_firefox_downloads(conn, rng, n):
+    def downloads():
+        for i, unix in enumerate(timestamps(rng, n)):
+            name = "%s_%d.%s" % (rng.choice(WORDS), i, rng.choice(["pdf", "zip", "jpg", "mp4"]))
+            start = int(unix * 1000000)
+            size = rng.randint(1000, 50000000)
+            yield (i + 1, name, url(rng, i), "file:///home/user/Downloads/" + name, "", start,
+                   start + rng.randint(1, 600) * 1000000, 1, "", "", size, size, rng.choice(MIME_TYPES), "", 0, 0, None)
+
+    return insert(conn, "moz_downloads", downloads())
+
+def make_skype(conn, rng, n):
+    '''Messages get n rows, calls one per 10 messages, between the account and n / 100 contacts'''
+    contacts = scaled(n, 0.01, 10)
+    conn.execute("INSERT INTO Accounts (id, is_permanent, skypename, fullname, country, city, profile_timestamp)"
+                 + " VALUES (1, 1, 'owner.skype', 'Device Owner', 'us', NULL, ?);", (START_TIME,))
+
+    def contact_rows():
+        for i in range(contacts):
+            city, country = rng.choice(CITIES)
+            yield (i + 1, 1, 1, "contact.%d" % i, person(rng), 19700101 + rng.randint(0, 30) * 10000, i % 2 + 1, "en",
+                   country, "", city if i % 4 else None, "", "", "+%011d" % rng.getrandbits(36), "", "", START_TIME,
+                   person(rng), None, 0, START_TIME)
+
+    def conversations():
+        for i in range(contacts):
+            yield (i + 1, 1, "contact.%d" % i, 1, None, None, "contact.%d" % i, START_TIME, START_TIME + TIME_SPAN)
+
+    def calls():
+        for i, unix in enumerate(timestamps(rng, scaled(n, 0.1))):
+            yield (i + 1, 1, int(unix), None, 0, 0, "owner.skype", rng.randint(0, 3600), "call %d" % i, 1, i % 2, 0,
+                   rng.randint(1, contacts), None)
+
+    def messages():
+        for i, unix in enumerate(timestamps(rng, n)):
+            partner = "contact.%d" % rng.randrange(contacts)
+            outgoing = i % 2 == 0
+            sending_status = rng.choice((1, 2)) if outgoing else None
+            body = "<partlist alt=\"\"></partlist>" if i % 50 == 0 else sentence(rng)
+            yield (i + 1, 1, 0, "#owner.skype/$%s;%x" % (partner, i % 4096), "owner.skype" if outgoing else partner,
+                   "", None, partner if outgoing else None, int(unix), 61, sending_status, 0, None, None, body, None, 3,
+                   sending_status if outgoing else 4, i)
+
+    return insert(conn, "Contacts", contact_rows()) + insert(conn, "Conversations", conversations()) \
+           + insert(conn, "Calls", calls()) + insert(conn, "Messages", messages()) + 1
+
+def whatsapp_jid(i):
+    return "%d@s.whatsapp.net" % (4915100000000 + i)
+
+def make_whatsapp_msgstore(conn, rng, n):
+    '''messages get n rows with the contacts made by make_whatsapp_wa for the same scale'''
+    contacts = scaled(n, 0.01, 10)
+
+    def messages():
+        for i, unix in enumerate(timestamps(rng, n)):
+            sent = int(unix * 1000)
+            from_me = i % 2
+            media_type = rng.choice((0, 0, 0, 0, 1, 2, 3, 5))
+            media_url = "https://mmg.whatsapp.net/d/f/%x.enc" % rng.getrandbits(64) if media_type in (1, 2, 3) else None
+            latitude, longitude = (rng.uniform(-90, 90), rng.uniform(-180, 180)) if media_type == 5 else (0.0, 0.0)
+            yield (i + 1, whatsapp_jid(rng.randrange(contacts)), from_me, "%016X" % i, rng.choice((0, 4, 5, 13)),
+                   2 if i % 40 == 0 else 0, sentence(rng) if media_type == 0 else None, sent, media_url,
+                   None, str(media_type), 0, None, sentence(rng, 1, 4) if media_url else None, None,
+                   rng.randint(1, 300) if media_type in (2, 3) else 0, 0, latitude, longitude, None, None, sent + 500,
+                   sent if from_me else -1, sent + 1500 if from_me else None, sent + 3000 if from_me else -1,
+                   sent + 60000 if i % 3 else -1, -1, None, 0, None, 0, 0, None, None, 0, None, None, 0)
+
+    return insert(conn, "messages", messages())
+
+def make_whatsapp_wa(conn, rng, n):
+    def contact_rows():
+        for i in range(scaled(n, 0.01, 10)):
+            name = person(rng)
+            first, last = name.split(" ")
+            yield (i + 1, whatsapp_jid(i), i % 10 != 0, "Hey there! I am using WhatsApp.", int(START_TIME * 1000) + i,
+                   "+%d" % (4915100000000 + i), i, name, 2, None, 0, None, None, None, first, last, first, name, None,
+                   None, None)
+
+    return insert(conn, "wa_contacts", contact_rows())
+
+def make_messenger_core(conn, rng, n):
+    '''messages get n rows, calls one per 20 messages, in threads with n / 100 contacts and a few groups'''
+    owner = "100001"
+    contacts = scaled(n, 0.01, 10)
+    groups = scaled(contacts, 0.1)
+
+    def contact_user(i):
+        return str(200000 + i)
+
+    def thread_key(i):
+        return "ONE_TO_ONE:%s:%s" % (contact_user(i), owner) if i < contacts else "GROUP:%d" % (900000 + i)
+
+    def threads():
+        for i in range(contacts + groups):
+            name = "Friend %d" % i if i < contacts else "Group %d" % i
+            yield (thread_key(i), name, 1 if i < contacts else 2, None, None, 0, 0)
+
+    def contact_rows():
+        yield (owner, "Device Owner", "https://scontent.xx.fbcdn.net/p/%s.jpg" % owner, None, "0", 0, None, None, None)
+        for i in range(contacts):
+            seen = int(START_TIME * 1000) + rng.randint(0, TIME_SPAN) * 1000
+            picture = "https://scontent.xx.fbcdn.net/p/%s.jpg" % contact_user(i)
+            yield (contact_user(i), "Friend %d" % i, picture, picture, "1" if i % 25 == 0 else "0", i % 3 != 0, seen,
+                   seen + 60000, None)
+
+    def messages():
+        for i, unix in enumerate(timestamps(rng, n)):
+            thread = rng.randrange(contacts + groups)
+            incoming = i % 2
+            sender = "Friend %d" % thread if incoming and thread < contacts else None
+            user_id = contact_user(thread) if incoming and thread < contacts else owner
+            attachment = i % 15 == 0
+            call = i % 97 == 0
+            sent = int(unix * 1000)
+            yield ("mid.$%x" % i, thread_key(thread), sent, sender, user_id, sentence(rng), i % 200 == 0,
+                   "image-%d.jpg" % i if attachment else None, rng.randint(1000, 5000000) if attachment else None,
+                   "image/jpeg" if attachment else None, "https://video.xx.fbcdn.net/v/%d.mp4" % i if i % 60 == 0 else None,
+                   rng.randint(1, 3600) if call else None, sent if call else None, 1 if call else None,
+                   incoming if call else None)
+
+    def calls():
+        for i, unix in enumerate(timestamps(rng, scaled(n, 0.05))):
+            thread = rng.randrange(contacts)
+            yield (i + 1, thread_key(thread), "Friend %d" % thread, int(unix * 1000), i % 2, i % 3 != 0, rng.randint(1, 3), 1)
+
+    return insert(conn, "threads", threads()) + insert(conn, "contact", contact_rows()) \
+           + insert(conn, "messages", messages()) + insert(conn, "aggregated_calls", calls())
+
+def make_messenger_accounts(conn, rng, n):
+    conn.execute("INSERT INTO accounts VALUES ('100001', 'Device Owner', 'https://scontent.xx.fbcdn.net/p/100001.jpg'," \
+                 + " '%032x', ?);" % rng.getrandbits(128), (int(START_TIME * 1000),))
+    return 1
+
+class HiveWriter(object):
+    '''Build a registry hive file (regf) in memory: the keys and values are appended as cells to one hive bin, then
+save() writes the base block and the bin. list_kind is the kind of subkey lists to write: lf, lh (windows xp and later)
+or li. Subkey lists longer than index_size are split into several lists under an ri list, like windows does for keys
+with many subkeys, and values larger than BIG_DATA_SEGMENT bytes are split into segments listed by a db cell'''
+    def __init__(self, list_kind="lh", index_size=500):
+        self.list_kind = list_kind
+        self.index_size = index_size
+        self.data = bytearray(b"hbin" + b"\x00" * 28)
+
+    def cell(self, payload):
+        '''Append an allocated cell (negative size, 8 bytes aligned) and return its offset'''
+        size = (len(payload) + 4 + 7) & ~7
+        offset = len(self.data)
+        self.data += struct.pack("<i", -size) + payload + b"\x00" * (size - 4 - len(payload))
+        return offset
+
+    def value(self, name, value_type, data):
+        name = name.encode("latin-1")
+        if len(data) <= 4:
+            size, location = len(data) | 0x80000000, struct.unpack("<I", data.ljust(4, b"\x00"))[0]
+        elif len(data) > BIG_DATA_SEGMENT:
+            segments = [self.cell(data[i:i + BIG_DATA_SEGMENT]) for i in range(0, len(data), BIG_DATA_SEGMENT)]
+            segment_list = self.cell(struct.pack("<%dI" % len(segments), *segments))
+            size, location = len(data), self.cell(struct.pack("<2sHI", b"db", len(segments), segment_list))
+        else:
+            size, location = len(data), self.cell(data)
+        return self.cell(struct.pack("<2sHIIIHH", b"vk", len(name), size, location, value_type, 1, 0) + name)
+
+    def name_hash(self, name):
+        '''The hash of a subkey name kept in lh lists, or its first 4 characters kept in lf lists'''
+        if self.list_kind == "lh":
+            name_hash = 0
+            for char in name.upper():
+                name_hash = (name_hash * 37 + ord(char)) & 0xffffffff
+            return struct.pack("<I", name_hash)
+        return name[:4].encode("latin-1").ljust(4, b"\x00")
+
+    def subkey_list(self, children):
+        '''Write the subkey list cells of (name, offset) children sorted by name and return the offset of the top one'''
+        lists = []
+        for i in range(0, len(children), self.index_size):
+            part = children[i:i + self.index_size]
+            if self.list_kind == "li":
+                entries = struct.pack("<%dI" % len(part), *[child for name, child in part])
+            else:
+                entries = b"".join(struct.pack("<I", child) + self.name_hash(name) for name, child in part)
+            lists.append(self.cell(self.list_kind.encode("ascii") + struct.pack("<H", len(part)) + entries))
+        if len(lists) == 1:
+            return lists[0]
+        return self.cell(b"ri" + struct.pack("<H%dI" % len(lists), len(lists), *lists))
+
+    def key(self, name, values=(), subkeys=(), timestamp=0, parent=0, root=False):
+        '''Add a key and everything under it. values is a list of (name, type, data bytes), subkeys a list of
+(name, values, subkeys, timestamp) tuples. Returns the key's cell offset'''
+        encoded = name.encode("latin-1")
+        offset = self.cell(struct.pack("<2sHQ15IHH", b"nk", 0x24 if root else 0x20, timestamp, 0, parent, 0, 0,
+                                       0xffffffff, 0xffffffff, 0, 0xffffffff, 0xffffffff, 0xffffffff, 0, 0, 0, 0, 0,
+                                       len(encoded), 0) + encoded)
+        children = [(sub_name, self.key(sub_name, sub_values, sub_keys, sub_time, offset))
+                    for sub_name, sub_values, sub_keys, sub_time in sorted(subkeys, key=lambda subkey: subkey[0].upper())]
+        pos = offset + 4
+        if children:
+            struct.pack_into("<I", self.data, pos + 20, len(children))
+            struct.pack_into("<I", self.data, pos + 28, self.subkey_list(children))
+        if values:
+            offsets = [self.value(value_name, value_type, data) for value_name, value_type, data in values]
+            struct.pack_into("<I", self.data, pos + 36, len(offsets))
+            struct.pack_into("<I", self.data, pos + 40, self.cell(struct.pack("<%dI" % len(offsets), *offsets)))
+        return offset
+
+    def save(self, path, root, timestamp=0, sequence=(1, 1)):
+        '''Write the hive file with root, the offset of the root key, and return its size. Pass 2 different sequence
+numbers to write a dirty hive, one saved while changes were still being written to its transaction logs'''
+        self.data += b"\x00" * (-len(self.data) % 4096)
+        struct.pack_into("<II", self.data, 4, 0, len(self.data))
+        base = bytearray(4096)
+        struct.pack_into("<4sIIQIIIIII", base, 0, b"regf", sequence[0], sequence[1], timestamp, 1, 5, 0, 1, root,
+                         len(self.data))
+        struct.pack_into("<I", base, 44, 1)
+        checksum = 0
+        for dword in struct.unpack_from("<127I", base):
+            checksum ^= dword
+        struct.pack_into("<I", base, 508, checksum)
+        with open(path, "wb") as f:
+            f.write(base)
+            f.write(self.data)
+        return len(base) + len(self.data)
+
+def filetime(unix):
+    '''Convert a unix timestamp to a windows FILETIME, 100ns units since 1601-01-01'''
+    return int((unix + FILETIME_EPOCH_OFFSET) * 10000000)
+
+def systemtime(unix):
+    '''Pack a unix timestamp as the 16 bytes windows SYSTEMTIME network profiles keep their dates in'''
+    tm = time.gmtime(unix)
+    return struct.pack("<8H", tm.tm_year, tm.tm_mon, (tm.tm_wday + 1) % 7, tm.tm_mday, tm.tm_hour, tm.tm_min, tm.tm_sec, 0)
+
+def reg_sz(text):
+    return (text + "\x00").encode("utf-16-le")
+
+def write_software_hive(path, networks, writer=None, sequence=(1, 1)):
+    '''Write a SOFTWARE registry hive whose NetworkList key holds the given networks, dicts with the keys: ssid, guid,
+mac (6 bytes), name_type, category, managed, created and last (unix times), and signature, the name of the network's
+signature key or None for a profile whose signature was deleted. writer is an optional HiveWriter to write with and
+sequence the hive's sequence numbers. Returns the size of the hive'''
+    profiles, unmanaged, managed = [], [], []
+    for network in networks:
+        ssid = network["ssid"]
+        profiles.append((network["guid"], [("ProfileName", 1, reg_sz(ssid)), ("Description", 1, reg_sz(ssid)),
+                                           ("Managed", 4, struct.pack("<I", network["managed"])),
+                                           ("Category", 4, struct.pack("<I", network["category"])),
+                                           ("DateCreated", 3, systemtime(network["created"])),
+                                           ("NameType", 4, struct.pack("<I", network["name_type"])),
+                                           ("DateLastConnected", 3, systemtime(network["last"]))], [], filetime(network["last"])))
+        if network["signature"] is None:
+            continue
+        (managed if network["managed"] else unmanaged).append((network["signature"], [("ProfileGuid", 1, reg_sz(network["guid"])),
+                                                                                     ("Description", 1, reg_sz(ssid)),
+                                                                                     ("Source", 4, struct.pack("<I", 8)),
+                                                                                     ("DnsSuffix", 1, reg_sz("<none>")),
+                                                                                     ("FirstNetwork", 1, reg_sz(ssid)),
+                                                                                     ("DefaultGatewayMac", 3, network["mac"])],
+                                                               [], filetime(network["created"])))
+    now = filetime(START_TIME + TIME_SPAN)
+    network_list = ("NetworkList", [], [("Profiles", [], profiles, now),
+                                        ("Signatures", [], [("Managed", [], managed, now), ("Unmanaged", [], unmanaged, now)], now),
+                                        ("Nla", [], [("Cache", [], [], now)], now)], now)
+    current_version = ("CurrentVersion", [("ProductName", 1, reg_sz("Windows 10 Pro")),
+                                          ("CurrentBuild", 1, reg_sz("19045"))], [network_list], now)
+    microsoft = ("Microsoft", [], [("Windows NT", [], [current_version], now),
+                                   ("Windows", [], [("CurrentVersion", [], [], now)], now)], now)
+    writer = writer or HiveWriter()
+    root = writer.key("ROOT", [], [microsoft, ("Classes", [], [], now), ("Policies", [], [], now)], now, root=True)
+    return writer.save(path, root, now, sequence)
+
+def make_software_hive(path, rng, n):
+    '''Create a SOFTWARE registry hive with the NetworkList key of a windows machine that connected to one network
+per 100 rows: wireless, wired and mobile broadband profiles with their signatures. Returns the number of networks'''
+    networks = []
+    for i, unix in enumerate(timestamps(rng, scaled(n, 0.01, 10))):
+        city = rng.choice(CITIES)[0]
+        networks.append({"ssid" : rng.choice(("%s Airport Free WiFi" % city, "HOME-%04X" % rng.getrandbits(16),
+                                              "Hotel %s %d" % (city, i), "%s-guest" % rng.choice(HOSTS).split(".")[0],
+                                              "Network %d" % (i + 1))),
+                         "guid" : "{%08X-%04X-%04X-%04X-%012X}" % (rng.getrandbits(32), rng.getrandbits(16), rng.getrandbits(16),
+                                                                   rng.getrandbits(16), rng.getrandbits(48)),
+                         "mac" : bytes(bytearray(rng.getrandbits(8) for j in range(6))),
+                         "name_type" : rng.choice((0x47, 0x47, 0x47, 0x06, 0x17)),
+                         "category" : rng.randint(0, 1),
+                         "managed" : i % 10 == 0,
+                         "created" : unix,
+                         "last" : unix + rng.randint(0, 30 * 86400),
+                         # every 20th profile's signature was deleted
+                         "signature" : "%040X" % rng.getrandbits(160) if i % 20 != 19 else None})
+    write_software_hive(path, networks)
+    return len(networks)
+
+# (database file name, schema, generator function). The generator functions take an open connection, a seeded random
+# generator and the scale, fill the tables in and return the number of rows inserted. Evidence that isn't a database has no
+# schema and its generator writes the file itself from its path, the random generator and the scale
+EVIDENCE = [("History", CHROME_HISTORY_SCHEMA, make_chrome_history),
+            ("Cookies", CHROME_COOKIES_SCHEMA, make_chrome_cookies),
+            ("Login Data", CHROME_LOGINS_SCHEMA, make_chrome_logins),
+            ("places.sqlite", FIREFOX_PLACES_SCHEMA, make_firefox_places),
+            ("cookies.sqlite", FIREFOX_COOKIES_SCHEMA, make_firefox_cookies),
+            ("formhistory.sqlite", FIREFOX_FORMS_SCHEMA, make_firefox_forms),
+            ("downloads.sqlite", FIREFOX_DOWNLOADS_SCHEMA, make_firefox_downloads),
+            ("main.db", SKYPE_SCHEMA, make_skype),
+            ("msgstore.db", WHATSAPP_MSGSTORE_SCHEMA, make_whatsapp_msgstore),
+            ("wa.db", WHATSAPP_WA_SCHEMA, make_whatsapp_wa),
+            ("core.db", MESSENGER_CORE_SCHEMA, make_messenger_core),
+            ("cross_account.db", MESSENGER_ACCOUNTS_SCHEMA, make_messenger_accounts),
+            ("SOFTWARE", None, make_software_hive)]
+
+
+def make_database(path, schema, generator, rows, seed=0):
+    '''Create one synthetic database at path with the given schema, filled in by generator at the given scale.
+Returns the number of rows inserted'''
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random("%s:%d" % (os.path.basename(path), seed))
+    if schema is None:
+        return generator(path, rng, rows)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF;")
+        conn.execute("PRAGMA synchronous = OFF;")
+        conn.executescript(schema)
+        count = generator(conn, rng, rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return count
+
+def make_evidence(out_dir, rows=1000, seed=0, names=None):
+    '''Create the synthetic databases of every scanner in out_dir, the messages, visits, cookies... tables of each get
+rows rows. The same seed always gives the same databases. Pass a list of database file names to only create those.
+Returns a list of (database path, rows inserted, seconds)'''
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    made = []
+    for name, schema, generator in EVIDENCE:
+        if names and name not in names:
+            continue
+        start = time.time()
+        path = os.path.join(out_dir, name)
+        count = make_database(path, schema, generator, rows, seed)
+        made.append((path, count, time.time() - start))
+    return made
+
+if __name__ == "__main__":
+    print('\n\n    ##############A Python script to make synthetic evidence databases #########')
+    print('    #   creates fake chrome, firefox, skype, whatsapp and messenger databases  #')
+    print('    #                  for testing and benchmarking the scanners               #')
+    print('    ############################################################################\n\n')
+
+    parser = optparse.OptionParser("Usage: python %prog -o <output directory> -n <(optional) rows> -s <(optional) seed>" \
+                                   + " -d <(optional) databases> or python %prog -h for help")
+    parser.add_option("-o", dest="out_dir", type="string", help="the directory to create the databases in")
+    rows_help = "the number of rows of the main table of each database (messages, visits, cookies...), from 1000 to" \
+                + " 10000000. default 1000"
+    parser.add_option("-n", dest="rows", type="int", default=1000, help=rows_help)
+    parser.add_option("-s", dest="seed", type="int", default=0, help="the random seed, the same seed always gives the same databases")
+    names_help = "comma separated database file names to create, default all of: " + ", ".join(name for name, schema, generator in EVIDENCE)
+    parser.add_option("-d", dest="names", type="string", help=names_help)
+    (options, args) = parser.parse_args()
+
+    if not options.out_dir:
+        sys.exit("please enter an output directory:\n\n%s" % parser.usage)
+    if options.rows < 1:
+        sys.exit("the number of rows must be at least 1")
+    names = [name.strip() for name in options.names.split(",")] if options.names else None
+    known = [name for name, schema, generator in EVIDENCE]
+    for name in names or []:
+        if name not in known:
+            sys.exit("Unknown database %s, choose from: %s" % (name, ", ".join(known)))
+
+    print("Working...\n")
+    for path, count, seconds in make_evidence(options.out_dir, options.rows, options.seed, names):
+        print("%-24s %10d row(s) %12d bytes in %8.2fs" % (os.path.basename(path), count, os.path.getsize(path), seconds))
+    print("\nDone! Databases saved to %s\n" % options.out_dir)
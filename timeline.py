@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+import os, sys, time, heapq, optparse, importlib
+try:
+    from common_methods import *
+except ImportError:
+    sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
+from scan_all import has_table
+
+
+def chrome_visit(row):
+    return "Chrome visit", "%s - %s" % (row[1], row[0])
+
+def chrome_download(row):
+    return "Chrome download", "%s saved to %s" % (row[0], row[1])
+
+def chrome_cookie(row):
+    return "Chrome cookie created", "%s: %s" % (row[1], row[0])
+
+def moz_visit(row):
+    return "Firefox visit", "%s - %s" % (row[2], row[0])
+
+def moz_form(row):
+    return "Firefox form first used", "%s = %s" % (row[0], row[1])
+
+def moz_download(row):
+    return "Firefox download", "%s from %s" % (row[0], row[1])
+
+def skype_msg(row):
+    return "Skype message", "%s in %s: %s" % (row[2], row[6], row[3])
+
+def skype_call(row):
+    direction = "incoming" if str(row[3]) == "1" else "outgoing"
+    return "Skype call", "%s call with %s, %s second(s)" % (direction, row[1], row[2])
+
+def wa_msg(row):
+    partner = str(row[16]).split("@")[0]
+    return "WhatsApp message", "%s %s: %s" % ("to" if str(row[0]) == "1" else "from", partner, row[2])
+
+def fb_msg(row):
+    return "Messenger message", "%s in %s: %s" % (row[0] or "Database owner", row[1], row[3])
+
+def fb_call(row):
+    direction = "incoming" if str(row[2]) == "1" else "outgoing"
+    return "Messenger call", "%s call with %s" % (direction, row[0])
+
+# (database file name, table that must exist in it,
+#  [(artifact, module, query function, raw timestamp column, its index in the query, unit, describe function), ...])
+TIMELINE_SOURCES = [("History", "urls", [("chrome history", "chrome_scanner", "chrome_history_query", "visit_time", 2, "webkit", chrome_visit),
+                                         ("chrome downloads", "chrome_scanner", "chrome_downloads_query", "start_time", 2, "webkit", chrome_download)]),
+                    ("Cookies", "cookies", [("chrome cookies", "chrome_scanner", "chrome_cookies_query", "creation_utc", 3, "webkit", chrome_cookie)]),
+                    ("places.sqlite", "moz_places", [("firefox history", "firefox_scanner", "moz_history_query", "visit_date", 3, "prtime", moz_visit)]),
+                    ("formhistory.sqlite", "moz_formhistory", [("firefox forms history", "firefox_scanner", "moz_forms_query", "firstUsed", 5, "prtime", moz_form)]),
+                    ("downloads.sqlite", "moz_downloads", [("firefox downloads", "firefox_scanner", "moz_downloads_query", "endTime", 3, "prtime", moz_download)]),
+                    ("main.db", "Messages", [("skype messages", "skype_scanner", "skype_msgs_query", "timestamp", 0, "unix_s", skype_msg),
+                                             ("skype call log", "skype_scanner", "skype_calls_query", "begin_timestamp", 4, "unix_s", skype_call)]),
+                    ("msgstore.db", "messages", [("whatsapp messages", "whatsapp_scanner", "wa_msgs_query", "timestamp", 3, "unix_ms", wa_msg)]),
+                    ("core.db", "threads", [("messenger messages", "facebook_scanner", "fb_messages_query", "messages.timestamp", 2, "unix_ms", fb_msg),
+                                            ("messenger call log", "facebook_scanner", "fb_calls_query", "updated_timestamp", 1, "unix_ms", fb_call)])]
+
+
+def find_sources(root):
+    '''Walk a mounted image or extraction directory and return every timeline source found.
+Each source is a tuple: (artifact, database path, module, query function, timestamp column, column index, unit, describe)'''
+    by_name = dict((db_name, (table, sources)) for db_name, table, sources in TIMELINE_SOURCES)
+    found = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        for file_name in sorted(file_names):
+            if file_name not in by_name:
+                continue
+            db = os.path.join(dir_path, file_name)
+            table, sources = by_name[file_name]
+            if has_table(db, table):
+                found.extend((source[0], db) + source[1:] for source in sources)
+    return found
+
+def source_query(source, tm_min=0, tm_max=10000000000000):
+    '''Build a source's query with the scanner's query function, ordered by its timestamp column'''
+    artifact, db, module, function, column, index, unit, describe = source
+    return getattr(importlib.import_module(module), function)(tm_min, tm_max).order_by(column)
+
+def iter_events(source, query):
+    '''Run one source's query and yield its events in time order as
+(seconds since the unix epoch, local time, artifact, event, details, database) tuples'''
+    artifact, db, module, function, column, index, unit, describe = source
+    ticks, epoch = TIMESTAMP_UNITS[unit]
+    for row, (local_time,) in iter_timestamps(query.run_batches(db), (index, unit)):
+        raw = row[index]
+        if type(raw) not in (int, float):
+            continue
+        event, details = describe(row)
+        yield (raw / ticks - epoch, local_time, artifact, event, details, db)
+
+def iter_timeline(sources, tm_min=0, tm_max=10000000000000):
+    '''Merge the events of every source into one chronological stream. Each source is already sorted by sqlite, so a
+heap based k-way merge only holds one pending event per source in memory'''
+    queries = [source_query(source, tm_min, tm_max) for source in sources]
+    # all the queries stay open during the merge
+    prepare_working_copies([(source[1], query) for source, query in zip(sources, queries)])
+    return heapq.merge(*[iter_events(source, query) for source, query in zip(sources, queries)])
+
+def build_timeline(root, tm_min=0, tm_max=10000000000000, tgt="timeline.html"):
+    '''Find every supported database under root and save all their events in one time sorted report.
+Returns the number of events written'''
+    sources = find_sources(root)
+    if not sources:
+        return 0
+    with open_report(tgt, "Timeline", "./templates/init_timeline_html.html") as report:
+        for seconds, local_time, artifact, event, details, db in iter_timeline(sources, tm_min, tm_max):
+            report.write_row((local_time, artifact, event, details, db))
+    return report.rows
+
+if __name__ == "__main__":
+    print('\n\n    ##############A Python script to build a timeline of every artifact #######')
+    print('    #      merges browser, skype, whatsapp and messenger events by time       #')
+    print('    ###########################################################################\n\n')
+
+    parser = optparse.OptionParser("Usage: python %prog -d <image or extraction directory> -o <(optional) output directory>" \
+                                   + " --min_time <(optional)> --max_time <(optional)> or python %prog -h for help")
+    parser.add_option("-d", dest="root", type="string", help="the mounted image or extraction directory to search for databases")
+    parser.add_option("-o", dest="out_dir", type="string", help="the directory to save the timeline in, default the current directory")
+    min_help = "only include events after a given date and time, must be a string separated by _ YYYY_MM_DD_HH_MM_SS"
+    parser.add_option("--min_time", dest="min", type="string", help=min_help)
+    max_help = "only include events before a given date and time, must be a string separated by _ YYYY_MM_DD_HH_MM_SS"
+    parser.add_option("--max_time", dest="max", type="string", help=max_help)
+    fmt_help = "the report format: html, pages (html split in pages), csv, jsonl or parquet (requires pyarrow). default" \
+               + " html, pages, csv or parquet are recommended for very large timelines"
+    add_output_options(parser, "opening the databases, queries, fetching rows, timestamp conversion, merging the" \
+                       + " artifacts, rendering and writing the report", format_help=fmt_help)
+    index_help = "speed up the time ordered queries on large databases by indexing a temporary working copy of each " \
+                 + "database, the original files are never modified"
+    parser.add_option("--index", dest="index", action="store_true", default=False, help=index_help)
+    (options, args) = parser.parse_args()
+    set_output_format(options.format)
+    set_output_compression(options.compress)
+    set_working_indexes(options.index)
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
+
+    if not options.root or not os.path.isdir(options.root):
+        sys.exit("please enter a valid directory to scan:\n\n%s" % parser.usage)
+    if options.out_dir:
+        if not os.path.isdir(options.out_dir):
+            os.makedirs(options.out_dir)
+        set_output_dir(options.out_dir)
+
+    min_time = time_to_epoch(options.min) if options.min else 0
+    max_time = time_to_epoch(options.max) if options.max else 10000000000000
+
+    print("Working...\n")
+    start = time.time()
+    rows = build_timeline(options.root, min_time, max_time)
+    if not rows:
+        sys.exit("No events found in %s" % options.root)
+    print("\n%d event(s) in %.2fs\n" % (rows, time.time() - start))
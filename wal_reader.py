@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+import os, sys, optparse
+try:
+    from common_methods import *
+except ImportError:
+    sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
+
+
+def list_commits(db):
+    '''Print every transaction committed to a database's write ahead log, with the frames it wrote and the database size
+after it. Returns the number of commits'''
+    wal = read_wal(db + "-wal") if os.path.isfile(db + "-wal") else None
+    if wal is None:
+        sys.exit("Couldn't find a valid write ahead log for %s" % db)
+    page_size, frames, commits = wal
+    print("%d byte pages, %d valid frame(s)\n" % (page_size, len(frames)))
+    print("%8s %10s %10s %16s" % ("commit", "frames", "pages", "database size"))
+    previous = 0
+    for i, (frame_count, db_pages) in enumerate(commits):
+        pages = len(set(page for page, offset in frames[previous:frame_count]))
+        print("%8d %10d %10d %16d" % (i + 1, frame_count - previous, pages, db_pages * page_size))
+        previous = frame_count
+    return len(commits)
+
+if __name__ == "__main__":
+    print('\n\n    ##############A Python script to read sqlite write ahead logs #############')
+    print('    #   lists the committed transactions and saves the database as of any    #')
+    print('    ##########################################################################\n\n')
+
+    parser = optparse.OptionParser("Usage: python %prog -b <database file> -c <(optional) commit> -o <(optional) snapshot file>" \
+                                   + " or python %prog -h for help")
+    parser.add_option("-b", dest="db", type="string", help="the full path of the database file, its -wal file must be next to it")
+    commit_help = "save the database as it was after the given commit, counted from 1, default the last one. Leave out -o to" \
+                  + " list the commits"
+    parser.add_option("-c", dest="commit", type="int", help=commit_help)
+    snapshot_help = "the file to save the snapshot in, it can be read by any of the scanners like a normal database. The" \
+                    + " evidence files are never modified"
+    parser.add_option("-o", dest="snapshot", type="string", help=snapshot_help)
+    (options, args) = parser.parse_args()
+
+    if not options.db or not os.path.isfile(options.db):
+        sys.exit("please enter a valid database file:\n\n%s" % parser.usage)
+    if not options.snapshot:
+        list_commits(options.db)
+        sys.exit()
+    if os.path.exists(options.snapshot):
+        sys.exit("%s already exists! Rename or move that file to avoid losing your data!" % options.snapshot)
+
+    pages = build_wal_snapshot(options.db, options.snapshot, options.commit)
+    if pages is None:
+        sys.exit("The write ahead log of %s has no committed transaction, the database file is already complete" % options.db)
+    print("Done! %d page(s) applied from the write ahead log, snapshot saved to %s\n" % (pages, options.snapshot))
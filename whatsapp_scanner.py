@@ -13,97 +13,108 @@ def parse_col(col_val):
     else:
         return str(col_val)
 
+_contact_names = {}
+
+def load_contact_names(wa_db):
+    '''Read the wa_contacts table once and return a dict mapping each phone number (the part of the jid before the @)
+to its contact name. Numbers shared by several contacts map to all their names joined by --'''
+    if wa_db not in _contact_names:
+        names = {}
+        for row in iter_from_db(wa_db, "SELECT jid, sort_name FROM wa_contacts;"):
+            phone = str(row[0]).split('@')[0]
+            names.setdefault(phone, []).append(str(row[1]))
+        _contact_names[wa_db] = dict((phone, "--".join(contact_names)) for phone, contact_names in names.items())
+    return _contact_names[wa_db]
+
+@profiled("lookup")
 def get_name_from_phone(wa_db, phone):
-    command = "SELECT sort_name FROM wa_contacts WHERE jid like '%{}%';".format(phone)
-    res = pull_from_db(wa_db, command)
-    names = [str(row[0]) for row in res if len(row) > 0]
-    return "--".join(names)
+    return load_contact_names(wa_db).get(phone, "")
+
+def jid_phone(jid):
+    '''The phone number of a whatsapp jid, the part before the @'''
+    return str(jid).partition('@')[0]
+
+def coordinates(row):
+    '''The position of a location message as latitude, longitude in decimal degrees, empty for other messages'''
+    position = normalize_coordinates(row[11], row[12])
+    return "%.7f, %.7f" % position if position else ""
+
+WA_TIME = ("unix_ms", "ctime")
+WA_STATUS = {0 : "RECEIVED", 1 : "UPLOADING", 2 : "UPLOADED", 3 : "SENT BY CLIENT",
+             4 : "RECEIVED BY SERVER", 5 : "RECEIVED BY DESTINATION", 6 : "CONTROL MESSAGE"}
+WA_MEDIA_TYPES = {0 : "text", 1 : "image", 2 : "audio", 3 : "video", 4 : "contact card", 5 : "geo position", 8 : "call"}
+WA_BROADCAST = {2 : "Yes", 0 : "No"}
+
+# report columns built from the rows of the queries in this file
+WA_CONTACTS = RowSpec([(4, None), (6, None), (1, {0 : "No", 1 : "Yes"}), (0, jid_phone), (2, None), (3, WA_TIME), (5, None)])
+
+def wa_msgs_spec(wa_db=None):
+    '''The report columns of messages, pass the wa.db path to show contact names instead of phone numbers'''
+    if wa_db:
+        partner = lambda jid: get_name_from_phone(wa_db, jid_phone(jid))
+    else:
+        partner = jid_phone
+
+    def sender(row):
+        return "db owner" if row[0] in (1, "1") else partner(row[16])
+
+    def recipient(row):
+        return partner(row[16]) if row[0] in (1, "1") else "db owner"
+
+    return RowSpec([(3, WA_TIME), (4, WA_TIME), (5, WA_TIME), (7, WA_TIME), (6, WA_TIME), (None, sender), (None, recipient),
+                    (13, WA_MEDIA_TYPES), (2, None), (1, WA_STATUS), (14, WA_BROADCAST), (15, None), (8, parse_col),
+                    (9, parse_col), (10, parse_col), (None, coordinates)])
+
+def wa_msgs_query(tm_min=0, tm_max=10000000000000, partner=None):
+    '''Build the whatsapp messages query, message timestamps are in milliseconds'''
+    query = Query("SELECT key_from_me, status, data, timestamp, receipt_server_timestamp, receipt_device_timestamp," \
+                  + " read_device_timestamp, played_device_timestamp, media_url, media_caption, media_duration, latitude," \
+                  + " longitude, media_wa_type, needs_push, recipient_count, key_remote_jid FROM messages") \
+            .time_range("timestamp", tm_min, tm_max, scale=1000).index("messages", "timestamp")
+    if partner:
+        query.like("key_remote_jid", partner)
+    return query
 
-def read_wa_msgs(msgstore_db, wa_db=None, partner=None, tm_min=0, tm_max=10000000000000, get_partner_name=None):
-    '''Read Messages from whatsapp msgstore database. Takes 6 arguments:
+@cached_result("wa.db")
+def read_wa_msgs(msgstore_db, wa_db=None, partner=None, tm_min=0, tm_max=10000000000000, get_partner_name=None, incremental=False,
+                device=None):
+    '''Read Messages from whatsapp msgstore database. Takes 8 arguments:
 msgstore_db: msgstore database file full path
 wa_db: wa database file full path, default value None
 partner: chat partner, default value None
 tm_min: minimum Message timestamp, default value 0
 tm_max: maximum Message timestamp, default value 10000000000000
-get_partner_name: pass True to display name instead of phone number in from/to fields'''
-    command = "SELECT key_from_me, status, data, timestamp, receipt_server_timestamp, receipt_device_timestamp," \
-              + " read_device_timestamp, played_device_timestamp, media_url, media_caption, media_duration, latitude," \
-              + " longitude, media_wa_type, needs_push, recipient_count, key_remote_jid from messages" \
-              + " WHERE (timestamp > %s AND timestamp < %s);" % (tm_min, tm_max)
-    if partner:
-        command = "SELECT key_from_me, status, data, timestamp, receipt_server_timestamp, receipt_device_timestamp," \
-                  + " read_device_timestamp, played_device_timestamp, media_url, media_caption, media_duration, latitude," \
-                  + " longitude, media_wa_type, needs_push, recipient_count, key_remote_jid FROM messages" \
-                  + " WHERE (key_remote_jid LIKE '%{}%') AND (timestamp > {} AND timestamp < {});".format(partner, tm_min, tm_max)
-    res = pull_from_db(msgstore_db, command)
-    status_dict = {0 : "RECEIVED", 1 : "UPLOADING", 2 : "UPLOADED", 3 : "SENT BY CLIENT",
-                   4 : "RECEIVED BY SERVER", 5 : "RECEIVED BY DESTINATION", 6 : "CONTROL MESSAGE"}
-    media_wa_dict = {0 : "text", 1 : "image", 2 : "audio", 3 : "video", 4 : "contact card", 5 : "geo position", 8 : "call"}
-    broad_dict = {2 : "Yes", 0 : "No"}
-    if not wa_db:
-        wa_db = os.path.join(os.path.dirname(msgstore_db), "wa.db")
-    data = init_data("whatsapp_scanner Messages", len(res)) + init_table_header("./templates/init_whatsapp_msgs_html.html")
-
-    for row in res:
-        if str(row[0]) == "1":
-            frm = "db owner"
-            to = str(row[16])[0:str(row[16]).index('@')]
-            if get_partner_name:
-                to = get_name_from_phone(wa_db, to)
-        else:
-            frm = str(row[16])[0:str(row[16]).index('@')]
-            if get_partner_name:
-                frm = get_name_from_phone(wa_db, frm)
-            to = "db owner"
-
-        try:
-            status = status_dict[int(row[1])]
-        except KeyError:
-            status = "Unknown"
-        msg_body = str(row[2])
-        insert_time = parse_timestamp(row[3])
-        server_time = parse_timestamp(row[4])
-        receipt_time = parse_timestamp(row[5])
-        read_time = parse_timestamp(row[6])
-        media_play_time = parse_timestamp(row[7])
-        media_url = parse_col(row[8])
-        media_cap = parse_col(row[9])
-        media_dur = parse_col(row[10])
-        coordinates = "long: %s, lat: %s" % (row[12], row[11])
-        try:
-            msg_type = media_wa_dict[int(row[13])]
-        except KeyError:
-            msg_type = "Unknown"
-        broadcast = broad_dict[int(row[14])]
-        receivers = int(row[15])
-
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td>" % (insert_time, server_time, receipt_time, media_play_time, read_time) \
-               + "<td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td>" % (frm, to, msg_type, msg_body, status, broadcast) \
-               + "<td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>" % (receivers, media_url, media_cap, media_dur, coordinates)
-        data += line
-    data += close_table_html()
+get_partner_name: pass True to display name instead of phone number in from/to fields
+incremental: pass True to only read messages added after the ones exported by the previous incremental run
+device: the name of the device the database was pulled from, default value None for the database path'''
+    query = wa_msgs_query(tm_min, tm_max, partner)
     tgt = "whatsapp_scanner_msgs.html"
-    saveResult(tgt, data)
+    state = None
+    if incremental:
+        state = ScanState(msgstore_db, "whatsapp_msgs" if not partner else "whatsapp_msgs_%s" % partner, "messages", device)
+        state.apply(query)
+        tgt = state.report_name(tgt)
 
+    if not wa_db:
+        wa_db = os.path.join(os.path.dirname(msgstore_db), "wa.db")
+    spec = wa_msgs_spec(wa_db if get_partner_name else None)
+    with open_report(tgt, "whatsapp_scanner Messages", "./templates/init_whatsapp_msgs_html.html") as report:
+        for rows in query.run_batches(msgstore_db):
+            if state:
+                state.seen_batch(rows)
+            report.write_batch(spec.cells(rows))
+    if state:
+        state.save()
+    return report.rows
+
+@cached_result()
 def read_wa_contacts(wa_db):
     '''Read contacts from whatsapp wa database. Takes one argument: the full path of the wa.db database file'''
     command = "SELECT jid, is_whatsapp_user, status, status_timestamp, display_name, unseen_msg_count, sort_name from wa_contacts;"
-    res = pull_from_db(wa_db, command)
-    wa_user_dict = {0 : "No", 1 : "Yes"}
-    data = init_data("whatsapp_scanner Contacts", len(res)) + init_table_header("./templates/init_whatsapp_contacts_html.html")
-
-    for row in res:
-        phone = str(row[0])[0:str(row[0]).index('@')]
-        wa_user = wa_user_dict[row[1]]
-        last_status_update = parse_timestamp(row[3])
-        line = "<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>" % (row[4], row[6], wa_user,
-                                                                                                           phone, row[2], last_status_update,
-                                                                                                           row[5])
-        data += line
-    data += close_table_html()
     tgt = "whatsapp_scanner_contacts.html"
-    saveResult(tgt, data)
+    with open_report(tgt, "whatsapp_scanner Contacts", "./templates/init_whatsapp_contacts_html.html") as report:
+        WA_CONTACTS.write(report, iter_batches_from_db(wa_db, command))
+    return report.rows
 
 if __name__ == "__main__":
     print('\n\n    ##############A Python script that reads whatsapp data #####################')
@@ -129,7 +140,26 @@ if __name__ == "__main__":
     parser.add_option("--min_time", dest="min", type="string", help=min_help)
     max_help = "enter only if target is 'msgs' to read messages/calls before a given date and time, must be a string separated by _ YYYY_MM_DD_HH_MM_SS"
     parser.add_option("--max_time", dest="max", type="string", help=max_help)
+    inc_help = "enter only if target is 'msgs' to only read messages added after the ones saved by the previous incremental" \
+               + " run on the same device, the results are saved to a new numbered report"
+    parser.add_option("--incremental", dest="incremental", action="store_true", default=False, help=inc_help)
+    device_help = "enter with --incremental to name the device the database was pulled from, to continue its incremental" \
+                  + " scans when a fresh pull is saved to another path. Default the database path"
+    parser.add_option("--device", dest="device", type="string", help=device_help)
+    add_output_options(parser, "opening the database, queries, fetching rows, timestamp conversion, contact name lookups," \
+                       + " formatting, rendering and writing the reports")
+    index_help = "speed up time window searches on large databases by indexing a temporary working copy of the database," \
+                 + " the original file is never modified"
+    parser.add_option("--index", dest="index", action="store_true", default=False, help=index_help)
+    cache_help = "save the results in the result cache and reuse them when the same database is read again with the same" \
+                 + " options, instead of reading it again. The cache is kept in " + RESULT_CACHE_DIR
+    parser.add_option("--cache", dest="cache", action="store_true", default=False, help=cache_help)
     (options, args) = parser.parse_args()
+    set_output_format(options.format)
+    set_output_compression(options.compress)
+    set_working_indexes(options.index)
+    set_result_cache(options.cache)
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
 
     if not options.target:
         sys.exit("please enter a target:\n\n%s" % parser.usage)
@@ -137,7 +167,7 @@ if __name__ == "__main__":
         sys.exit("Unrecognized target function!")
 
     msgstore_db = options.msgstore_db
-    if not os.path.isfile(msgstore_db):
+    if msgstore_db and not os.path.isfile(msgstore_db):
         msgstore_db = os.path.join(msgstore_db, "msgstore.db")
 
     wa_db = options.wa_db
@@ -147,7 +177,7 @@ if __name__ == "__main__":
     else:
         min_time = 0
     if options.max:
-        max_time = time_to_epoch(options.min)
+        max_time = time_to_epoch(options.max)
     else:
         max_time = 10000000000000
 
@@ -155,7 +185,8 @@ if __name__ == "__main__":
 
     print("Working...")
     if options.target.lower() == "msgs":
-        read_wa_msgs(msgstore_db, wa_db=wa_db, partner=options.partner, tm_min=min_time, tm_max=max_time, get_partner_name=get_partner_name)
+        read_wa_msgs(msgstore_db, wa_db=wa_db, partner=options.partner, tm_min=min_time, tm_max=max_time, get_partner_name=get_partner_name,
+                     incremental=options.incremental, device=options.device)
     elif options.target.lower() == "contacts":
         read_wa_contacts(wa_db)
 
@@ -1,14 +1,231 @@
-import sys
+#!/usr/bin/env python
+import os, sys, time, mmap, shutil, struct, tempfile, optparse
+from concurrent.futures import ProcessPoolExecutor
 try:
-    from _winreg import *
-except:
-    from winreg import *
+    import winreg
+except ImportError:
+    try:
+        import _winreg as winreg
+    except ImportError:
+        winreg = None
 try:
     from common_methods import *
 except ImportError:
     sys.exit("Could not find common_methods.py... download the full toolkit from https://github.com/MonroCoury/Forensic_Tools")
 
 
+# the network list key, under HKLM\SOFTWARE on a live machine and under the root key of a SOFTWARE hive file
+NETWORK_LIST = r"Microsoft\Windows NT\CurrentVersion\NetworkList"
+# the signature keys of the networks, and whether the networks under them are managed (domain) networks
+SIGNATURE_KEYS = [(r"Signatures\Unmanaged", False), (r"Signatures\Managed", True)]
+NAME_TYPES = {0x06 : "wired", 0x17 : "mobile broadband", 0x47 : "wireless"}
+CATEGORIES = {0 : "public", 1 : "private", 2 : "domain"}
+
+REGF_SIGNATURE = b"regf"
+# the hive bins follow the 4096 bytes base block, cell offsets are relative to the first one
+HBIN_START = 4096
+KEY_COMP_NAME = 0x0020
+VALUE_COMP_NAME = 0x0001
+VALUE_DATA_INLINE = 0x80000000
+# values larger than this are stored in segments listed by a "db" cell, from hive version 1.4
+BIG_DATA_SIZE = 16344
+REG_SZ, REG_EXPAND_SZ, REG_BINARY, REG_DWORD, REG_DWORD_BIG_ENDIAN, REG_MULTI_SZ, REG_QWORD = 1, 2, 3, 4, 5, 7, 11
+
+
+class HiveError(Exception):
+    '''Raised when a file isn't a registry hive or its cells are corrupt'''
+    pass
+
+class RegistryHive(object):
+    '''A registry hive file (regf) like SOFTWARE, SYSTEM or NTUSER.DAT, memory mapped and read in place without
+windows or winreg. Use the root attribute, a RegistryKey, to read its keys. The dirty attribute is True when the
+hive's sequence numbers don't match: the last changes may still be in its .LOG1/.LOG2 transaction logs'''
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise HiveError("%s is empty" % path)
+        if self.buf[:4] != REGF_SIGNATURE or len(self.buf) < HBIN_START:
+            self.close()
+            raise HiveError("%s is not a registry hive" % path)
+        primary, secondary = struct.unpack_from("<II", self.buf, 4)
+        self.dirty = primary != secondary
+        self.minor_version = struct.unpack_from("<I", self.buf, 24)[0]
+        self.root = RegistryKey(self, struct.unpack_from("<I", self.buf, 36)[0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.buf.close()
+        self._file.close()
+
+    def cell(self, offset, signature=None):
+        '''The file position of the data of the cell at offset, checking that it's inside the file and, if given, that it
+starts with the 2 bytes signature. Returns (position, size of the data)'''
+        pos = HBIN_START + offset
+        if offset == 0xffffffff or pos + 4 > len(self.buf):
+            raise HiveError("cell offset 0x%x past the end of the hive" % offset)
+        size = abs(struct.unpack_from("<i", self.buf, pos)[0]) - 4
+        if size < 0 or pos + 4 + size > len(self.buf):
+            raise HiveError("corrupt cell at offset 0x%x" % offset)
+        if signature and self.buf[pos + 4:pos + 6] != signature:
+            raise HiveError("expected a %s cell at offset 0x%x" % (signature.decode("ascii"), offset))
+        return pos + 4, size
+
+    def key(self, path):
+        '''Open a key by its \\ separated path from the root key, None if it doesn't exist'''
+        return open_path(self.root, path)
+
+class RegistryKey(object):
+    '''A key (nk cell) of a RegistryHive, with its name and last written time (a FILETIME, 100ns units since 1601)'''
+    def __init__(self, hive, offset):
+        self.hive = hive
+        pos, size = hive.cell(offset, b"nk")
+        if size < 76:
+            raise HiveError("truncated key at offset 0x%x" % offset)
+        buf = hive.buf
+        flags, self.last_written = struct.unpack_from("<HQ", buf, pos + 2)
+        self._subkey_count, = struct.unpack_from("<I", buf, pos + 20)
+        self._subkey_list, = struct.unpack_from("<I", buf, pos + 28)
+        self._value_count, self._value_list = struct.unpack_from("<II", buf, pos + 36)
+        name_length, = struct.unpack_from("<H", buf, pos + 72)
+        name = buf[pos + 76:pos + 76 + name_length]
+        self.name = name.decode("latin-1") if flags & KEY_COMP_NAME else name.decode("utf-16-le", "replace")
+
+    def subkeys(self):
+        '''Yield the subkeys, read from their lf, lh, li or ri list'''
+        if not self._subkey_count:
+            return
+        stack, seen = [self._subkey_list], set()
+        while stack:
+            offset = stack.pop()
+            if offset in seen:
+                continue
+            seen.add(offset)
+            pos, size = self.hive.cell(offset)
+            kind = self.hive.buf[pos:pos + 2]
+            count, = struct.unpack_from("<H", self.hive.buf, pos + 2)
+            if kind in (b"lf", b"lh"):
+                if 4 + count * 8 > size:
+                    raise HiveError("corrupt subkey list at offset 0x%x" % offset)
+                for i in range(count):
+                    yield RegistryKey(self.hive, struct.unpack_from("<I", self.hive.buf, pos + 4 + i * 8)[0])
+            elif kind in (b"li", b"ri"):
+                if 4 + count * 4 > size:
+                    raise HiveError("corrupt subkey list at offset 0x%x" % offset)
+                offsets = struct.unpack_from("<%dI" % count, self.hive.buf, pos + 4)
+                if kind == b"li":
+                    for sub_offset in offsets:
+                        yield RegistryKey(self.hive, sub_offset)
+                else:
+                    stack.extend(reversed(offsets))
+            else:
+                raise HiveError("unknown subkey list at offset 0x%x" % offset)
+
+    def subkey(self, name):
+        '''Open a subkey by name, ignoring case like windows does, None if it doesn't exist'''
+        name = name.lower()
+        for key in self.subkeys():
+            if key.name.lower() == name:
+                return key
+        return None
+
+    def _values(self):
+        '''Yield (name, type, data size, data offset, inline data position) for each value (vk cell) of the key'''
+        if not self._value_count:
+            return
+        buf = self.hive.buf
+        pos, size = self.hive.cell(self._value_list)
+        count = min(self._value_count, size // 4)
+        for offset in struct.unpack_from("<%dI" % count, buf, pos):
+            vk, vk_size = self.hive.cell(offset, b"vk")
+            name_length, data_size, data_offset, data_type, flags = struct.unpack_from("<HIIIH", buf, vk + 2)
+            name = buf[vk + 20:vk + 20 + name_length]
+            name = name.decode("latin-1") if flags & VALUE_COMP_NAME else name.decode("utf-16-le", "replace")
+            yield name, data_type, data_size, data_offset, vk + 8
+
+    def values(self):
+        '''Return a dict of the values of the key, value name: decoded data. The default value is named ""'''
+        return dict((name, self._decode(data_type, data_size, data_offset, inline_pos))
+                    for name, data_type, data_size, data_offset, inline_pos in self._values())
+
+    def value(self, name, default=None):
+        '''The decoded data of one value, by name ignoring case, or default if the key doesn't have it'''
+        name = name.lower()
+        for value_name, data_type, data_size, data_offset, inline_pos in self._values():
+            if value_name.lower() == name:
+                return self._decode(data_type, data_size, data_offset, inline_pos)
+        return default
+
+    def _data(self, data_size, data_offset, inline_pos):
+        buf = self.hive.buf
+        if data_size & VALUE_DATA_INLINE:
+            return buf[inline_pos:inline_pos + min(data_size & ~VALUE_DATA_INLINE, 4)]
+        pos, size = self.hive.cell(data_offset)
+        if data_size > BIG_DATA_SIZE and self.hive.minor_version >= 4 and buf[pos:pos + 2] == b"db":
+            count, segments = struct.unpack_from("<HI", buf, pos + 2)
+            seg_pos, seg_size = self.hive.cell(segments)
+            data = bytearray()
+            for segment in struct.unpack_from("<%dI" % min(count, seg_size // 4), buf, seg_pos):
+                part_pos, part_size = self.hive.cell(segment)
+                data += buf[part_pos:part_pos + min(part_size, BIG_DATA_SIZE, data_size - len(data))]
+            return bytes(data)
+        return buf[pos:pos + min(size, data_size)]
+
+    def _decode(self, data_type, data_size, data_offset, inline_pos):
+        '''Decode value data by type: strings as text, multi strings as a list, numbers as int, anything else as bytes'''
+        data = self._data(data_size, data_offset, inline_pos)
+        if data_type in (REG_SZ, REG_EXPAND_SZ):
+            return data.decode("utf-16-le", "replace").split("\x00", 1)[0]
+        if data_type == REG_MULTI_SZ:
+            return [item for item in data.decode("utf-16-le", "replace").split("\x00") if item]
+        if data_type == REG_DWORD and len(data) == 4:
+            return struct.unpack("<I", data)[0]
+        if data_type == REG_DWORD_BIG_ENDIAN and len(data) == 4:
+            return struct.unpack(">I", data)[0]
+        if data_type == REG_QWORD and len(data) == 8:
+            return struct.unpack("<Q", data)[0]
+        return data
+
+class LiveKey(object):
+    '''A key of the live windows registry opened with winreg, read through the same methods as a RegistryKey'''
+    def __init__(self, handle, name):
+        self.handle = handle
+        self.name = name
+        self.last_written = winreg.QueryInfoKey(handle)[2]
+
+    def subkeys(self):
+        for i in range(winreg.QueryInfoKey(self.handle)[0]):
+            name = winreg.EnumKey(self.handle, i)
+            yield LiveKey(winreg.OpenKey(self.handle, name), name)
+
+    def subkey(self, name):
+        try:
+            return LiveKey(winreg.OpenKey(self.handle, name), name)
+        except OSError:
+            return None
+
+    def value(self, name, default=None):
+        try:
+            return winreg.QueryValueEx(self.handle, name)[0]
+        except OSError:
+            return default
+
+def open_path(key, path):
+    '''Open a key by its \\ separated path from another key, None if it doesn't exist'''
+    for name in path.split("\\"):
+        if key is None:
+            return None
+        key = key.subkey(name)
+    return key
+
 def val2addr(val):
     if val:
         addr = ""
@@ -23,28 +240,156 @@ def val2addr(val):
         addr = "No data found for this network"
         return False, addr
 
+def systemtime(data):
+    '''Decode a windows SYSTEMTIME, the 16 bytes network profiles keep their dates in, as YYYY-MM-DD HH:MM:SS. Windows
+saves these in the machine's local time'''
+    if type(data) is not bytes or len(data) < 16:
+        return None
+    year, month, weekday, day, hour, minute, second, millisecond = struct.unpack_from("<8H", data)
+    if not year:
+        return None
+    return "%04d-%02d-%02d %02d:%02d:%02d" % (year, month, day, hour, minute, second)
+
+def filetime(value):
+    '''A key's last written FILETIME as a local time string'''
+    return timestamp_to_text(value // 10000000 * 1000000, "webkit") if value else None
+
+def read_networks(software, source):
+    '''Read the networks a windows machine has connected to from the root key of its SOFTWARE hive, a RegistryKey or
+LiveKey: the name, gateway mac address and managed flag of each network signature, joined with the name, type,
+category and first and last connection dates of its profile. Profiles without a signature are listed too.
+Returns a list of report rows, source is put in the last column'''
+    network_list = open_path(software, NETWORK_LIST)
+    if network_list is None:
+        return []
+    profiles = {}
+    profile_keys = network_list.subkey("Profiles")
+    for key in (profile_keys.subkeys() if profile_keys is not None else ()):
+        profiles[key.name.upper()] = key
+    rows = []
+    used = set()
+    for path, managed in SIGNATURE_KEYS:
+        signatures = open_path(network_list, path)
+        for key in (signatures.subkeys() if signatures is not None else ()):
+            guid = str(key.value("ProfileGuid", "")).upper()
+            profile = profiles.get(guid)
+            used.add(guid)
+            found, mac_address = val2addr(key.value("DefaultGatewayMac"))
+            rows.append(network_row(profile, key.value("FirstNetwork") or key.value("Description"), mac_address, managed,
+                                    filetime(key.last_written), source))
+    for guid, profile in sorted(profiles.items()):
+        if guid not in used:
+            rows.append(network_row(profile, profile.value("ProfileName"), "", bool(profile.value("Managed")), None, source))
+    return rows
+
+def network_row(profile, name, mac_address, managed, signature_time, source):
+    if profile is None:
+        return (name, mac_address, None, None, "Yes" if managed else "No", None, None, None, signature_time, source)
+    name_type = profile.value("NameType")
+    return (name, mac_address, profile.value("ProfileName"), NAME_TYPES.get(name_type, name_type),
+            "Yes" if managed else "No", CATEGORIES.get(profile.value("Category"), profile.value("Category")),
+            systemtime(profile.value("DateCreated")), systemtime(profile.value("DateLastConnected")), signature_time, source)
+
+def read_hive(hive_file):
+    '''Read the networks of one SOFTWARE hive file, for the batch mode. Returns (hive file, rows, error): rows is None
+if the file isn't a registry hive, an empty list for other hives like SYSTEM or NTUSER.DAT'''
+    try:
+        if sniff_file_type(hive_file) != "regf":
+            return hive_file, None, None
+        with RegistryHive(hive_file) as hive:
+            rows = read_networks(hive.root, hive_file)
+            return hive_file, rows, "the hive is dirty, recent changes may only be in its .LOG1/.LOG2 files" if hive.dirty else None
+    except (HiveError, struct.error, IOError, OSError) as e:
+        return hive_file, [], "%s: %s" % (type(e).__name__, e)
+
+def read_hives(hive_files, workers=None, chunksize=4):
+    '''Read the networks of many SOFTWARE hive files in a pool of worker processes, one hive at a time per worker,
+and save them all to one report. Files that aren't registry hives are skipped, so a whole directory tree can be
+passed. Returns a tuple: (hives read, networks found)'''
+    hives = 0
+    tgt = "Wifi_History.html"
+    with open_report(tgt, "wlan_reader Wifi Networks", "./templates/init_wlan_html.html") as report, \
+         ProcessPoolExecutor(max_workers=workers) as pool:
+        for hive_file, rows, error in pool.map(read_hive, hive_files, chunksize=chunksize):
+            if rows is None:
+                continue
+            hives += 1
+            if error:
+                print("%s: %s" % (hive_file, error))
+            if rows:
+                report.write_batch(rows)
+    return hives, report.rows
+
 def get_WIFIs():
-    wlans = r'SOFTWARE\Microsoft\Windows NT\CurrentVersion\NetworkList' \
-            + r'\Signatures\Unmanaged'
-    key = OpenKey(HKEY_LOCAL_MACHINE, wlans)
-    data = ""
-    num = 0
-    for i in range(1000000):
-        try:
-            attempt = EnumKey(key, i)
-            wlan_key = OpenKey(key, str(attempt))
-            (n, addr, t) = EnumValue(wlan_key, 5)
-            (n, name, t) = EnumValue(wlan_key, 4)
-            res, mac_address = val2addr(addr)
-            wlan_name = str(name)
-            data += "<tr><td>%s</td><td>%s</td></tr>" % (wlan_name,  mac_address)
-            CloseKey(wlan_key)
-            num += 1
-        except Exception as e:
-            break
-    complete_html = init_data("wlan_reader Wifi Networks", num) + init_table_header("./templates/init_wlan_html.html") \
-                    + data + close_table_html()
-    saveResult("Wifi_History.html", complete_html)
+    '''Read the networks of the live registry of the windows machine the script runs on'''
+    if winreg is None:
+        sys.exit("The live registry can only be read on windows, use -f or -d to read exported SOFTWARE hive files")
+    software = LiveKey(winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, "SOFTWARE"), "SOFTWARE")
+    with open_report("Wifi_History.html", "wlan_reader Wifi Networks", "./templates/init_wlan_html.html") as report:
+        report.write_batch(read_networks(software, "live registry"))
+    return report.rows
+
+def expected_row(network, source):
+    '''The report row read_networks should give for a network written by synthetic_evidence.write_software_hive'''
+    created, last = [time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(network[name])) for name in ("created", "last")]
+    signature_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(network["created"])) if network["signature"] else None
+    mac_address = ":".join("%02x" % byte for byte in bytearray(network["mac"])) if network["signature"] else ""
+    return (network["ssid"], mac_address, network["ssid"], NAME_TYPES[network["name_type"]],
+            "Yes" if network["managed"] else "No", CATEGORIES[network["category"]], created, last, signature_time, source)
+
+def self_test():
+    '''Check the hive reader against synthetic SOFTWARE hives written with each kind of subkey list, split under ri
+lists, with a value large enough to be stored in big data segments, a dirty hive, a hive with a corrupt cell and a file
+that isn't a hive. Prints one line per check and returns True if they all pass'''
+    from synthetic_evidence import HiveWriter, write_software_hive, START_TIME
+    networks = []
+    for i in range(12):
+        networks.append({"ssid" : "Network %d" % i if i != 5 else "Long SSID " + "x" * 9000,
+                         "guid" : "{%08X-0000-4000-8000-%012X}" % (i, i * 7919),
+                         "mac" : bytes(bytearray((i, 0x1a, 0x2b, 0x3c, 0x4d, 0xff - i))),
+                         "name_type" : (0x47, 0x06, 0x17)[i % 3],
+                         "category" : i % 3,
+                         "managed" : i % 4 == 0,
+                         "created" : START_TIME + i * 86400,
+                         "last" : START_TIME + i * 86400 + 3600,
+                         "signature" : "%040X" % (i * 104729) if i != 7 else None})
+    failures = []
+    def check(name, passed):
+        print("%-60s %s" % (name, "ok" if passed else "FAILED"))
+        if not passed:
+            failures.append(name)
+
+    test_dir = tempfile.mkdtemp(prefix="wlan_reader_")
+    try:
+        for list_kind in ("lf", "lh", "li"):
+            hive_file = os.path.join(test_dir, "SOFTWARE_%s" % list_kind)
+            write_software_hive(hive_file, networks, HiveWriter(list_kind, index_size=3))
+            path, rows, error = read_hive(hive_file)
+            expected = [expected_row(network, hive_file) for network in networks]
+            check("%s lists under ri lists, big data value" % list_kind, error is None and sorted(rows) == sorted(expected))
+
+        hive_file = os.path.join(test_dir, "SOFTWARE_dirty")
+        write_software_hive(hive_file, networks, sequence=(3, 2))
+        path, rows, error = read_hive(hive_file)
+        check("dirty hive read and reported", len(rows) == len(networks) and error is not None and "dirty" in error)
+
+        hive_file = os.path.join(test_dir, "SOFTWARE_corrupt")
+        write_software_hive(hive_file, networks)
+        with RegistryHive(hive_file) as hive:
+            offset = hive.key(NETWORK_LIST + r"\Profiles")._subkey_list
+        with open(hive_file, "r+b") as f:
+            f.seek(HBIN_START + offset)
+            f.write(struct.pack("<i", -0x7fffff00))
+        path, rows, error = read_hive(hive_file)
+        check("corrupt cell reported", rows == [] and error is not None and error.startswith("HiveError"))
+
+        other_file = os.path.join(test_dir, "notes.txt")
+        with open(other_file, "w") as f:
+            f.write("not a registry hive")
+        check("other files skipped", read_hive(other_file)[1] is None)
+    finally:
+        shutil.rmtree(test_dir, ignore_errors=True)
+    return not failures
 
 if __name__ == "__main__":
     print('\n\n    ##############A Python script to read WIFI activity #####################')
@@ -55,5 +400,31 @@ if __name__ == "__main__":
     print('    #            Make sure you run command prompt as administrator          #')
     print('    #                      Coded by monrocoury                              #')
     print('    #########################################################################\n\n')
+
+    parser = optparse.OptionParser("Usage: python %prog (on windows, reads the live registry) or python %prog -f <SOFTWARE hive file>" \
+                                   + " or python %prog -d <directory of hive files> -w <(optional) workers> or python %prog -h for help")
+    hive_help = "read an exported or copied SOFTWARE hive file instead of the live registry, works on any platform." \
+                + r" The hive is in C:\Windows\System32\config\SOFTWARE, comma separate several hives"
+    parser.add_option("-f", dest="hives", type="string", help=hive_help)
+    dir_help = "read every SOFTWARE hive under this directory, other files and hives are skipped"
+    parser.add_option("-d", dest="root", type="string", help=dir_help)
+    parser.add_option("-w", dest="workers", type="int", help="used with -f or -d, number of worker processes, default one per cpu")
+    add_output_options(parser, "reading the hives, rendering and writing the report", reports="the report")
+    test_help = "check the hive reader against synthetic SOFTWARE hives (requires synthetic_evidence.py) and exit"
+    parser.add_option("--self-test", dest="self_test", action="store_true", default=False, help=test_help)
+    (options, args) = parser.parse_args()
+    if options.self_test:
+        sys.exit(0 if self_test() else "\nThe self test failed!")
+    set_output_format(options.format)
+    set_output_compression(options.compress)
+    set_profiling(options.profile or options.pstats is not None, options.pstats)
+
     print("Working...\n")
-    get_WIFIs()
+    if options.hives or options.root:
+        if options.root and not os.path.isdir(options.root):
+            sys.exit("%s is not a directory!" % options.root)
+        hive_files = [path.strip() for path in options.hives.split(",")] if options.hives else walkFiles(options.root)
+        hives, networks = read_hives(hive_files, options.workers)
+        print("\nRead %d hive(s), found %d network(s)" % (hives, networks))
+    else:
+        get_WIFIs()